@@ -9,11 +9,14 @@ import streamlit as st
 import random
 import json
 import time
+from store import StateStore
 #from utils import *
 
 st. set_page_config(layout="wide") 
 if st.button('refresh'):
 
+    store = StateStore('data/state.db')
+
     st.subheader('Sorted EMAs')
 
     st.subheader("Now checking")
@@ -24,7 +27,7 @@ if st.button('refresh'):
         st.text(option_symbol)
 
     st.subheader("Open positions")
-    positions = pd.read_csv('data/positions.csv',usecols=['Symbol','Buy_time','Buy_price','Signal_candle','LTP','Trailing_SL'])
+    positions = store.frame('positions')[['Symbol','Buy_time','Buy_price','Signal_candle','LTP','Trailing_SL']]
     positions['Buy_price'] = positions['Buy_price'].round(2)
 
     if len(positions) == 0:
@@ -33,7 +36,7 @@ if st.button('refresh'):
         st.dataframe(positions)
 
     st.subheader("Open SL Orders")
-    sl_orders = pd.read_csv('data/sl_orders.csv')
+    sl_orders = store.frame('sl_orders')
 
     if len(sl_orders) == 0:
         st.text('No open SL orders')
@@ -41,7 +44,7 @@ if st.button('refresh'):
         st.dataframe(sl_orders)
     
     st.subheader("Completed Trades")
-    trades = pd.read_csv('data/trades.csv',usecols=['User_id','Symbol','Buy_time','Buy_price','Sell_price','Sell_time','Quantity','Signal_candle'])
+    trades = store.frame('trades')[['User_id','Symbol','Buy_time','Buy_price','Sell_price','Sell_time','Quantity','Signal_candle']]
     if len(trades) == 0:
         st.text('No completed trades yet')
     else:
@@ -50,7 +53,7 @@ if st.button('refresh'):
         st.dataframe(trades)
     
     st.subheader("Failed orders")
-    failed_orders = pd.read_csv('data/failed_orders.csv')
+    failed_orders = store.frame('failed_orders')
     if len(failed_orders) == 0:
         st.text('No failed orders')
     else:
@@ -61,4 +64,5 @@ if st.button('refresh'):
     if len(runtime_errors) == 0:
         st.text('No errors yet')
     else:
-        st.dataframe(runtime_errors)
\ No newline at end of file
+        st.dataframe(runtime_errors)
+    store.close()
@@ -0,0 +1,414 @@
+import sys
+import time
+import heapq
+import numpy as np
+import pandas as pd
+from utils import check_entry_conditions
+
+# Strategy parameters, mirroring the config in strategy.py. Values can be a number
+# applied to every instrument or a dict keyed by instrument.
+DEFAULT_PARAMS = {
+    'DESIRED_STRIKE': {'NIFTY 50': 4, 'NIFTY BANK': 4},
+    'TRAILING_STOP_LOSS': {'NIFTY 50': 0.18, 'NIFTY BANK': 0.18},
+    'MAIN_STOP_LOSS': {'NIFTY 50': 0.27, 'NIFTY BANK': 0.27},
+    'TARGET': {'NIFTY 50': 5, 'NIFTY BANK': 5},
+    'NO_OF_CYCLES': 3,
+    'LOTS': 1,
+    'LOT_SIZE': {'NIFTY 50': 50, 'NIFTY BANK': 15},
+    'STRIKE_INTERVAL': {'NIFTY 50': 50, 'NIFTY BANK': 100},
+}
+
+# Option premium proxy used when no option candles are given: the premium starts at
+# PROXY_PREMIUM of the futures price and moves by PROXY_DELTA per point, less for each
+# strike further out of the money.
+PROXY_PREMIUM = 0.006
+PROXY_DELTA = 0.5
+PROXY_DELTA_DECAY = 0.06
+MIN_PREMIUM = 0.05
+
+SESSION_START = 9 * 60 + 15
+SQUARE_OFF_MINUTE = 15 * 60 + 25
+IST_OFFSET = pd.Timedelta(hours=5, minutes=30).value
+DAY = pd.Timedelta(days=1).value
+MINUTE = pd.Timedelta(minutes=1).value
+
+TRADE_COLUMNS = ['Position_id', 'User_id', 'Buy_order_id', 'Inst_option', 'Instrument', 'Symbol', 'Option', 'Token',
+                 'Buy_time', 'Buy_price', 'LTP', 'Quantity', 'Trailing_SL', 'Signal_candle', 'open', 'high', 'low',
+                 'close', 'Sell_order_id', 'Sell_time', 'Sell_price', 'Exit_type']
+
+
+def get_param(params, name, inst):
+    """
+    Get a strategy parameter for an instrument.
+
+    Args:
+    params (dict): Strategy parameters.
+    name (str): Name of the parameter.
+    inst (str): The instrument.
+
+    Returns:
+    float: The parameter value.
+    """
+    value = params.get(name, DEFAULT_PARAMS[name])
+    if isinstance(value, dict):
+        return value[inst]
+    return value
+
+
+def to_arrays(df):
+    """
+    Convert minute candles to the arrays the backtest runs on.
+
+    Args:
+    df (DataFrame): Minute candles with date and OHLC columns.
+
+    Returns:
+    dict: Arrays of UTC nanosecond dates and OHLC prices.
+    """
+    dates = pd.to_datetime(df['date'])
+    if dates.dt.tz is None:
+        dates = dates.dt.tz_localize('Asia/Kolkata')
+    arrays = {'date': dates.dt.tz_convert('UTC').values.astype('i8')}
+    for column in ['open', 'high', 'low', 'close']:
+        arrays[column] = df[column].values.astype('f8')
+    return arrays
+
+
+def hourly_candles(arrays):
+    """
+    Resample minute candles to 60 minute candles anchored at 09:15, like Kite.
+
+    Args:
+    arrays (dict): Minute candle arrays.
+
+    Returns:
+    DataFrame: Hourly candles with the index of their last minute candle.
+    """
+    local = arrays['date'] + IST_OFFSET
+    day = local // DAY
+    minute = (local % DAY) // MINUTE
+    bucket = day * 100 + (minute - SESSION_START) // 60
+    starts = np.flatnonzero(np.r_[True, bucket[1:] != bucket[:-1]])
+    ends = np.r_[starts[1:], len(bucket)] - 1
+    return pd.DataFrame({
+        'date': arrays['date'][starts],
+        'open': arrays['open'][starts],
+        'high': np.maximum.reduceat(arrays['high'], starts),
+        'low': np.minimum.reduceat(arrays['low'], starts),
+        'close': arrays['close'][ends],
+        'last_index': ends,
+        'close_minute': np.minimum(minute[starts] + 60, SESSION_START + 375),
+    })
+
+
+class SimulatedBroker:
+    """
+    Fills market orders and two-leg GTT orders against minute option premiums.
+    """
+
+    def __init__(self, arrays, option_arrays=None):
+        """
+        Args:
+        arrays (dict): Minute futures candle arrays per instrument.
+        option_arrays (dict, optional): Minute premium arrays per (instrument, option type), aligned with the futures. Defaults to None.
+        """
+        self.arrays = arrays
+        self.option_arrays = option_arrays or dict()
+
+    def premiums(self, inst, option_type, entry_index, start, end, desired_strike):
+        """
+        Get the open, high and low premiums of an option for a range of minutes.
+
+        Args:
+        inst (str): The instrument.
+        option_type (str): Option type (CE for Call, PE for Put).
+        entry_index (int): Minute the position was entered at, anchoring the proxy premium.
+        start (int): First minute.
+        end (int): Minute after the last one.
+        desired_strike (int): Strikes out of the money, used by the proxy premium.
+
+        Returns:
+        tuple: Arrays of open, high and low premiums.
+        """
+        if (inst, option_type) in self.option_arrays:
+            arrays = self.option_arrays[(inst, option_type)]
+            return arrays['open'][start:end], arrays['high'][start:end], arrays['low'][start:end]
+
+        fut = self.arrays[inst]
+        anchor = fut['open'][entry_index]
+        base = PROXY_PREMIUM * anchor
+        delta = PROXY_DELTA * max(1 - PROXY_DELTA_DECAY * desired_strike, 0.05)
+        if option_type == 'CE':
+            Open = base + delta * (fut['open'][start:end] - anchor)
+            high = base + delta * (fut['high'][start:end] - anchor)
+            low = base + delta * (fut['low'][start:end] - anchor)
+        else:
+            Open = base + delta * (anchor - fut['open'][start:end])
+            high = base + delta * (anchor - fut['low'][start:end])
+            low = base + delta * (anchor - fut['high'][start:end])
+        return np.maximum(Open, MIN_PREMIUM), np.maximum(high, MIN_PREMIUM), np.maximum(low, MIN_PREMIUM)
+
+    def buy(self, inst, option_type, index, desired_strike):
+        """
+        Fill a market buy order at the open of a minute.
+
+        Returns:
+        float: The fill price.
+        """
+        return self.premiums(inst, option_type, index, index, index + 1, desired_strike)[0][0]
+
+    def two_leg_exit(self, inst, option_type, entry_index, buy_price, stop, increment, target, desired_strike):
+        """
+        Find when a two-leg GTT with a trailing stop loss leg exits the position.
+
+        The stop leg is raised by one increment each time the trade high gains an increment
+        over the previous high, using the high up to the previous minute like the live loop
+        that modifies the GTT after observing the price.
+
+        Args:
+        inst (str): The instrument.
+        option_type (str): Option type (CE for Call, PE for Put).
+        entry_index (int): Minute the position was entered at.
+        buy_price (float): The buy price.
+        stop (float): Initial stop loss trigger.
+        increment (float): Trailing stop loss increment.
+        target (float): Target trigger.
+        desired_strike (int): Strikes out of the money, used by the proxy premium.
+
+        Returns:
+        tuple: Exit minute index (None if still open), sell price, final stop and exit type.
+        """
+        n = len(self.arrays[inst]['date'])
+        start = entry_index
+        window = 375
+        trade_high = buy_price
+        while start < n:
+            end = min(start + window, n)
+            Open, high, low = self.premiums(inst, option_type, entry_index, start, end, desired_strike)
+            prior_high = np.maximum.accumulate(np.r_[trade_high, high[:-1]])
+            steps = np.maximum(np.floor((prior_high - buy_price) / increment + 1e-9), 0)
+            stops = stop + steps * increment
+            hit_stop = low <= stops
+            hit_target = high >= target
+            hits = np.flatnonzero(hit_stop | hit_target)
+            if len(hits) > 0:
+                i = hits[0]
+                if hit_stop[i]:
+                    return start + i, min(Open[i], stops[i]), stops[i], 'Trailing_SL'
+                return start + i, max(Open[i], target), stops[i], 'Target'
+            trade_high = max(trade_high, high.max())
+            start = end
+            window *= 2
+        return None, None, stop + max(np.floor((trade_high - buy_price) / increment + 1e-9), 0) * increment, None
+
+
+class Backtest:
+    """
+    Event-driven replay of the strategy loop over stored minute candles.
+
+    Entry rules are checked at every 60 minute candle close before square off, positions
+    are entered at the next minute's open and exited by a simulated two-leg GTT.
+    """
+
+    def __init__(self, arrays, option_arrays=None, params=None, user_id='BACKTEST'):
+        """
+        Args:
+        arrays (dict): Minute futures candle arrays per instrument, see to_arrays.
+        option_arrays (dict, optional): Minute premium arrays per (instrument, option type). Defaults to None.
+        params (dict, optional): Strategy parameters overriding DEFAULT_PARAMS. Defaults to None.
+        user_id (str, optional): User id written to the trades. Defaults to 'BACKTEST'.
+        """
+        self.arrays = arrays
+        self.params = params or dict()
+        self.user_id = user_id
+        self.broker = SimulatedBroker(arrays, option_arrays)
+        self.hourly = dict()
+        self.candles = dict()
+        for inst, inst_arrays in arrays.items():
+            df = hourly_candles(inst_arrays)
+            start_minute = (df['date'].values + IST_OFFSET) % DAY // MINUTE
+            df['close_time'] = df['date'].values + (df['close_minute'].values - start_minute) * MINUTE
+            df['ema3'] = df['close'].ewm(span=3, adjust=False).mean()
+            df['ema13'] = df['close'].ewm(span=13, adjust=False).mean()
+            df['ema20'] = df['close'].ewm(span=20, adjust=False).mean()
+            df['mbb'] = df['close'].rolling(20).mean()
+            self.hourly[inst] = df
+            self.candles[inst] = df.to_dict('records')
+
+    def events(self):
+        """
+        Yield candle close events of every instrument in time order.
+        """
+        streams = []
+        for inst, df in self.hourly.items():
+            streams.append(zip(df['close_time'].values, [inst] * len(df), range(len(df))))
+        return heapq.merge(*streams)
+
+    def run(self):
+        """
+        Run the backtest.
+
+        Returns:
+        DataFrame: Completed trades in the trades_history.csv schema.
+        """
+        open_positions = dict()
+        completed_orders = dict()
+        trades = []
+        position_id = 0
+
+        for close_time, inst, b in self.events():
+            # Settle positions whose GTT has exited by now
+            for key, position in list(open_positions.items()):
+                if position['exit_time'] is not None and position['exit_time'] <= close_time:
+                    exit_day = (position['exit_time'] + IST_OFFSET) // DAY
+                    completed_key = (position['Instrument'], position['Option'], exit_day)
+                    completed_orders[completed_key] = completed_orders.get(completed_key, 0) + 1
+                    trades.append(position['trade'])
+                    del open_positions[key]
+
+            candle = self.candles[inst][b]
+            if candle['close_minute'] > SQUARE_OFF_MINUTE:
+                continue
+            if any(position['Instrument'] == inst for position in open_positions.values()):
+                continue
+            entry_index = int(candle['last_index']) + 1
+            if entry_index >= len(self.arrays[inst]['date']):
+                continue
+
+            day = (close_time + IST_OFFSET) // DAY
+            mbb = lambda period, value=candle['mbb']: value
+            for option_type in ['CE', 'PE']:
+                if completed_orders.get((inst, option_type, day), 0) >= get_param(self.params, 'NO_OF_CYCLES', inst):
+                    continue
+                if not check_entry_conditions(candle['low'], [candle['close']], candle['ema3'], candle['ema13'],
+                                              candle['ema20'], mbb, option_type):
+                    continue
+
+                position_id += 1
+                open_positions[position_id] = self.enter(position_id, inst, option_type, candle, entry_index)
+
+        for position in open_positions.values():
+            if position['exit_time'] is not None:
+                trades.append(position['trade'])
+
+        return pd.DataFrame(trades, columns=TRADE_COLUMNS)
+
+    def enter(self, position_id, inst, option_type, candle, entry_index):
+        """
+        Buy an option and simulate its GTT exit.
+
+        Returns:
+        dict: The open position with its exit time and trade record.
+        """
+        desired_strike = get_param(self.params, 'DESIRED_STRIKE', inst)
+        buy_price = self.broker.buy(inst, option_type, entry_index, desired_strike)
+        increment = get_param(self.params, 'TRAILING_STOP_LOSS', inst) * buy_price
+        stop = buy_price - get_param(self.params, 'MAIN_STOP_LOSS', inst) * buy_price
+        target = buy_price + get_param(self.params, 'TARGET', inst) * buy_price
+        exit_index, sell_price, final_stop, exit_type = self.broker.two_leg_exit(
+            inst, option_type, entry_index, buy_price, stop, increment, target, desired_strike)
+
+        dates = self.arrays[inst]['date']
+        quantity = get_param(self.params, 'LOTS', inst) * get_param(self.params, 'LOT_SIZE', inst)
+        buy_time = pd.Timestamp(dates[entry_index], tz='UTC').tz_convert('Asia/Kolkata')
+        signal_time = pd.Timestamp(candle['date'], tz='UTC').tz_convert('Asia/Kolkata')
+        exit_time = dates[exit_index] if exit_index is not None else None
+        sell_time = pd.Timestamp(exit_time, tz='UTC').tz_convert('Asia/Kolkata') if exit_time is not None else None
+        trade = [position_id, self.user_id, 'B{}'.format(position_id), inst + option_type, inst,
+                 '{} {}'.format(inst, option_type), option_type, 0, str(buy_time), buy_price, sell_price, quantity,
+                 final_stop, str(signal_time), candle['open'], candle['high'], candle['low'], candle['close'],
+                 'S{}'.format(position_id), str(sell_time), sell_price, exit_type]
+        return {'Instrument': inst, 'Option': option_type, 'exit_time': exit_time, 'trade': trade}
+
+
+def summarize(trades):
+    """
+    Summarize the profit and loss of backtest trades.
+
+    Args:
+    trades (DataFrame): Trades returned by Backtest.run.
+
+    Returns:
+    dict: Number of trades, total and average P&L, win rate and maximum drawdown.
+    """
+    pnl = (trades['Sell_price'] - trades['Buy_price']) * trades['Quantity']
+    equity = pnl.cumsum()
+    return {
+        'Trades': len(trades),
+        'PnL': float(pnl.sum()),
+        'Avg_PnL': float(pnl.mean()) if len(trades) > 0 else 0.0,
+        'Win_rate': float((pnl > 0).mean()) if len(trades) > 0 else 0.0,
+        'Max_drawdown': float((equity.cummax().clip(lower=0) - equity).max()) if len(trades) > 0 else 0.0,
+    }
+
+
+def run_backtest(candles, option_candles=None, params=None):
+    """
+    Backtest the strategy on minute candles.
+
+    Args:
+    candles (dict): Minute futures candles per instrument.
+    option_candles (dict, optional): Minute premium candles per (instrument, option type). Defaults to None.
+    params (dict, optional): Strategy parameters overriding DEFAULT_PARAMS. Defaults to None.
+
+    Returns:
+    DataFrame: Completed trades in the trades_history.csv schema.
+    """
+    arrays = {inst: to_arrays(df) for inst, df in candles.items()}
+    return Backtest(arrays, align_option_candles(candles, option_candles), params).run()
+
+
+def align_option_candles(candles, option_candles):
+    """
+    Align premium candles with the futures candles of their instrument, as Backtest expects.
+
+    Args:
+    candles (dict): Minute futures candles per instrument.
+    option_candles (dict): Minute premium candles per (instrument, option type), or None.
+
+    Returns:
+    dict: Dict of open, high, low and close arrays per (instrument, option type).
+    """
+    option_arrays = dict()
+    for key, df in (option_candles or dict()).items():
+        aligned = df.set_index(pd.to_datetime(df['date']))[['open', 'high', 'low', 'close']]
+        index = pd.to_datetime(candles[key[0]]['date'])
+        aligned = aligned.reindex(index).ffill().bfill()
+        option_arrays[key] = {column: aligned[column].values.astype('f8') for column in ['open', 'high', 'low', 'close']}
+    return option_arrays
+
+
+def synthetic_candles(start_price, days=250, seed=0):
+    """
+    Generate a random walk of minute candles over trading sessions, for benchmarking.
+
+    Args:
+    start_price (float): First price.
+    days (int, optional): Number of sessions. Defaults to 250.
+    seed (int, optional): Random seed. Defaults to 0.
+
+    Returns:
+    DataFrame: Minute candles.
+    """
+    rng = np.random.default_rng(seed)
+    sessions = pd.bdate_range('2023-01-02', periods=days)
+    minutes = pd.timedelta_range('09:15:00', periods=375, freq='min')
+    dates = (sessions.values[:, None] + minutes.values[None, :]).ravel()
+    close = start_price * np.exp(np.cumsum(rng.normal(0, 0.0006, len(dates))))
+    Open = np.r_[start_price, close[:-1]]
+    spread = np.abs(rng.normal(0, 0.0003, len(dates))) * close
+    return pd.DataFrame({'date': pd.to_datetime(dates).tz_localize('Asia/Kolkata'), 'open': Open,
+                         'high': np.maximum(Open, close) + spread, 'low': np.minimum(Open, close) - spread,
+                         'close': close, 'volume': 0})
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 2:
+        candles = {'NIFTY 50': pd.read_csv(sys.argv[1]), 'NIFTY BANK': pd.read_csv(sys.argv[2])}
+    else:
+        candles = {'NIFTY 50': synthetic_candles(18000, seed=1), 'NIFTY BANK': synthetic_candles(42000, seed=2)}
+    start = time.perf_counter()
+    trades = run_backtest(candles)
+    print(trades.tail())
+    print(summarize(trades))
+    print('Backtested {} minute candles in {:.2f}s'.format(sum(len(df) for df in candles.values()), time.perf_counter() - start))
@@ -0,0 +1,151 @@
+import time
+import logging
+import threading
+import requests
+from kiteconnect import KiteConnect
+from rate_limit import RateLimiter
+
+# Kite Connect's published rate limits, calls per second
+ENDPOINT_LIMITS = {'historical': 3, 'quote': 1, 'orders': 10, 'default': 10}
+
+# Placing, modifying and cancelling orders and GTTs go before market data calls and order book reads
+ORDER_PRIORITY = 0
+DATA_PRIORITY = 1
+# Route groups of the order book, trades and GTTs, limited as order calls
+ORDER_ROUTES = ['orders', 'order', 'trades', 'gtt']
+
+
+def route_endpoint(route, method):
+    """
+    Get the rate limited endpoint a KiteConnect route belongs to.
+
+    Args:
+    route (str): Route name, e.g. 'market.historical'.
+    method (str): HTTP method.
+
+    Returns:
+    str: Endpoint name, a key of ENDPOINT_LIMITS.
+    """
+    if route.startswith('market.historical'):
+        return 'historical'
+    if route.startswith('market.quote'):
+        return 'quote'
+    if route.split('.')[0] in ORDER_ROUTES:
+        return 'orders'
+    return 'default'
+
+
+def route_priority(route, method):
+    return ORDER_PRIORITY if method != 'GET' and route.split('.')[0] in ORDER_ROUTES else DATA_PRIORITY
+
+
+def create_session(pool_size=16):
+    """
+    Create a keep-alive HTTP session with a connection pool, shared by all clients.
+
+    Args:
+    pool_size (int, optional): Connections kept open to the API host. Defaults to 16.
+
+    Returns:
+    Session: The session.
+    """
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, pool_block=True)
+    session.mount('https://', adapter)
+    return session
+
+
+class BrokerClient(KiteConnect):
+    """
+    KiteConnect client sending its requests through a shared session and its API key's rate limiter.
+
+    Every API call of the client (historical_data, ltp, orders, place_order, GTTs, ...)
+    waits for its endpoint's rate limit in the RateLimiter of its API key, so the calls
+    of all threads using the key together stay within Kite's limits, which apply per key.
+    """
+
+    def __init__(self, api_key, access_token=None, limiter=None, session=None, **kwargs):
+        """
+        Args:
+        api_key (str): API key of the account.
+        access_token (str, optional): Access token of the session. Defaults to None.
+        limiter (RateLimiter, optional): Rate limiter of the API key, no limits if None. Defaults to None.
+        session (Session, optional): Shared HTTP session from create_session. Defaults to None.
+        **kwargs: Other KiteConnect arguments.
+        """
+        super().__init__(api_key, access_token=access_token, **kwargs)
+        if session is not None:
+            self.reqsession = session
+        self.limiter = limiter
+
+    def _request(self, route, method, *args, **kwargs):
+        if self.limiter is None:
+            return super()._request(route, method, *args, **kwargs)
+        self.limiter.acquire(route_endpoint(route, method), route_priority(route, method))
+        try:
+            return super()._request(route, method, *args, **kwargs)
+        finally:
+            self.limiter.release()
+
+
+def connect_accounts(users, login_details, access_tokens, session=None, max_in_flight=8):
+    """
+    Create a BrokerClient for each user, sharing one session and with one rate limiter per API key.
+
+    Kite's rate limits apply per API key, so accounts with their own keys have their own
+    limits and only accounts logged in with the same key share a limiter.
+
+    Args:
+    users (list): User ids.
+    login_details (dict): Login details per user id, with the api_key.
+    access_tokens (dict): Access token per user id.
+    session (Session, optional): Shared HTTP session. Defaults to one from create_session.
+    max_in_flight (int, optional): Calls in flight at once per API key. Defaults to 8.
+
+    Returns:
+    dict: BrokerClient per user id.
+    """
+    session = session or create_session()
+    limiters = dict()
+    accounts = dict()
+    for user in users:
+        api_key = login_details[user]['api_key']
+        if api_key not in limiters:
+            limiters[api_key] = RateLimiter(ENDPOINT_LIMITS, max_in_flight=max_in_flight)
+        accounts[user] = BrokerClient(api_key, access_tokens[user], limiter=limiters[api_key], session=session)
+    return accounts
+
+
+def benchmark(historical_calls=12, order_calls=10, latency=0.05):
+    """
+    Start a burst of historical data calls, then order calls, through one RateLimiter.
+
+    Shows the queue wait per endpoint: historical calls are spread to 3/s while the
+    order calls arriving behind them go first.
+    """
+    limiter = RateLimiter(ENDPOINT_LIMITS, max_in_flight=4)
+
+    def call(route, method):
+        limiter.acquire(route_endpoint(route, method), route_priority(route, method))
+        time.sleep(latency)
+        limiter.release()
+
+    threads = [threading.Thread(target=call, args=('market.historical', 'GET')) for _ in range(historical_calls)]
+    for thread in threads:
+        thread.start()
+    time.sleep(0.1)
+    order_threads = [threading.Thread(target=call, args=('order.place', 'POST')) for _ in range(order_calls)]
+    for thread in order_threads:
+        thread.start()
+    for thread in threads + order_threads:
+        thread.join()
+
+    for endpoint, metrics in limiter.summary().items():
+        if metrics['calls']:
+            print('{:10}: {:3} calls, wait mean {:6.3f} s, max {:6.3f} s'.format(
+                endpoint, metrics['calls'], metrics['wait_mean'], metrics['wait_max']))
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    benchmark()
@@ -0,0 +1,241 @@
+import os
+import json
+import datetime
+import threading
+import pytz
+import numpy as np
+import pandas as pd
+
+IST = pytz.timezone('Asia/Kolkata')
+DAY = pd.Timedelta(days=1)
+IST_OFFSET = pd.Timedelta(hours=5, minutes=30)
+MARKET_CLOSE_OFFSET = pd.Timedelta(hours=15, minutes=30)
+
+# Candle length and the maximum number of days Kite serves per historical request
+INTERVAL_LENGTH = {
+    'minute': pd.Timedelta(minutes=1),
+    '3minute': pd.Timedelta(minutes=3),
+    '5minute': pd.Timedelta(minutes=5),
+    '10minute': pd.Timedelta(minutes=10),
+    '15minute': pd.Timedelta(minutes=15),
+    '30minute': pd.Timedelta(minutes=30),
+    '60minute': pd.Timedelta(minutes=60),
+    'day': pd.Timedelta(days=1),
+}
+MAX_DAYS = {'minute': 60, '3minute': 100, '5minute': 100, '10minute': 100, '15minute': 200,
+            '30minute': 200, '60minute': 400, 'day': 2000}
+
+CANDLE_DTYPE = np.dtype([('date', 'i8'), ('open', 'f8'), ('high', 'f8'), ('low', 'f8'),
+                         ('close', 'f8'), ('volume', 'i8')])
+
+
+def to_timestamp(value):
+    """
+    Convert a date string or datetime to a timezone aware IST timestamp.
+
+    Args:
+    value (str or datetime): The date.
+
+    Returns:
+    Timestamp: The timestamp in IST.
+    """
+    ts = pd.Timestamp(value)
+    if ts.tzinfo is None:
+        return ts.tz_localize(IST)
+    return ts.tz_convert(IST)
+
+
+def candle_close_times(dates, interval):
+    """
+    Get the times at which candles close, capped at the market close of their session.
+
+    Args:
+    dates (ndarray): Candle start times as UTC nanoseconds.
+    interval (str): The candle interval.
+
+    Returns:
+    ndarray: Candle closing times as UTC nanoseconds.
+    """
+    dates = np.asarray(dates, dtype='i8')
+    ends = dates + INTERVAL_LENGTH[interval].value
+    if interval == 'day':
+        return ends
+    offset = IST_OFFSET.value
+    session_close = (dates + offset) // DAY.value * DAY.value - offset + MARKET_CLOSE_OFFSET.value
+    return np.minimum(ends, session_close)
+
+
+def to_array(data):
+    """
+    Convert candles returned by kite.historical_data to a candle record array.
+
+    Args:
+    data (list): List of candle dicts.
+
+    Returns:
+    ndarray: Candle records.
+    """
+    candles = np.empty(len(data), dtype=CANDLE_DTYPE)
+    if len(data) == 0:
+        return candles
+    df = pd.DataFrame(data)
+    candles['date'] = pd.to_datetime(df['date'], utc=True).values.astype('i8')
+    for name in CANDLE_DTYPE.names[1:]:
+        candles[name] = df[name].values
+    return candles
+
+
+def to_frame(candles):
+    """
+    Convert candle records to a DataFrame shaped like kite.historical_data output.
+
+    Args:
+    candles (ndarray): Candle records.
+
+    Returns:
+    DataFrame: Historical data.
+    """
+    df = pd.DataFrame({name: candles[name] for name in CANDLE_DTYPE.names})
+    df['date'] = pd.to_datetime(df['date'], utc=True).dt.tz_convert(IST)
+    return df
+
+
+class CandleStore:
+    """
+    Persistent OHLCV candle cache keyed by instrument token and interval.
+
+    Completed candles are stored as NumPy record files under data/candles and memory
+    mapped on read. Only the missing tail after the last stored candle is requested
+    from Kite, and the in-progress candle is never written to disk. Different tokens
+    can be fetched from several threads at once.
+    """
+
+    def __init__(self, kite, path='data/candles'):
+        """
+        Args:
+        kite (KiteConnect): KiteConnect instance with historical API access.
+        path (str, optional): Directory for the candle files. Defaults to 'data/candles'.
+        """
+        self.kite = kite
+        self.path = path
+        self.partial = dict()
+        self.calls = 0
+        self._lock = threading.Lock()
+        os.makedirs(path, exist_ok=True)
+
+        # Earliest date each stored series has been fetched from
+        self.coverage_file = os.path.join(path, 'coverage.json')
+        self.coverage = dict()
+        if os.path.exists(self.coverage_file):
+            with open(self.coverage_file, 'r') as f:
+                self.coverage = json.load(f)
+
+    def _file(self, token, interval):
+        return os.path.join(self.path, '{}_{}.npy'.format(int(token), interval))
+
+    def load(self, token, interval):
+        """
+        Load the stored candles of a token.
+
+        Args:
+        token (int): The instrument token.
+        interval (str): The candle interval.
+
+        Returns:
+        ndarray: Candle records, empty if nothing is stored.
+        """
+        file = self._file(token, interval)
+        if not os.path.exists(file):
+            return np.empty(0, dtype=CANDLE_DTYPE)
+        return np.load(file, mmap_mode='r')
+
+    def save(self, token, interval, candles):
+        """
+        Atomically replace the stored candles of a token.
+
+        Args:
+        token (int): The instrument token.
+        interval (str): The candle interval.
+        candles (ndarray): Candle records.
+        """
+        file = self._file(token, interval)
+        tmp_file = file + '.tmp'
+        with open(tmp_file, 'wb') as f:
+            np.save(f, candles)
+        os.replace(tmp_file, file)
+
+    def fetch(self, token, from_date, to_date, interval):
+        """
+        Fetch candles from Kite, splitting the range into requests Kite accepts.
+
+        Args:
+        token (int): The instrument token.
+        from_date (Timestamp): The start date.
+        to_date (Timestamp): The end date.
+        interval (str): The candle interval.
+
+        Returns:
+        ndarray: Candle records.
+        """
+        chunks = []
+        step = datetime.timedelta(days=MAX_DAYS[interval])
+        start = from_date
+        while start <= to_date:
+            end = min(start + step, to_date)
+            data = self.kite.historical_data(int(token), start.strftime('%Y-%m-%d %H:%M:%S'),
+                                             end.strftime('%Y-%m-%d %H:%M:%S'), interval)
+            with self._lock:
+                self.calls += 1
+            chunks.append(to_array(data))
+            start = end + datetime.timedelta(seconds=1)
+        if len(chunks) == 0:
+            return np.empty(0, dtype=CANDLE_DTYPE)
+        candles = np.concatenate(chunks)
+        _, index = np.unique(candles['date'], return_index=True)
+        return candles[index]
+
+    def get(self, token, from_date, to_date, interval, include_partial=False):
+        """
+        Get candles for a token, fetching only the candles missing from the store.
+
+        Args:
+        token (int): The instrument token.
+        from_date (str): The start date.
+        to_date (str): The end date.
+        interval (str): The interval for the data.
+        include_partial (bool, optional): Append the in-progress candle, if any. Defaults to False.
+
+        Returns:
+        DataFrame: Historical data of the completed candles.
+        """
+        from_date = to_timestamp(from_date)
+        to_date = to_timestamp(to_date)
+        now = pd.Timestamp.now(tz=IST)
+        key = '{}_{}'.format(int(token), interval)
+        stored = self.load(token, interval)
+
+        if len(stored) > 0 and self.coverage.get(key, stored['date'][0]) <= from_date.value:
+            fetch_from = to_timestamp(pd.Timestamp(stored['date'][-1], tz='UTC')) + INTERVAL_LENGTH[interval]
+        else:
+            stored = np.empty(0, dtype=CANDLE_DTYPE)
+            fetch_from = from_date
+
+        if include_partial or candle_close_times([fetch_from.value], interval)[0] <= min(to_date, now).value:
+            fetched = self.fetch(token, fetch_from, to_date, interval)
+            if len(stored) > 0:
+                fetched = fetched[fetched['date'] > stored['date'][-1]]
+            completed = candle_close_times(fetched['date'], interval) <= now.value
+            self.partial[(int(token), interval)] = fetched[~completed]
+            if len(stored) == 0:
+                with self._lock:
+                    self.coverage[key] = from_date.value
+                    with open(self.coverage_file, 'w') as f:
+                        json.dump(self.coverage, f)
+            if completed.any() or len(stored) == 0:
+                stored = np.concatenate([stored, fetched[completed]])
+                self.save(token, interval, stored)
+
+        candles = stored[(stored['date'] >= from_date.value) & (stored['date'] <= to_date.value)]
+        if include_partial:
+            candles = np.concatenate([candles, self.partial.get((int(token), interval), candles[:0])])
+        return to_frame(candles)
@@ -0,0 +1,88 @@
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+
+class OrderDispatcher:
+    """
+    Fan order calls out to every account in parallel.
+
+    Each account has its own KiteConnect client. The clients share one keep-alive HTTP
+    connection pool, with a rate limiter per API key (see broker.connect_accounts), so
+    the calls of different accounts run concurrently on a thread pool and the last
+    account is no longer filled seconds after the first.
+    """
+
+    def __init__(self, accounts, max_workers=None):
+        """
+        Args:
+        accounts (dict): KiteConnect instance per user id.
+        max_workers (int, optional): Number of threads. Defaults to the number of accounts.
+        """
+        self.accounts = accounts
+        self.executor = ThreadPoolExecutor(max_workers=max_workers or max(len(accounts), 1),
+                                           thread_name_prefix='order-dispatcher')
+
+    def submit(self, func, users, *args):
+        """
+        Submit a call for each user, passing the user's account as the last argument.
+
+        Args:
+        func (func): Order function taking the account last, e.g. place_order.
+        users (list): User ids to place the order for.
+        *args: Arguments passed to func before the account.
+
+        Returns:
+        dict: User id per future.
+        """
+        return {self.executor.submit(func, *args, self.accounts[user]): user for user in users}
+
+    def dispatch(self, func, users, *args):
+        """
+        Call func for every user in parallel and yield the results as they arrive.
+
+        Args:
+        func (func): Order function taking the account last, e.g. place_order.
+        users (list): User ids to place the order for.
+        *args: Arguments passed to func before the account.
+
+        Yields:
+        tuple: User id and the result of func.
+        """
+        futures = self.submit(func, users, *args)
+        for future in as_completed(futures):
+            yield futures[future], future.result()
+
+    def dispatch_all(self, func, users, *args):
+        """
+        Call func for every user in parallel and wait for all of them.
+
+        Returns:
+        dict: Result of func per user id.
+        """
+        return dict(self.dispatch(func, users, *args))
+
+    def shutdown(self):
+        self.executor.shutdown(wait=True)
+
+
+if __name__ == '__main__':
+    from mock_broker import MockBroker
+
+    def place_order(symbol, transaction_type, quantity, acc):
+        return acc.place_order(variety='regular', exchange='NFO', tradingsymbol=symbol,
+                               transaction_type=transaction_type, quantity=quantity, product='NRML',
+                               order_type='MARKET', validity='DAY')
+
+    users = ['USER{}'.format(i) for i in range(10)]
+    accounts = {user: MockBroker(user, latency=0.25, prices={'NIFTY24JAN21000CE': 100}) for user in users}
+
+    start = time.perf_counter()
+    for user in users:
+        place_order('NIFTY24JAN21000CE', 'BUY', 50, accounts[user])
+    print('Sequential: {:.2f}s'.format(time.perf_counter() - start))
+
+    dispatcher = OrderDispatcher(accounts)
+    start = time.perf_counter()
+    for user, order_id in dispatcher.dispatch(place_order, users, 'NIFTY24JAN21000CE', 'BUY', 50):
+        print('{} {} after {:.2f}s'.format(user, order_id, time.perf_counter() - start))
+    dispatcher.shutdown()
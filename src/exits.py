@@ -0,0 +1,118 @@
+import logging
+import numpy as np
+import pandas as pd
+
+ORDER_COLUMNS = ['User_id', 'order_id', 'tradingsymbol', 'transaction_type', 'status', 'average_price',
+                 'exchange_update_timestamp']
+GTT_COLUMNS = ['User_id', 'Order_id', 'gtt_status', 'result_order_id', 'result_leg', 'stop_loss', 'target']
+# Exit_type of each leg of the two-leg GTTs, whose legs are the stop loss and the target
+EXIT_TYPES = ['Trailing_SL', 'Target']
+
+
+def fetch_book(acc):
+    """
+    Fetch the order book and GTT list of an account.
+
+    Args:
+    acc (Account): User's account.
+
+    Returns:
+    list: Orders of the day.
+    list: GTTs of the account.
+    """
+    return acc.orders(), acc.get_gtts()
+
+
+def fetch_account_books(dispatcher, users):
+    """
+    Fetch the order book and GTT list of every account once, in parallel.
+
+    Accounts whose requests fail are left out, so their positions stay open this cycle.
+
+    Args:
+    dispatcher (OrderDispatcher): Dispatcher holding the accounts.
+    users (list): User ids to fetch.
+
+    Returns:
+    DataFrame: Orders of all accounts with a User_id column.
+    DataFrame: GTTs of all accounts with their status and the order id of the triggered leg.
+    """
+    orders = []
+    gtts = []
+    futures = dispatcher.submit(fetch_book, users)
+    for future, user in futures.items():
+        try:
+            user_orders, user_gtts = future.result()
+        except Exception as e:
+            logging.info("Order book request failed for {}: {}".format(user, e))
+            continue
+        for order in user_orders:
+            orders.append([user] + [order.get(column) for column in ORDER_COLUMNS[1:]])
+        for gtt in user_gtts:
+            result_order_id = result_leg = None
+            for i, leg in enumerate(gtt.get('orders') or []):
+                result = leg.get('result') or dict()
+                order_result = result.get('order_result') or dict()
+                if order_result.get('order_id'):
+                    result_order_id, result_leg = str(order_result['order_id']), i
+            trigger_values = list((gtt.get('condition') or dict()).get('trigger_values') or []) + [None, None]
+            gtts.append([user, gtt['id'], gtt['status'], result_order_id, result_leg] + trigger_values[:2])
+
+    orders = pd.DataFrame(orders, columns=ORDER_COLUMNS)
+    orders['order_id'] = orders['order_id'].astype(str)
+    return orders, pd.DataFrame(gtts, columns=GTT_COLUMNS)
+
+
+def detect_exits(sl_orders, orders, gtts):
+    """
+    Resolve which GTT protected positions have exited, in one join over all accounts.
+
+    A position exits when the sell order of its triggered GTT is complete. If a triggered
+    GTT does not name its order, the last SELL order for the symbol placed after the
+    position's own BUY is used. Positions whose GTT has not triggered never exit, even if
+    an earlier position in the same symbol was sold.
+
+    Args:
+    sl_orders (DataFrame): Open GTT orders with Position_id, User_id, Order_id, Symbol and Buy_order_id.
+    orders (DataFrame): Orders of all accounts in the order of the order book, from fetch_account_books.
+    gtts (DataFrame): GTTs of all accounts, from fetch_account_books.
+
+    Returns:
+    DataFrame: Exit data with Position_id, User_id, Sell_order_id, Sell_time, Sell_price and Exit_type.
+    list: Index of the sl_orders rows that have exited.
+    """
+    orders = orders.assign(seq=orders.groupby('User_id').cumcount())
+    sells = orders[orders['transaction_type'] == 'SELL']
+    buys = orders.loc[orders['transaction_type'] == 'BUY', ['User_id', 'order_id', 'seq']]
+
+    df = sl_orders.reset_index().merge(gtts, how='left', on=['User_id', 'Order_id'])
+    by_result = df.merge(sells, how='left', left_on=['User_id', 'result_order_id'], right_on=['User_id', 'order_id'])
+    matched = by_result[ORDER_COLUMNS[1:]].copy()
+
+    # Sells of the symbol after the position's BUY, which is not in the day's order book for
+    # positions carried over from an earlier day
+    buy_seq = df[['User_id']].assign(Buy_order_id=df['Buy_order_id'].astype(str)).merge(
+        buys.rename(columns={'order_id': 'Buy_order_id', 'seq': 'buy_seq'}), how='left',
+        on=['User_id', 'Buy_order_id'])['buy_seq'].fillna(-1).values
+    candidates = df[['User_id', 'Symbol']].assign(row=np.arange(len(df)), buy_seq=buy_seq).merge(
+        sells, left_on=['User_id', 'Symbol'], right_on=['User_id', 'tradingsymbol'])
+    last_sells = candidates[candidates['seq'] > candidates['buy_seq']].groupby('row').tail(1).set_index('row')
+    fallback = (by_result['order_id'].isna() & (df['gtt_status'] == 'triggered')).values
+    fallback_rows = np.flatnonzero(fallback & np.isin(np.arange(len(df)), last_sells.index))
+    matched.loc[fallback_rows, :] = last_sells.loc[fallback_rows, ORDER_COLUMNS[1:]].values
+
+    exited = ((matched['status'] == 'COMPLETE') & (df['gtt_status'] == 'triggered')).values
+    # The leg that filled, or the leg whose trigger is nearest the sell price if the GTT does not name it
+    price = pd.to_numeric(matched['average_price'], errors='coerce')
+    distance = {column: (price - pd.to_numeric(df[column], errors='coerce')).abs() for column in ['stop_loss', 'target']}
+    nearest_leg = (distance['target'] < distance['stop_loss']).astype(int)
+    leg = df['result_leg'].where(df['result_leg'].notna(), nearest_leg).fillna(0).astype(int)
+    exits = pd.DataFrame({
+        'Position_id': df['Position_id'].values[exited],
+        'User_id': df['User_id'].values[exited],
+        'Sell_order_id': df['Order_id'].values[exited],
+        'Sell_time': matched['exchange_update_timestamp'].values[exited],
+        'Sell_price': matched['average_price'].values[exited],
+        'Exit_type': np.array(EXIT_TYPES, dtype=object)[leg.values[exited]],
+    })
+    return exits, list(df['index'].values[exited])
@@ -0,0 +1,272 @@
+import sys
+import time
+import datetime
+import numpy as np
+import pandas as pd
+import pytz
+
+IST = pytz.timezone('Asia/Kolkata')
+EXPIRY_TIME = datetime.time(15, 30)
+YEAR = 365 * 86400
+
+MIN_VOL = 1e-4
+MAX_VOL = 5.0
+# Volatilities the implied volatility solver brackets its roots with
+VOL_GRID = np.concatenate([[MIN_VOL], np.geomspace(0.02, MAX_VOL, 15)])
+
+
+def norm_pdf(x):
+    return np.exp(-0.5 * x * x) / np.sqrt(2 * np.pi)
+
+
+def norm_cdf(x):
+    """
+    Standard normal CDF from the Numerical Recipes erfc approximation, with a relative error
+    below 1.2e-7 even far in the tails, where out of the money prices are computed.
+    """
+    x = np.asarray(x, dtype='f8')
+    z = np.abs(x) / np.sqrt(2)
+    t = 1 / (1 + 0.5 * z)
+    poly = -1.26551223 + t * (1.00002368 + t * (0.37409196 + t * (0.09678418 + t * (-0.18628806 + t * (
+        0.27886807 + t * (-1.13520398 + t * (1.48851587 + t * (-0.82215223 + t * 0.17087277))))))))
+    tail = 0.5 * t * np.exp(poly - z * z)
+    return np.where(x >= 0, 1 - tail, tail)
+
+
+def time_to_expiry(expiry, now=None):
+    """
+    Get the time left until an expiry's market close, in years.
+
+    Args:
+    expiry (str): Expiry date as YYYY-MM-DD.
+    now (datetime, optional): Current time. Defaults to now.
+
+    Returns:
+    float: Years to expiry, at least one second.
+    """
+    now = now or datetime.datetime.now(IST)
+    close = IST.localize(datetime.datetime.combine(datetime.date.fromisoformat(expiry), EXPIRY_TIME))
+    return max((close - now).total_seconds(), 1) / YEAR
+
+
+def _d1_d2(spot, strikes, t, vol, rate):
+    sqrt_t = np.sqrt(t)
+    d1 = (np.log(spot / strikes) + (rate + 0.5 * vol * vol) * t) / (vol * sqrt_t)
+    return d1, d1 - vol * sqrt_t
+
+
+def _otm_price(spot, discounted, log_moneyness, total_vol, sign):
+    # Price of the out of the money option of a strike, a call for sign 1 and a put for sign -1
+    d1 = log_moneyness / total_vol + 0.5 * total_vol
+    # Both CDFs in one call, halving the NumPy calls on these small arrays
+    cdf = norm_cdf(np.stack([d1, d1 - total_vol]) * sign)
+    return sign * (spot * cdf[0] - discounted * cdf[1])
+
+
+def bs_price(spot, strikes, t, vol, rate, is_call):
+    """
+    Black-Scholes price of European options.
+
+    Args:
+    spot (float): Spot price of the underlying.
+    strikes (ndarray): Strike prices.
+    t (float): Years to expiry.
+    vol (ndarray): Volatilities.
+    rate (float): Risk free rate.
+    is_call (ndarray): True for calls, False for puts.
+
+    Returns:
+    ndarray: Option prices.
+    """
+    d1, d2 = _d1_d2(spot, strikes, t, vol, rate)
+    discounted = strikes * np.exp(-rate * t)
+    call = spot * norm_cdf(d1) - discounted * norm_cdf(d2)
+    return np.where(is_call, call, call - spot + discounted)
+
+
+def implied_volatility(prices, spot, strikes, t, rate, is_call, min_value=0.05, tol=1e-6, max_iter=20):
+    """
+    Solve the Black-Scholes implied volatility of many options at once.
+
+    Each option is bracketed on VOL_GRID and Newton starts from the interpolation. Its steps
+    are kept inside a bracket that shrinks every iteration, falling back to bisection when a
+    step leaves it, and only the options not converged yet are iterated. Options with less
+    than min_value of time value (one tick by default) are left out, as their price barely
+    depends on volatility.
+
+    Args:
+    prices (ndarray): Option prices.
+    spot (float): Spot price of the underlying.
+    strikes (ndarray): Strike prices.
+    t (float): Years to expiry.
+    rate (float): Risk free rate.
+    is_call (ndarray): True for calls, False for puts.
+    min_value (float, optional): Least time value to solve for. Defaults to 0.05.
+    tol (float, optional): Volatility tolerance. Defaults to 1e-6.
+    max_iter (int, optional): Most iterations. Defaults to 20.
+
+    Returns:
+    ndarray: Implied volatilities, NaN for unsolvable prices.
+    """
+    prices = np.asarray(prices, dtype='f8')
+    strikes = np.broadcast_to(np.asarray(strikes, dtype='f8'), prices.shape)
+    is_call = np.broadcast_to(np.asarray(is_call, dtype=bool), prices.shape)
+    discounted = strikes * np.exp(-rate * t)
+    lower = np.where(is_call, np.maximum(spot - discounted, 0), np.maximum(discounted - spot, 0))
+    upper = np.where(is_call, spot, discounted)
+    with np.errstate(invalid='ignore'):
+        valid = (prices - lower >= min_value) & (prices < upper)
+    iv = np.full(prices.shape, np.nan)
+
+    # Solve for the out of the money side of each strike, whose price is the time value, by
+    # put-call parity. Its price is small and computed from the CDF tails, without cancellation.
+    index = np.flatnonzero(valid)
+    target = (prices - lower)[index]
+    discounted = discounted[index]
+    sign = np.where(discounted >= spot, 1.0, -1.0)
+    log_moneyness = np.log(spot / strikes[index]) + rate * t
+    sqrt_t = np.sqrt(t)
+    # Starting far from the root, e.g. in the wings, Newton would take many slow steps from
+    # the convex side, so every option is priced on the grid once to start close to it
+    grid_prices = _otm_price(spot, discounted[:, None], log_moneyness[:, None], VOL_GRID * sqrt_t,
+                             sign[:, None])
+    k = np.clip((grid_prices < target[:, None]).sum(axis=1), 1, len(VOL_GRID) - 1)
+    rows = np.arange(len(index))
+    lo, hi = VOL_GRID[k - 1], VOL_GRID[k]
+    p_lo, p_hi = grid_prices[rows, k - 1], grid_prices[rows, k]
+    # Interpolated in log price, which is much closer to linear in volatility than the price
+    with np.errstate(divide='ignore', invalid='ignore'):
+        log_lo = np.log(p_lo)
+        vol = lo + (hi - lo) * np.clip((np.log(target) - log_lo) / (np.log(p_hi) - log_lo), 0, 1)
+    vol = np.where(np.isfinite(vol), vol, 0.5 * (lo + hi))
+    for _ in range(max_iter):
+        if not len(index):
+            break
+        total_vol = vol * sqrt_t
+        diff = _otm_price(spot, discounted, log_moneyness, total_vol, sign) - target
+        vega = spot * norm_pdf(log_moneyness / total_vol + 0.5 * total_vol) * sqrt_t
+        above = diff > 0
+        hi = np.where(above, vol, hi)
+        lo = np.where(above, lo, vol)
+        with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+            newton = vol - diff / vega
+        new = np.where((newton > lo) & (newton < hi), newton, 0.5 * (lo + hi))
+        done = np.abs(new - vol) < tol
+        iv[index[done]] = new[done]
+        keep = ~done
+        index, target, discounted, sign, log_moneyness = (index[keep], target[keep], discounted[keep], sign[keep],
+                                                          log_moneyness[keep])
+        lo, hi, vol = lo[keep], hi[keep], new[keep]
+    return iv
+
+
+def greeks(spot, strikes, t, vol, rate, is_call):
+    """
+    Black-Scholes Greeks of many options at once.
+
+    Args:
+    spot (float): Spot price of the underlying.
+    strikes (ndarray): Strike prices.
+    t (float): Years to expiry.
+    vol (ndarray): Volatilities.
+    rate (float): Risk free rate.
+    is_call (ndarray): True for calls, False for puts.
+
+    Returns:
+    dict: delta, gamma, vega (per 1 volatility point) and theta (per day) arrays.
+    """
+    d1, d2 = _d1_d2(spot, strikes, t, vol, rate)
+    pdf = norm_pdf(d1)
+    sqrt_t = np.sqrt(t)
+    discounted = strikes * np.exp(-rate * t)
+    call_delta = norm_cdf(d1)
+    call_theta = -spot * pdf * vol / (2 * sqrt_t) - rate * discounted * norm_cdf(d2)
+    return {
+        'delta': np.where(is_call, call_delta, call_delta - 1),
+        'gamma': pdf / (spot * vol * sqrt_t),
+        'vega': spot * pdf * sqrt_t / 100,
+        'theta': np.where(is_call, call_theta, call_theta + rate * discounted) / 365,
+    }
+
+
+def chain_greeks(chain, spot, prices, rate, now=None):
+    """
+    Solve the implied volatility and Greeks of the options of an OptionChain.
+
+    Args:
+    chain (OptionChain): The chain.
+    spot (float): Spot price of the underlying.
+    prices (ndarray): Last price of each option of the chain, NaN where unknown.
+    rate (float): Risk free rate.
+    now (datetime, optional): Current time. Defaults to now.
+
+    Returns:
+    DataFrame: Symbol, Strike, Token, Price, IV, Delta, Gamma, Vega and Theta per option.
+    """
+    t = time_to_expiry(chain.expiry, now)
+    is_call = chain.option_type == 'CE'
+    iv = implied_volatility(prices, spot, chain.strikes, t, rate, is_call)
+    values = greeks(spot, chain.strikes, t, iv, rate, is_call)
+    return pd.DataFrame({'Symbol': chain.symbols, 'Strike': chain.strikes, 'Token': chain.tokens, 'Price': prices,
+                         'IV': iv, 'Delta': values['delta'], 'Gamma': values['gamma'], 'Vega': values['vega'],
+                         'Theta': values['theta']})
+
+
+def select_by_delta(chain, spot, prices, target_delta, rate, iv_range=None, now=None):
+    """
+    Get the option whose absolute delta is closest to a target, among the options with an IV in range.
+
+    Args:
+    chain (OptionChain): The chain.
+    spot (float): Spot price of the underlying.
+    prices (ndarray): Last price of each option of the chain, NaN where unknown.
+    target_delta (float): Absolute delta to select, e.g. 0.3.
+    rate (float): Risk free rate.
+    iv_range (tuple, optional): Lowest and highest IV allowed. Defaults to None.
+    now (datetime, optional): Current time. Defaults to now.
+
+    Returns:
+    str: The trading symbol, None if no option has a solvable IV in range.
+    """
+    table = chain_greeks(chain, spot, prices, rate, now)
+    eligible = table['IV'].notna()
+    if iv_range is not None:
+        eligible &= table['IV'].between(*iv_range)
+    if not eligible.any():
+        return None
+    distance = (table['Delta'].abs() - target_delta).abs().where(eligible)
+    return table['Symbol'].iloc[int(np.nanargmin(distance.values))]
+
+
+def benchmark(n_strikes=200, repeats=200):
+    """
+    Time solving the IV and Greeks of a monthly chain of calls and puts priced from a volatility
+    smile, at once and one contract at a time.
+    """
+    spot, rate, t = 19500.0, 0.07, 30 / 365
+    strikes = np.repeat(spot + 50 * (np.arange(n_strikes) - n_strikes // 2), 2).astype('f8')
+    is_call = np.tile([True, False], n_strikes)
+    moneyness = np.log(strikes / spot)
+    true_vol = 0.13 - 0.3 * moneyness + 3 * moneyness ** 2
+    prices = bs_price(spot, strikes, t, true_vol, rate, is_call)
+
+    start = time.perf_counter()
+    for _ in range(repeats):
+        iv = implied_volatility(prices, spot, strikes, t, rate, is_call)
+        greeks(spot, strikes, t, iv, rate, is_call)
+    elapsed = (time.perf_counter() - start) / repeats
+
+    start = time.perf_counter()
+    for i in range(len(prices)):
+        implied_volatility(prices[i:i + 1], spot, strikes[i:i + 1], t, rate, is_call[i:i + 1])
+    one_by_one = time.perf_counter() - start
+
+    solved = ~np.isnan(iv)
+    print('{} contracts, {} with a time value to solve'.format(len(strikes), solved.sum()))
+    print('Vectorized: {:.3f} ms per chain for IV and Greeks'.format(elapsed * 1e3))
+    print('One by one: {:.3f} ms per chain for IV'.format(one_by_one * 1e3))
+    print('Max IV error {:.2e}'.format(np.abs(iv - true_vol)[solved].max()))
+
+
+if __name__ == '__main__':
+    benchmark(*[int(arg) for arg in sys.argv[1:]])
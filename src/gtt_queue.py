@@ -0,0 +1,244 @@
+import sys
+import time
+import logging
+import threading
+from functools import partial
+from collections import OrderedDict, namedtuple
+from rate_limit import TokenBucket
+from utils import modify_gtt_order, gtt_orders
+
+# Outcome of a queued modification, order_id is None if it failed after all retries
+GttModifyResult = namedtuple('GttModifyResult', ['key', 'user', 'trigger_id', 'order_id'])
+
+
+class GttModifyQueue:
+    """
+    Background queue of GTT modifications, coalesced per trigger and rate limited.
+
+    A modification submitted while an older one for the same trigger is still queued
+    replaces it, so a fast moving stop loss costs one call per trigger instead of one
+    per move. Calls of all accounts share one token bucket, and failed calls are
+    retried with exponential backoff unless a newer modification replaced them.
+    Cancelled triggers are never modified again, including retries and modifications
+    already taken off the queue.
+    """
+
+    def __init__(self, accounts, rate=10, max_retries=3, backoff=0.5, modify=modify_gtt_order):
+        """
+        Args:
+        accounts (dict): KiteConnect instance per user id.
+        rate (float, optional): Modify calls per second across all accounts. Defaults to 10.
+        max_retries (int, optional): Retries of a failed call. Defaults to 3.
+        backoff (float, optional): Seconds before the first retry, doubled on each retry. Defaults to 0.5.
+        modify (func, optional): Function making the call, with the arguments of modify_gtt_order. Defaults to modify_gtt_order.
+        """
+        self.accounts = accounts
+        self.bucket = TokenBucket(rate)
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.modify = modify
+        self.pending = OrderedDict()
+        self.in_flight = set()
+        self.cancelled = set()
+        self.results = []
+        self.stats = {'submitted': 0, 'coalesced': 0, 'calls': 0, 'retries': 0, 'failed': 0, 'cancelled': 0}
+        self._closed = False
+        self._condition = threading.Condition()
+        self._thread = threading.Thread(target=self._run, name='gtt-modify-queue', daemon=True)
+        self._thread.start()
+
+    def submit(self, triggers, limit_prices, last_price, symbol, quantity, key=None):
+        """
+        Queue a modification of the two-leg GTTs of a position, one per account.
+
+        Args:
+        triggers (dict): GTT trigger id per user id.
+        limit_prices (list): New stop loss and target prices.
+        last_price (float): Last traded price.
+        symbol (str): Trading symbol.
+        quantity (int): Quantity of the sell legs.
+        key (optional): Value returned with the results, e.g. the Position_id. Defaults to None.
+        """
+        orders = gtt_orders(symbol, 'SELL', quantity, limit_prices)
+        with self._condition:
+            for user, trigger_id in triggers.items():
+                if (user, trigger_id) in self.cancelled:
+                    continue
+                self.stats['submitted'] += 1
+                if (user, trigger_id) in self.pending:
+                    self.stats['coalesced'] += 1
+                self.pending[(user, trigger_id)] = {
+                    'key': key,
+                    'limit_prices': list(limit_prices),
+                    'last_price': last_price,
+                    'symbol': symbol,
+                    'quantity': quantity,
+                    'orders': orders,
+                    'attempts': 0,
+                    'not_before': 0,
+                }
+            self._condition.notify_all()
+
+    def cancel(self, user, trigger_id):
+        """
+        Stop modifying a GTT, e.g. after it has triggered.
+
+        Its queued modification is dropped, and the trigger is checked before every later
+        attempt, so a call waiting for the rate limit or a retry is not made.
+        """
+        with self._condition:
+            self.cancelled.add((user, trigger_id))
+            if self.pending.pop((user, trigger_id), None) is not None:
+                self.stats['cancelled'] += 1
+            self._condition.notify_all()
+
+    def drain(self):
+        """
+        Get the results of the modifications completed since the last call.
+
+        Returns:
+        list: GttModifyResult per completed modification.
+        """
+        with self._condition:
+            results, self.results = self.results, []
+        return results
+
+    def join(self, timeout=None):
+        """
+        Wait until no modification is queued or in flight.
+
+        Returns:
+        bool: True if the queue emptied before the timeout.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._condition:
+            while self.pending or self.in_flight:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._condition.wait(remaining)
+        return True
+
+    def close(self):
+        self.join()
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+        self._thread.join()
+        logging.info("GTT modify queue: {}".format(self.stats))
+
+    def _next(self):
+        now = time.monotonic()
+        wait = None
+        for trigger, request in self.pending.items():
+            if trigger in self.in_flight:
+                continue
+            if request['not_before'] <= now:
+                return trigger, 0
+            wait = request['not_before'] - now if wait is None else min(wait, request['not_before'] - now)
+        return None, wait
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while True:
+                    if self._closed and not self.pending:
+                        return
+                    trigger, wait = self._next()
+                    if trigger is not None:
+                        break
+                    self._condition.wait(wait)
+                request = self.pending.pop(trigger)
+                self.in_flight.add(trigger)
+
+            user, trigger_id = trigger
+            order_id = None
+            called = False
+            try:
+                self.bucket.acquire()
+                # The GTT may have been cancelled while this call waited for the rate limit
+                with self._condition:
+                    called = trigger not in self.cancelled
+                if called:
+                    order_id = self.modify(trigger_id, 'two-leg', request['limit_prices'], request['limit_prices'],
+                                           request['last_price'], request['symbol'], 'SELL', request['quantity'],
+                                           self.accounts[user], orders=request['orders'])
+            except Exception as e:
+                # A raising call is a failed attempt, retried like one returning None
+                logging.info("GTT modify of {} failed: {}".format(trigger_id, e))
+            finally:
+                with self._condition:
+                    self.in_flight.discard(trigger)
+                    self.stats['calls' if called else 'cancelled'] += 1
+                    if trigger in self.cancelled:
+                        # A cancelled GTT is not retried or reported
+                        pass
+                    elif order_id is None and trigger not in self.pending and request['attempts'] < self.max_retries:
+                        request['not_before'] = time.monotonic() + self.backoff * 2 ** request['attempts']
+                        request['attempts'] += 1
+                        self.pending[trigger] = request
+                        self.stats['retries'] += 1
+                    elif order_id is not None or trigger not in self.pending:
+                        if order_id is None:
+                            self.stats['failed'] += 1
+                        self.results.append(GttModifyResult(request['key'], user, trigger_id, order_id))
+                    self._condition.notify_all()
+
+
+def benchmark(n_positions=20, moves=30, move_interval=0.01, rate=10, errors_path=None):
+    """
+    Replay a fast market's stop loss moves against MockBroker accounts limited to rate calls per second.
+
+    Compares modifying every GTT inline on each move with the coalescing queue. Rejected
+    calls go through the real error handling, which saves them to errors_path, a
+    temporary file if None.
+    """
+    import os
+    import tempfile
+    from mock_broker import MockBroker
+
+    workdir = tempfile.TemporaryDirectory() if errors_path is None else None
+    errors_path = errors_path or os.path.join(workdir.name, 'runtime_errors.csv')
+    modify = partial(modify_gtt_order, errors_path=errors_path)
+
+    def run(use_queue):
+        accounts = {user: MockBroker(user, latency=0.01, prices={'SYM': 100}) for user in ['USER1', 'USER2']}
+        triggers = {position: {user: acc.place_gtt('two-leg', 'SYM', 'NFO', [73, 600], 100, [{}, {}])['trigger_id']
+                               for user, acc in accounts.items()} for position in range(n_positions)}
+        for acc in accounts.values():
+            acc.calls = 0
+            acc.rate_limit = rate
+        queue = GttModifyQueue(accounts, rate=rate, modify=modify) if use_queue else None
+        start = time.perf_counter()
+        for move in range(moves):
+            for position in range(n_positions):
+                limit_prices = [73 + move, 600]
+                if use_queue:
+                    queue.submit(triggers[position], limit_prices, 100, 'SYM', 50, key=position)
+                else:
+                    for user, trigger_id in triggers[position].items():
+                        modify(trigger_id, 'two-leg', limit_prices, limit_prices, 100, 'SYM', 'SELL', 50, accounts[user])
+            time.sleep(move_interval)
+        main_thread = time.perf_counter() - start
+        if use_queue:
+            queue.close()
+        total = time.perf_counter() - start
+        final = [acc.gtts[trigger_id]['condition']['trigger_values'][0]
+                 for position in triggers.values() for user, trigger_id in position.items()
+                 for acc in [accounts[user]]]
+        return (sum(acc.calls for acc in accounts.values()), sum(acc.rejected for acc in accounts.values()),
+                main_thread, total, all(value == 73 + moves - 1 for value in final))
+
+    try:
+        for label, use_queue in [('Inline', False), ('Queue', True)]:
+            calls, rejected, main_thread, total, converged = run(use_queue)
+            print('{:6}: {:4} modify calls, {:4} rate limit rejections, main thread {:.2f} s, total {:.2f} s, '
+                  'final stops {}'.format(label, calls, rejected, main_thread, total,
+                                          'all current' if converged else 'STALE'))
+    finally:
+        if workdir is not None:
+            workdir.cleanup()
+
+
+if __name__ == '__main__':
+    benchmark(*[int(arg) for arg in sys.argv[1:]])
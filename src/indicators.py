@@ -0,0 +1,238 @@
+import os
+import sys
+import json
+import numpy as np
+import pandas as pd
+from collections import deque
+
+
+class EMA:
+    """
+    Exponential Moving Average updated one value at a time.
+
+    Matches pandas ewm(span=period, adjust=False).mean().
+    """
+
+    def __init__(self, period, value=None):
+        self.period = period
+        self.alpha = 2 / (period + 1)
+        self.value = value
+
+    def update(self, x):
+        if self.value is None:
+            self.value = x
+        else:
+            self.value = self.value + self.alpha * (x - self.value)
+        return self.value
+
+    def preview(self, x):
+        """
+        Get the EMA as it would be if x closed the current candle, without updating it.
+        """
+        if self.value is None:
+            return x
+        return self.value + self.alpha * (x - self.value)
+
+
+class RollingStats:
+    """
+    Rolling mean and sample standard deviation over a fixed window, updated in O(1).
+
+    Matches pandas rolling(period).mean() and rolling(period).std().
+    """
+
+    def __init__(self, period, values=()):
+        self.period = period
+        self.values = deque(maxlen=period)
+        self.mean = 0.0
+        self.m2 = 0.0
+        for x in values:
+            self.update(x)
+
+    def update(self, x):
+        n = len(self.values)
+        if n < self.period:
+            self.values.append(x)
+            delta = x - self.mean
+            self.mean += delta / (n + 1)
+            self.m2 += delta * (x - self.mean)
+        else:
+            old = self.values[0]
+            self.values.append(x)
+            old_mean = self.mean
+            self.mean += (x - old) / self.period
+            self.m2 += (x - old) * (x - self.mean + old - old_mean)
+        return self.mean
+
+    def ready(self):
+        return len(self.values) == self.period
+
+    def std(self):
+        if len(self.values) < 2:
+            return np.nan
+        return np.sqrt(max(self.m2, 0) / (len(self.values) - 1))
+
+
+class IndicatorState:
+    """
+    EMA and Bollinger band state of a single instrument.
+    """
+
+    def __init__(self, ema_periods=(3, 13, 20), bb_period=20, bb_std=2, last_time=None):
+        self.emas = {period: EMA(period) for period in ema_periods}
+        self.bb = RollingStats(bb_period)
+        self.bb_std = bb_std
+        self.last_time = last_time
+
+    def update(self, close, candle_time=None):
+        """
+        Update every indicator with the close of a completed candle.
+
+        Args:
+        close (float): Closing price.
+        candle_time (str, optional): Time of the candle. Defaults to None.
+        """
+        for ema in self.emas.values():
+            ema.update(close)
+        self.bb.update(close)
+        self.last_time = candle_time
+
+    def ema(self, period):
+        return self.emas[period].value
+
+    def mbb(self, period=20):
+        """
+        Get the Middle Bollinger Band, NaN until the window is full like pandas rolling.
+        """
+        if period != self.bb.period:
+            raise ValueError('Bollinger band period {} is not tracked'.format(period))
+        return self.bb.mean if self.bb.ready() else np.nan
+
+    def ubb(self, period=20):
+        return self.mbb(period) + self.bb_std * self.bb.std()
+
+    def lbb(self, period=20):
+        return self.mbb(period) - self.bb_std * self.bb.std()
+
+    def preview(self, close):
+        """
+        Get the EMAs as they would be if close ended the in-progress candle.
+
+        Args:
+        close (float): Latest traded price.
+
+        Returns:
+        dict: EMA value per period.
+        """
+        return {period: ema.preview(close) for period, ema in self.emas.items()}
+
+    def to_dict(self):
+        return {'ema': {str(period): ema.value for period, ema in self.emas.items()},
+                'bb_period': self.bb.period,
+                'bb_std': self.bb_std,
+                'bb_values': list(self.bb.values),
+                'last_time': self.last_time}
+
+    @classmethod
+    def from_dict(cls, data):
+        state = cls(ema_periods=[int(period) for period in data['ema']], bb_period=data['bb_period'],
+                    bb_std=data['bb_std'], last_time=data['last_time'])
+        for period, value in data['ema'].items():
+            state.emas[int(period)].value = value
+        state.bb = RollingStats(data['bb_period'], data['bb_values'])
+        return state
+
+
+class IndicatorEngine:
+    """
+    Incremental indicators per instrument token, persisted across restarts.
+
+    Only candles newer than the last one seen are fed to the state, so each hourly
+    check costs O(1) per indicator instead of recomputing over the whole history.
+    """
+
+    def __init__(self, path='data/indicators.json'):
+        """
+        Args:
+        path (str, optional): File the indicator state is persisted to, None to keep it in memory. Defaults to 'data/indicators.json'.
+        """
+        self.path = path
+        self.states = dict()
+        if path and os.path.exists(path):
+            with open(path, 'r') as f:
+                self.states = {int(token): IndicatorState.from_dict(data) for token, data in json.load(f).items()}
+
+    def update_from_frame(self, token, df, column='close'):
+        """
+        Feed the candles of a DataFrame that the state has not seen yet.
+
+        Args:
+        token (int): The instrument token.
+        df (DataFrame): Completed candles with date and close columns.
+        column (str, optional): Name of the column to compute indicators on. Defaults to 'close'.
+
+        Returns:
+        IndicatorState: The updated state of the token.
+        """
+        token = int(token)
+        state = self.states.setdefault(token, IndicatorState())
+        dates = df['date'].astype(str).values
+        start = 0
+        if state.last_time is not None:
+            start = np.searchsorted(dates, state.last_time, side='right')
+        for candle_time, close in zip(dates[start:], df[column].values[start:]):
+            state.update(float(close), candle_time)
+        return state
+
+    def get(self, token):
+        return self.states.get(int(token))
+
+    def save(self):
+        """
+        Persist the state of every token.
+        """
+        if not self.path:
+            return
+        tmp_file = self.path + '.tmp'
+        with open(tmp_file, 'w') as f:
+            json.dump({str(token): state.to_dict() for token, state in self.states.items()}, f)
+        os.replace(tmp_file, self.path)
+
+
+def compare_with_pandas(df, column='close'):
+    """
+    Compare the incremental indicators with the pandas implementations after every candle.
+
+    Args:
+    df (DataFrame): Candles with date and close columns.
+    column (str, optional): Name of the column to compute indicators on. Defaults to 'close'.
+
+    Returns:
+    dict: Maximum absolute difference per indicator.
+    """
+    state = IndicatorState()
+    values = {name: [] for name in ['ema3', 'ema13', 'ema20', 'mbb', 'ubb']}
+    for close in df[column].values:
+        state.update(float(close))
+        values['ema3'].append(state.ema(3))
+        values['ema13'].append(state.ema(13))
+        values['ema20'].append(state.ema(20))
+        values['mbb'].append(state.mbb(20))
+        values['ubb'].append(state.ubb(20))
+
+    expected = {
+        'ema3': df[column].ewm(span=3, adjust=False).mean(),
+        'ema13': df[column].ewm(span=13, adjust=False).mean(),
+        'ema20': df[column].ewm(span=20, adjust=False).mean(),
+        'mbb': df[column].rolling(20).mean(),
+        'ubb': df[column].rolling(20).mean() + 2 * df[column].rolling(20).std(),
+    }
+    return {name: float(np.nanmax(np.abs(np.array(values[name]) - expected[name].values))) for name in values}
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1:
+        candles = pd.read_csv(sys.argv[1])
+    else:
+        candles = pd.DataFrame({'close': 20000 + np.cumsum(np.random.normal(0, 25, 10000))})
+    print(compare_with_pandas(candles))
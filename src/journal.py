@@ -0,0 +1,403 @@
+import os
+import sys
+import json
+import time
+import zlib
+import struct
+import tempfile
+import threading
+import numpy as np
+import pandas as pd
+from store import ENTRY_COLUMNS, SL_ORDER_COLUMNS
+
+# Record header: payload length, crc32 of type, timestamp and payload, event type, timestamp
+HEADER = struct.Struct('<IIBd')
+EVENT_TYPES = ['session_start', 'signal', 'order_placed', 'fill', 'order_failed', 'position_opened', 'gtt_placed',
+               'gtt_modified', 'tsl_moved', 'exit', 'position_closed', 'snapshot']
+EVENT_CODES = {event: code for code, event in enumerate(EVENT_TYPES)}
+
+# Per event latency the journal has to stay under, checked by benchmark()
+LATENCY_BUDGET = 0.0005
+
+
+def to_json_value(value):
+    if isinstance(value, np.generic):
+        return value.item()
+    return str(value)
+
+
+def encode(event, data, timestamp=None):
+    """
+    Encode an event as a binary journal record.
+
+    Args:
+    event (str): Event type, one of EVENT_TYPES.
+    data (dict): JSON serializable event data.
+    timestamp (float, optional): Event time in seconds since the epoch. Defaults to now.
+
+    Returns:
+    bytes: The record.
+    """
+    code = EVENT_CODES[event]
+    timestamp = time.time() if timestamp is None else timestamp
+    payload = json.dumps(data, separators=(',', ':'), default=to_json_value).encode()
+    crc = zlib.crc32(payload, zlib.crc32(struct.pack('<Bd', code, timestamp)))
+    return HEADER.pack(len(payload), crc, code, timestamp) + payload
+
+
+def read_records(path):
+    """
+    Read the valid records of a journal, stopping at the first torn or corrupt record.
+
+    Args:
+    path (str): Path to the journal.
+
+    Returns:
+    list: (event, timestamp, data) per record.
+    int: Length of the valid prefix of the file.
+    """
+    if not os.path.exists(path):
+        return [], 0
+    with open(path, 'rb') as f:
+        buffer = f.read()
+
+    records = []
+    offset = 0
+    while offset + HEADER.size <= len(buffer):
+        length, crc, code, timestamp = HEADER.unpack_from(buffer, offset)
+        end = offset + HEADER.size + length
+        if end > len(buffer) or code >= len(EVENT_TYPES):
+            break
+        payload = buffer[offset + HEADER.size:end]
+        if zlib.crc32(payload, zlib.crc32(struct.pack('<Bd', code, timestamp))) != crc:
+            break
+        records.append((EVENT_TYPES[code], timestamp, json.loads(payload)))
+        offset = end
+    return records, offset
+
+
+class EventJournal:
+    """
+    Append-only binary log of trading events with group commit.
+
+    Appends only copy the record into a buffer. A background thread writes and fsyncs
+    the buffer every flush_interval seconds, or as soon as a caller waits on it, so
+    one fsync covers every event appended since the last one.
+    """
+
+    def __init__(self, path='data/journal.log', flush_interval=0.005):
+        """
+        Args:
+        path (str, optional): Path to the journal. Defaults to 'data/journal.log'.
+        flush_interval (float, optional): Longest time an event stays unsynced. Defaults to 0.005.
+        """
+        self.path = path
+        self.flush_interval = flush_interval
+
+        # Drop a record torn by a crash in the middle of a write
+        _, valid_length = read_records(path)
+        if os.path.exists(path) and os.path.getsize(path) > valid_length:
+            with open(path, 'r+b') as f:
+                f.truncate(valid_length)
+
+        self._file = open(path, 'ab')
+        self._buffer = bytearray()
+        self._seq = 0
+        self._durable_seq = 0
+        self._closed = False
+        self._sync_requested = False
+        self._condition = threading.Condition()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def append(self, event, sync=False, **data):
+        """
+        Append an event.
+
+        Args:
+        event (str): Event type, one of EVENT_TYPES.
+        sync (bool, optional): Wait until the event is on disk. Defaults to False.
+        **data: Event data.
+
+        Returns:
+        int: Sequence number of the event.
+        """
+        record = encode(event, data)
+        with self._condition:
+            self._buffer += record
+            self._seq += 1
+            seq = self._seq
+        if sync:
+            self.wait(seq)
+        return seq
+
+    def wait(self, seq):
+        """
+        Wait until the event with the given sequence number is on disk.
+
+        Args:
+        seq (int): Sequence number returned by append.
+        """
+        with self._condition:
+            while self._durable_seq < seq:
+                self._sync_requested = True
+                self._condition.notify_all()
+                self._condition.wait()
+
+    def flush(self):
+        """
+        Wait until every appended event is on disk.
+        """
+        self.wait(self._seq)
+
+    def close(self):
+        self.flush()
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+        self._thread.join()
+        self._file.close()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                if not self._sync_requested and not self._closed:
+                    self._condition.wait(self.flush_interval)
+                if self._closed and len(self._buffer) == 0:
+                    return
+                buffer = self._buffer
+                seq = self._seq
+                self._buffer = bytearray()
+                self._sync_requested = False
+
+            if len(buffer) > 0:
+                self._file.write(buffer)
+                self._file.flush()
+                os.fsync(self._file.fileno())
+
+            with self._condition:
+                self._durable_seq = seq
+                self._condition.notify_all()
+
+
+class JournalState:
+    """
+    Strategy state rebuilt by replaying the journal.
+    """
+
+    def __init__(self, instruments):
+        """
+        Args:
+        instruments (list): Instruments traded by the strategy.
+        """
+        self.positions = dict()
+        self.sl_orders = dict()
+        self.trades = []
+        self.position_id = 0
+        self.events = 0
+        self.levels = {field: dict() for field in ['prev_high', 'tsl', 'tsl_increment', 'target']}
+        self.completed_orders = {'CE': dict(), 'PE': dict()}
+        for option_type in ['CE', 'PE']:
+            for inst in instruments:
+                self.completed_orders[option_type][inst] = 0
+
+    def apply(self, event, data):
+        """
+        Apply one journal event.
+
+        Args:
+        event (str): Event type.
+        data (dict): Event data.
+        """
+        self.events += 1
+        if event == 'session_start':
+            for option_type in self.completed_orders:
+                for inst in self.completed_orders[option_type]:
+                    self.completed_orders[option_type][inst] = 0
+        elif event == 'order_placed':
+            self.position_id = max(self.position_id, data['position_id'])
+        elif event == 'fill':
+            self.positions[(data['Position_id'], data['User_id'])] = data
+            self.position_id = max(self.position_id, data['Position_id'])
+        elif event == 'position_opened':
+            for field in self.levels:
+                self.levels[field][data['position_id']] = data[field]
+            for key, row in self.positions.items():
+                if key[0] == data['position_id']:
+                    row['Trailing_SL'] = data['tsl']
+        elif event in ['gtt_placed', 'gtt_modified']:
+            key = (data['position_id'], data['user'])
+            self.sl_orders[key] = [data['position_id'], data['user'], data['order_id'], data['symbol']]
+        elif event == 'tsl_moved':
+            self.levels['prev_high'][data['position_id']] = data['prev_high']
+            self.levels['tsl'][data['position_id']] = data['tsl']
+            for key, row in self.positions.items():
+                if key[0] == data['position_id']:
+                    row['Trailing_SL'] = data['tsl']
+        elif event == 'exit':
+            key = (data['Position_id'], data['User_id'])
+            self.sl_orders.pop(key, None)
+            if key in self.positions:
+                self.trades.append(dict(self.positions[key], **data))
+        elif event == 'position_closed':
+            for key in [key for key in self.positions if key[0] == data['position_id']]:
+                del self.positions[key]
+            for field in self.levels:
+                self.levels[field].pop(data['position_id'], None)
+            # Instruments no longer traded, e.g. after toggling SCAN_UNIVERSE, are counted too
+            counts = self.completed_orders[data['option']]
+            counts[data['inst']] = counts.get(data['inst'], 0) + 1
+        elif event == 'snapshot':
+            self.positions = {(row['Position_id'], row['User_id']): row for row in data['positions']}
+            self.sl_orders = {(row[0], row[1]): row for row in data['sl_orders']}
+            self.levels = {field: {position_id: value for position_id, value in data['levels'][field]}
+                           for field in self.levels}
+            self.position_id = max(self.position_id, data['position_id'])
+
+    def snapshot(self):
+        """
+        Get the open positions, GTT orders, trailing stop loss state and last position id as snapshot event data.
+        """
+        return {'positions': list(self.positions.values()), 'sl_orders': list(self.sl_orders.values()),
+                'levels': {field: list(values.items()) for field, values in self.levels.items()},
+                'position_id': self.position_id}
+
+    def positions_frame(self):
+        return pd.DataFrame(list(self.positions.values()), columns=ENTRY_COLUMNS)
+
+    def sl_orders_frame(self):
+        return pd.DataFrame(list(self.sl_orders.values()), columns=SL_ORDER_COLUMNS)
+
+
+def replay(path, instruments):
+    """
+    Rebuild the strategy state from a journal.
+
+    Args:
+    path (str): Path to the journal.
+    instruments (list): Instruments traded by the strategy.
+
+    Returns:
+    JournalState: The rebuilt state.
+    """
+    state = JournalState(instruments)
+    records, _ = read_records(path)
+    for event, _, data in records:
+        state.apply(event, data)
+    return state
+
+
+def compact(path, date):
+    """
+    Start a session's journal by rewriting it as a session_start and a snapshot of the state
+    carried over, so replay time and file size do not grow across sessions.
+
+    The compacted journal is written to a temporary file and moved over the old one, so a
+    crash leaves either journal complete. No EventJournal may have the file open.
+
+    Args:
+    path (str): Path to the journal.
+    date (str): Date of the session.
+
+    Returns:
+    JournalState: The state carried over.
+    """
+    state = replay(path, [])
+    state.apply('session_start', {'date': date})
+    state.trades = []
+    temp_path = path + '.tmp'
+    with open(temp_path, 'wb') as f:
+        f.write(encode('session_start', {'date': date}) + encode('snapshot', state.snapshot()))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_path, path)
+    return state
+
+
+def synthetic_events(n_positions, instruments=('NIFTY 50', 'NIFTY BANK'), users=('USER1', 'USER2')):
+    """
+    Generate the events of n_positions complete trades, for the benchmark.
+    """
+    events = [('session_start', {'date': '2023-01-02'})]
+    for position_id in range(1, n_positions + 1):
+        inst = instruments[position_id % len(instruments)]
+        option_type = ['CE', 'PE'][position_id % 2]
+        symbol = 'SYM{}{}'.format(position_id, option_type)
+        events.append(('signal', {'inst': inst, 'option': option_type, 'symbol': symbol}))
+        for user in users:
+            events.append(('order_placed', {'position_id': position_id, 'user': user, 'order_id': str(position_id),
+                                            'symbol': symbol}))
+        for user in users:
+            row = dict(zip(ENTRY_COLUMNS, [position_id, user, str(position_id), inst + option_type, inst, symbol,
+                                           option_type, 1, '2023-01-02 10:15:00', 100.0, 100.0, 50, 0,
+                                           '2023-01-02 09:15:00', 99.0, 101.0, 98.0, 100.0]))
+            events.append(('fill', row))
+        events.append(('position_opened', {'position_id': position_id, 'option': option_type, 'inst': inst,
+                                           'prev_high': 100.0, 'tsl_increment': 18.0, 'tsl': 73.0, 'target': 600.0}))
+        for user in users:
+            events.append(('gtt_placed', {'position_id': position_id, 'user': user, 'order_id': position_id,
+                                          'symbol': symbol}))
+        for step in range(1, 4):
+            events.append(('tsl_moved', {'position_id': position_id, 'option': option_type, 'inst': inst,
+                                         'prev_high': 100.0 + 18 * step, 'tsl': 73.0 + 18 * step}))
+            for user in users:
+                events.append(('gtt_modified', {'position_id': position_id, 'user': user, 'order_id': position_id,
+                                                'symbol': symbol}))
+        for user in users:
+            events.append(('exit', {'Position_id': position_id, 'User_id': user, 'Sell_order_id': position_id,
+                                    'Sell_time': '2023-01-02 11:00:00', 'Sell_price': 127.0,
+                                    'Exit_type': 'Trailing_SL'}))
+        events.append(('position_closed', {'position_id': position_id, 'option': option_type, 'inst': inst}))
+    return events
+
+
+def benchmark(n_positions=200, group_size=5):
+    """
+    Compare fsync per event with group commit and time replaying the journal.
+
+    Events are committed in groups of group_size, as the strategy does when it waits
+    on the journal once per trading event.
+    """
+    events = synthetic_events(n_positions)
+    directory = tempfile.mkdtemp()
+
+    path = os.path.join(directory, 'fsync_per_event.log')
+    start = time.perf_counter()
+    with open(path, 'ab') as f:
+        for event, data in events:
+            f.write(encode(event, data))
+            f.flush()
+            os.fsync(f.fileno())
+    per_event = (time.perf_counter() - start) / len(events)
+
+    path = os.path.join(directory, 'group_commit.log')
+    journal = EventJournal(path)
+    start = time.perf_counter()
+    for i, (event, data) in enumerate(events):
+        journal.append(event, **data)
+        if (i + 1) % group_size == 0:
+            journal.flush()
+    journal.close()
+    group_commit = (time.perf_counter() - start) / len(events)
+
+    start = time.perf_counter()
+    state = replay(path, ['NIFTY 50', 'NIFTY BANK'])
+    replay_time = time.perf_counter() - start
+
+    print('Events: {}'.format(len(events)))
+    print('fsync per event:   {:8.1f} us/event'.format(per_event * 1e6))
+    print('Group commit:      {:8.1f} us/event (budget {:.0f} us, {})'.format(
+        group_commit * 1e6, LATENCY_BUDGET * 1e6, 'within' if group_commit <= LATENCY_BUDGET else 'OVER'))
+    print('Replay:            {:8.1f} ms ({} events, position_id {}, completed {})'.format(
+        replay_time * 1e3, state.events, state.position_id, state.completed_orders))
+
+    size = os.path.getsize(path)
+    compact(path, '2023-01-03')
+    start = time.perf_counter()
+    state = replay(path, ['NIFTY 50', 'NIFTY BANK'])
+    print('Compacted replay:  {:8.1f} ms ({} events, {} -> {} bytes, position_id {})'.format(
+        (time.perf_counter() - start) * 1e3, state.events, size, os.path.getsize(path), state.position_id))
+
+
+if __name__ == '__main__':
+    benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 200)
@@ -0,0 +1,169 @@
+import time
+import datetime
+import threading
+import itertools
+
+
+class MockBroker:
+    """
+    Local stand-in for a KiteConnect account, for running order flows without Kite.
+
+    Implements the order, GTT and LTP calls the strategy uses, with an optional
+    per-call latency. Market orders fill immediately at the price set for the symbol.
+    """
+
+    def __init__(self, user_id='MOCK', latency=0.0, prices=None, fill_status='COMPLETE', rate_limit=None):
+        """
+        Args:
+        user_id (str, optional): User id of the account. Defaults to 'MOCK'.
+        latency (float, optional): Seconds each call takes. Defaults to 0.0.
+        prices (dict, optional): Last price per trading symbol. Defaults to None.
+        fill_status (str, optional): Status given to new orders. Defaults to 'COMPLETE'.
+        rate_limit (int, optional): Calls allowed per second, more raise like Kite's 429 errors. Defaults to None.
+        """
+        self.user_id = user_id
+        self.latency = latency
+        self.prices = prices or dict()
+        self.fill_status = fill_status
+        self.order_book = []
+        self.gtts = dict()
+        self.calls = 0
+        self.rate_limit = rate_limit
+        self.rejected = 0
+        self.call_times = []
+        self.listeners = []
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def _call(self):
+        with self._lock:
+            self.calls += 1
+            if self.rate_limit:
+                now = time.monotonic()
+                self.call_times = [t for t in self.call_times if now - t < 1] + [now]
+                if len(self.call_times) > self.rate_limit:
+                    self.rejected += 1
+                    raise Exception('Too many requests')
+        if self.latency:
+            time.sleep(self.latency)
+
+    def _timestamp(self):
+        return datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+
+    def _add_order(self, tradingsymbol, exchange, transaction_type, quantity, price, order_type, status):
+        with self._lock:
+            order_id = '{}{:06d}'.format(self.user_id, next(self._ids))
+        order = {
+            'order_id': order_id,
+            'placed_by': self.user_id,
+            'exchange': exchange,
+            'tradingsymbol': tradingsymbol,
+            'transaction_type': transaction_type,
+            'order_type': order_type,
+            'quantity': quantity,
+            'price': price or 0,
+            'average_price': self.prices.get(tradingsymbol, price or 0) if status == 'COMPLETE' else 0,
+            'status': status,
+            'status_message': None,
+            'order_timestamp': self._timestamp(),
+            'exchange_update_timestamp': self._timestamp(),
+        }
+        with self._lock:
+            self.order_book.append(order)
+        for callback in self.listeners:
+            callback(dict(order))
+        return order
+
+    def place_order(self, variety, exchange, tradingsymbol, transaction_type, quantity, product, order_type,
+                    price=None, validity=None, trigger_price=None, **kwargs):
+        self._call()
+        return self._add_order(tradingsymbol, exchange, transaction_type, quantity, price, order_type,
+                               self.fill_status)['order_id']
+
+    def modify_order(self, variety, order_id, quantity=None, price=None, trigger_price=None, validity=None, **kwargs):
+        self._call()
+        for order in self.order_book:
+            if order['order_id'] == order_id:
+                order['quantity'] = quantity or order['quantity']
+                order['price'] = price or order['price']
+        return order_id
+
+    def orders(self):
+        self._call()
+        with self._lock:
+            return [dict(order) for order in self.order_book]
+
+    def place_gtt(self, trigger_type, tradingsymbol, exchange, trigger_values, last_price, orders):
+        self._call()
+        with self._lock:
+            trigger_id = next(self._ids)
+        self.gtts[trigger_id] = {
+            'id': trigger_id,
+            'user_id': self.user_id,
+            'type': trigger_type,
+            'status': 'active',
+            'condition': {'exchange': exchange, 'tradingsymbol': tradingsymbol,
+                          'trigger_values': list(trigger_values), 'last_price': last_price},
+            'orders': orders,
+            'created_at': self._timestamp(),
+            'updated_at': self._timestamp(),
+        }
+        return {'trigger_id': trigger_id}
+
+    def modify_gtt(self, trigger_id, trigger_type, tradingsymbol, exchange, trigger_values, last_price, orders):
+        self._call()
+        gtt = self.gtts[trigger_id]
+        gtt['condition']['trigger_values'] = list(trigger_values)
+        gtt['condition']['last_price'] = last_price
+        gtt['orders'] = orders
+        gtt['updated_at'] = self._timestamp()
+        return {'trigger_id': trigger_id}
+
+    def get_gtt(self, trigger_id):
+        self._call()
+        return dict(self.gtts[int(trigger_id)])
+
+    def get_gtts(self):
+        self._call()
+        return [dict(gtt) for gtt in self.gtts.values()]
+
+    def delete_gtt(self, trigger_id):
+        self._call()
+        self.gtts[int(trigger_id)]['status'] = 'deleted'
+        return {'trigger_id': trigger_id}
+
+    def ltp(self, *instruments):
+        self._call()
+        if len(instruments) == 1 and isinstance(instruments[0], (list, tuple)):
+            instruments = instruments[0]
+        return {instrument: {'instrument_token': 0, 'last_price': self.prices.get(instrument.split(':')[-1], 0)}
+                for instrument in instruments}
+
+    def move_price(self, tradingsymbol, price):
+        """
+        Set the price of a symbol and trigger the active GTTs it crosses.
+
+        A triggered two-leg GTT places a SELL order at the limit price of the crossed leg.
+
+        Args:
+        tradingsymbol (str): The trading symbol.
+        price (float): The new last price.
+        """
+        self.prices[tradingsymbol] = price
+        for gtt in list(self.gtts.values()):
+            if gtt['status'] != 'active' or gtt['condition']['tradingsymbol'] != tradingsymbol:
+                continue
+            trigger_values = gtt['condition']['trigger_values']
+            if price <= trigger_values[0]:
+                leg = gtt['orders'][0]
+            elif len(trigger_values) > 1 and price >= trigger_values[1]:
+                leg = gtt['orders'][-1]
+            else:
+                continue
+            gtt['status'] = 'triggered'
+            gtt['updated_at'] = self._timestamp()
+            self.prices[tradingsymbol] = leg['price']
+            order = self._add_order(tradingsymbol, gtt['condition']['exchange'], leg['transaction_type'],
+                                    leg['quantity'], leg['price'], leg['order_type'], 'COMPLETE')
+            leg['result'] = {'order_result': {'order_id': order['order_id'], 'status': 'success'}}
+            self.prices[tradingsymbol] = price
@@ -0,0 +1,177 @@
+import os
+import sys
+import time
+import random
+import itertools
+import numpy as np
+import pandas as pd
+from multiprocessing import shared_memory
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from backtest import Backtest, to_arrays, align_option_candles, summarize, synthetic_candles
+
+# Worker process state, set up once per worker by init_worker
+worker = dict()
+
+
+def share_arrays(groups):
+    """
+    Copy candle arrays into one shared memory block.
+
+    Args:
+    groups (dict): Dict of arrays per key, e.g. instrument or (instrument, option type).
+
+    Returns:
+    SharedMemory: The shared memory block.
+    list: Layout of (key, column, offset, dtype, length) to attach the arrays from.
+    """
+    layout = []
+    offset = 0
+    for key, arrays in groups.items():
+        for column, values in arrays.items():
+            layout.append((key, column, offset, values.dtype.str, len(values)))
+            offset += values.nbytes
+    shm = shared_memory.SharedMemory(create=True, size=max(offset, 1))
+    for (key, column, start, dtype, length) in layout:
+        view = np.ndarray((length,), dtype=dtype, buffer=shm.buf, offset=start)
+        view[:] = groups[key][column]
+    return shm, layout
+
+
+def attach_arrays(shm, layout):
+    """
+    Build read-only array views over a shared memory block.
+
+    Args:
+    shm (SharedMemory): The shared memory block.
+    layout (list): Layout returned by share_arrays.
+
+    Returns:
+    dict: Dict of arrays per key.
+    """
+    groups = dict()
+    for (key, column, offset, dtype, length) in layout:
+        view = np.ndarray((length,), dtype=dtype, buffer=shm.buf, offset=offset)
+        view.flags.writeable = False
+        groups.setdefault(key, dict())[column] = view
+    return groups
+
+
+def init_worker(shm_name, layout):
+    """
+    Attach a worker process to the shared candles and build its backtest once.
+    """
+    shm = shared_memory.SharedMemory(name=shm_name)
+    groups = attach_arrays(shm, layout)
+    arrays = {key: value for key, value in groups.items() if not isinstance(key, tuple)}
+    option_arrays = {key: value for key, value in groups.items() if isinstance(key, tuple)}
+    worker['shm'] = shm
+    worker['backtest'] = Backtest(arrays, option_arrays)
+
+
+def run_params(params):
+    """
+    Backtest one parameter set in a worker process.
+
+    Args:
+    params (dict): Strategy parameters.
+
+    Returns:
+    dict: The parameters and the backtest summary.
+    """
+    backtest = worker['backtest']
+    backtest.params = params
+    result = dict(params)
+    result.update(summarize(backtest.run()))
+    return result
+
+
+def parameter_grid(grid):
+    """
+    Build every combination of parameter values.
+
+    Args:
+    grid (dict): List of values per parameter.
+
+    Returns:
+    list: Parameter sets.
+    """
+    names = list(grid.keys())
+    return [dict(zip(names, values)) for values in itertools.product(*grid.values())]
+
+
+def random_parameters(space, n, seed=None):
+    """
+    Sample parameter sets at random.
+
+    Args:
+    space (dict): List of values, or a (low, high) tuple for a uniform float range, per parameter.
+    n (int): Number of parameter sets.
+    seed (int, optional): Random seed. Defaults to None.
+
+    Returns:
+    list: Parameter sets.
+    """
+    rng = random.Random(seed)
+    param_sets = []
+    for _ in range(n):
+        params = dict()
+        for name, values in space.items():
+            if isinstance(values, tuple):
+                params[name] = round(rng.uniform(*values), 4)
+            else:
+                params[name] = rng.choice(values)
+        param_sets.append(params)
+    return param_sets
+
+
+def optimize(candles, param_sets, option_candles=None, workers=None, metric='PnL', output='data/optimizer_results.csv'):
+    """
+    Backtest many parameter sets across a process pool and rank them.
+
+    The candle arrays are placed in shared memory once and every worker attaches to them,
+    so tasks only carry their parameters. The ranked table is rewritten as results arrive.
+
+    Args:
+    candles (dict): Minute futures candles per instrument.
+    param_sets (list): Parameter sets, see parameter_grid and random_parameters.
+    option_candles (dict, optional): Minute premium candles per (instrument, option type), like run_backtest. Defaults to None.
+    workers (int, optional): Number of worker processes. Defaults to the number of CPUs.
+    metric (str, optional): Summary column to rank by. Defaults to 'PnL'.
+    output (str, optional): CSV file the ranked results are streamed to. Defaults to 'data/optimizer_results.csv'.
+
+    Returns:
+    DataFrame: Backtest summaries ranked by the metric.
+    """
+    groups = {inst: to_arrays(df) for inst, df in candles.items()}
+    groups.update(align_option_candles(candles, option_candles))
+    shm, layout = share_arrays(groups)
+    results = []
+    try:
+        with ProcessPoolExecutor(max_workers=workers or os.cpu_count(), initializer=init_worker,
+                                 initargs=(shm.name, layout)) as executor:
+            futures = [executor.submit(run_params, params) for params in param_sets]
+            for future in as_completed(futures):
+                results.append(future.result())
+                ranked = pd.DataFrame(results).sort_values(metric, ascending=False).reset_index(drop=True)
+                if output:
+                    ranked.to_csv(output, index=False)
+    finally:
+        shm.close()
+        shm.unlink()
+    return pd.DataFrame(results).sort_values(metric, ascending=False).reset_index(drop=True)
+
+
+if __name__ == '__main__':
+    workers = int(sys.argv[1]) if len(sys.argv) > 1 else os.cpu_count()
+    candles = {'NIFTY 50': synthetic_candles(18000, seed=1), 'NIFTY BANK': synthetic_candles(42000, seed=2)}
+    param_sets = parameter_grid({
+        'DESIRED_STRIKE': [2, 4, 6],
+        'TRAILING_STOP_LOSS': [0.1, 0.18, 0.25],
+        'MAIN_STOP_LOSS': [0.2, 0.27, 0.35],
+        'TARGET': [1, 3, 5],
+        'NO_OF_CYCLES': [1, 3],
+    })
+    start = time.perf_counter()
+    ranked = optimize(candles, param_sets, workers=workers, output=None)
+    print(ranked.head(10))
+    print('{} backtests on {} workers in {:.2f}s'.format(len(param_sets), workers, time.perf_counter() - start))
@@ -0,0 +1,203 @@
+import sys
+import time
+from bisect import bisect_left
+from math import ceil
+import numpy as np
+
+
+class OptionChain:
+    """
+    Options of one underlying, expiry and option type, sorted by strike.
+
+    Strikes are held as a sorted NumPy array with the symbols, tokens and lot sizes
+    in the same order, so a strike is found by binary search.
+    """
+
+    def __init__(self, name, expiry, option_type, strikes, symbols, tokens, lot_sizes):
+        """
+        Args:
+        name (str): Name of the underlying.
+        expiry (str): Expiry date as YYYY-MM-DD.
+        option_type (str): CE or PE.
+        strikes (list): Strike prices.
+        symbols (list): Trading symbol of each strike.
+        tokens (list): Instrument token of each strike.
+        lot_sizes (list): Lot size of each strike.
+        """
+        order = np.argsort(strikes, kind='stable')
+        self.name = name
+        self.expiry = expiry
+        self.option_type = option_type
+        self.strikes = np.asarray(strikes, dtype='f8')[order]
+        self.symbols = np.asarray(symbols, dtype=object)[order]
+        self.tokens = np.asarray(tokens, dtype='i8')[order]
+        self.lot_sizes = np.asarray(lot_sizes, dtype='i8')[order]
+        # Python list of the strikes for scalar lookups, bisect on it avoids NumPy call overhead
+        self._strikes = self.strikes.tolist()
+        self._symbols = self.symbols.tolist()
+        # Symbol per strike for the at the money lookups, whose strike is computed exactly
+        self._by_strike = dict(zip(self._strikes, self._symbols))
+
+    def __len__(self):
+        return len(self.strikes)
+
+    def find(self, strike):
+        """
+        Get the position of a strike in the chain.
+
+        Returns:
+        int: Index of the strike, None if it is not listed.
+        """
+        i = bisect_left(self._strikes, strike)
+        if i < len(self._strikes) and self._strikes[i] == strike:
+            return i
+        return None
+
+    def symbol(self, spot_price, strike_interval, offset=0):
+        """
+        Get the option at an offset from the at the money strike, like InstrumentIndex.option_symbol.
+
+        Args:
+        spot_price (float): Spot price of the underlying.
+        strike_interval (int): Interval between strikes.
+        offset (int, optional): Offset added to the at the money strike. Defaults to 0.
+
+        Returns:
+        str: The trading symbol, None if there is no such strike.
+        """
+        return self._by_strike.get(ceil(spot_price / strike_interval) * strike_interval + offset)
+
+    def symbols_for(self, spot_prices, strike_interval, offset=0):
+        """
+        Get the options at an offset from the at the money strike of many spot prices at once.
+
+        Args:
+        spot_prices (ndarray): Spot prices.
+        strike_interval (int): Interval between strikes.
+        offset (int, optional): Offset added to the at the money strikes. Defaults to 0.
+
+        Returns:
+        ndarray: Trading symbol per spot price, None where there is no such strike.
+        """
+        targets = np.ceil(np.asarray(spot_prices, dtype='f8') / strike_interval) * strike_interval + offset
+        i = np.minimum(np.searchsorted(self.strikes, targets), len(self.strikes) - 1)
+        found = self.strikes[i] == targets
+        return np.where(found, self.symbols[i], None)
+
+
+class OptionChainCache:
+    """
+    Option chains per underlying, expiry and option type, built from the instrument index on first use.
+
+    Has the option_symbol method of InstrumentIndex, so it can be used in its place by
+    get_trading_symbol.
+    """
+
+    def __init__(self, instrument_index):
+        """
+        Args:
+        instrument_index (InstrumentIndex): Index of the instrument information.
+        """
+        self.instrument_index = instrument_index
+        self.chains = dict()
+        self.nearest = dict()
+        # Bound symbol method of each nearest expiry chain, for option_symbol
+        self.lookups = dict()
+
+    def chain(self, name, option_type, expiry=None):
+        """
+        Get the chain of an underlying's options.
+
+        Args:
+        name (str): Name of the underlying.
+        option_type (str): CE or PE.
+        expiry (str, optional): Expiry date as YYYY-MM-DD. Defaults to the nearest expiry.
+
+        Returns:
+        OptionChain: The chain.
+        """
+        if expiry is None:
+            chain = self.nearest.get((name, option_type))
+            if chain is None:
+                chain = self.nearest[(name, option_type)] = self.chain(
+                    name, option_type, self.instrument_index.nearest_expiry(name, option_type))
+            return chain
+        key = (name, expiry, option_type)
+        chain = self.chains.get(key)
+        if chain is None:
+            strikes = self.instrument_index.strikes[key]
+            symbols = [self.instrument_index.symbol(name, expiry, strike, option_type) for strike in strikes]
+            instruments = [self.instrument_index.get(symbol) for symbol in symbols]
+            chain = OptionChain(name, expiry, option_type, strikes, symbols,
+                                [instrument['instrument_token'] for instrument in instruments],
+                                [instrument['lot_size'] for instrument in instruments])
+            self.chains[key] = chain
+        return chain
+
+    def warm(self, names):
+        """
+        Build the nearest expiry chains of several underlyings ahead of use.
+        """
+        for name in names:
+            for option_type in ['CE', 'PE']:
+                self.chain(name, option_type)
+
+    def option_symbol(self, name, option_type, spot_price, strike_interval, offset=0):
+        """
+        Get the nearest expiry option at an offset from the at the money strike.
+
+        Args:
+        name (str): Name of the underlying.
+        option_type (str): Option type (CE for Call, PE for Put).
+        spot_price (float): Spot price of the underlying.
+        strike_interval (int): Interval between strikes.
+        offset (int, optional): Offset added to the at the money strike. Defaults to 0.
+
+        Returns:
+        str: The trading symbol, None if there is no such contract.
+        """
+        try:
+            lookup = self.lookups[name, option_type]
+        except KeyError:
+            lookup = self.lookups[name, option_type] = self.chain(name, option_type).symbol
+        return lookup(spot_price, strike_interval, offset)
+
+
+def benchmark(n_strikes=200, lookups=100000):
+    """
+    Time resolving the option at an offset from the at the money strike with the chain cache
+    and with the instrument index.
+    """
+    from instruments import InstrumentIndex
+
+    records = [{'instrument_token': i, 'tradingsymbol': 'NIFTY24JAN{}{}'.format(15000 + 50 * (i // 2), option_type),
+                'name': 'NIFTY', 'expiry': '2024-01-25', 'strike': 15000 + 50 * (i // 2),
+                'instrument_type': option_type, 'lot_size': 50}
+               for i, option_type in zip(range(2 * n_strikes), ['CE', 'PE'] * n_strikes)]
+    instrument_index = InstrumentIndex(records)
+    chains = OptionChainCache(instrument_index)
+    chains.warm(['NIFTY'])
+    spots = (15000 + np.random.default_rng(0).uniform(0, 50 * n_strikes - 500, lookups)).tolist()
+
+    results = dict()
+    for label, lookup in [('InstrumentIndex', instrument_index.option_symbol), ('OptionChainCache', chains.option_symbol)]:
+        start = time.perf_counter()
+        symbols = [lookup('NIFTY', 'CE', spot, 50, -200) for spot in spots]
+        results[label] = symbols
+        print('{:16}: {:6.3f} us per lookup'.format(label, (time.perf_counter() - start) / lookups * 1e6))
+
+    chain = chains.chain('NIFTY', 'CE')
+    start = time.perf_counter()
+    chain.symbol(spots[0], 50, -200)
+    for spot in spots:
+        chain.symbol(spot, 50, -200)
+    print('{:16}: {:6.3f} us per lookup'.format('OptionChain', (time.perf_counter() - start) / lookups * 1e6))
+
+    start = time.perf_counter()
+    vectorized = chain.symbols_for(spots, 50, -200)
+    print('{:16}: {:6.3f} us per lookup'.format('symbols_for', (time.perf_counter() - start) / lookups * 1e6))
+    print('Same symbols: {}'.format(results['InstrumentIndex'] == results['OptionChainCache'] == vectorized.tolist()))
+
+
+if __name__ == '__main__':
+    benchmark(*[int(arg) for arg in sys.argv[1:]])
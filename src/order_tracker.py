@@ -0,0 +1,108 @@
+import time
+import logging
+import threading
+
+TERMINAL_STATUSES = ['COMPLETE', 'REJECTED', 'CANCELLED']
+
+
+class OrderTracker:
+    """
+    In-memory order table kept up to date from Kite order update events.
+
+    Callers wait on an order id until it reaches a terminal status instead of sleeping
+    and downloading the full order book, so a fill is confirmed as soon as its update
+    is delivered.
+    """
+
+    def __init__(self, accounts):
+        """
+        Args:
+        accounts (dict): KiteConnect instance per user id, used to poll when no update arrives.
+        """
+        self.accounts = accounts
+        self.orders = dict()
+        self.listeners = []
+        self._condition = threading.Condition()
+
+    def attach(self, ticker):
+        """
+        Receive order updates from a KiteTicker (or ReplayTicker) connection.
+
+        Args:
+        ticker (KiteTicker): Ticker connected with the account's access token.
+        """
+        ticker.on_order_update = self.on_order_update
+
+    def add_listener(self, callback):
+        """
+        Register a callback that receives every order update.
+
+        Args:
+        callback (func): Function called with the order.
+        """
+        self.listeners.append(callback)
+
+    def on_order_update(self, ws, data):
+        self.update(data)
+        for callback in self.listeners:
+            try:
+                callback(data)
+            except Exception as e:
+                logging.info("Order update listener failed: {}".format(e))
+
+    def update(self, order):
+        """
+        Store the latest state of an order and wake up its waiters.
+
+        Args:
+        order (dict): Order update, with the fields of acc.orders().
+        """
+        with self._condition:
+            self.orders[str(order['order_id'])] = order
+            self._condition.notify_all()
+
+    def get(self, order_id):
+        return self.orders.get(str(order_id))
+
+    def poll(self, user):
+        """
+        Refresh the table from a user's order book.
+
+        Args:
+        user (str): User identifier.
+        """
+        try:
+            orders = self.accounts[user].orders()
+        except Exception as e:
+            logging.info("Order book request failed: {}".format(e))
+            return
+        for order in orders:
+            self.update(order)
+
+    def wait(self, order_id, timeout=10, user=None):
+        """
+        Wait for an order to reach a terminal status.
+
+        Args:
+        order_id (str): ID of the order.
+        timeout (float, optional): Seconds to wait for an update. Defaults to 10.
+        user (str, optional): User to poll the order book of if no terminal update arrives in time. Defaults to None.
+
+        Returns:
+        dict: The latest state of the order, None if it is unknown.
+        """
+        order_id = str(order_id)
+        deadline = time.monotonic() + timeout
+        with self._condition:
+            while True:
+                order = self.orders.get(order_id)
+                if order is not None and order['status'] in TERMINAL_STATUSES:
+                    return order
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._condition.wait(remaining)
+
+        if user is not None:
+            self.poll(user)
+        return self.orders.get(order_id)
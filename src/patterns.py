@@ -0,0 +1,135 @@
+import numpy as np
+import pandas as pd
+
+
+def is_hammer(Open, close, high, low):
+    """
+    Check which candles are hammers.
+
+    Args:
+    Open (ndarray): Opening prices.
+    close (ndarray): Closing prices.
+    high (ndarray): Highest prices.
+    low (ndarray): Lowest prices.
+
+    Returns:
+    ndarray: Boolean mask, True where the candlestick pattern is a hammer.
+    """
+    Open, close, high, low = map(np.asarray, (Open, close, high, low))
+    half_range = 0.5 * (high - low)
+    return ((close > Open) & ((Open - low) >= half_range)) | ((close < Open) & ((close - low) >= half_range))
+
+
+def is_bullish(Open, close, high, low):
+    """
+    Check which candles are bullish.
+
+    Args:
+    Open (ndarray): Opening prices.
+    close (ndarray): Closing prices.
+    high (ndarray): Highest prices.
+    low (ndarray): Lowest prices.
+
+    Returns:
+    ndarray: Boolean mask, True where the candlestick pattern is bullish.
+    """
+    Open, close, high, low = map(np.asarray, (Open, close, high, low))
+    return (close > Open) & ((close - Open) >= 0.6 * (high - low))
+
+
+def is_shooting_star(Open, close, high, low):
+    """
+    Check which candles are shooting stars.
+
+    Args:
+    Open (ndarray): Opening prices.
+    close (ndarray): Closing prices.
+    high (ndarray): Highest prices.
+    low (ndarray): Lowest prices.
+
+    Returns:
+    ndarray: Boolean mask, True where the candlestick pattern is a shooting star.
+    """
+    Open, close, high, low = map(np.asarray, (Open, close, high, low))
+    half_range = 0.5 * (high - low)
+    return ((close > Open) & ((high - close) >= half_range)) | ((close < Open) & ((high - Open) >= half_range))
+
+
+def is_bearish(Open, close, high, low):
+    """
+    Check which candles are bearish.
+
+    Args:
+    Open (ndarray): Opening prices.
+    close (ndarray): Closing prices.
+    high (ndarray): Highest prices.
+    low (ndarray): Lowest prices.
+
+    Returns:
+    ndarray: Boolean mask, True where the candlestick pattern is bearish.
+    """
+    Open, close, high, low = map(np.asarray, (Open, close, high, low))
+    return (close < Open) & ((Open - close) >= 0.6 * (high - low))
+
+
+def check_entry_conditions_one(Open, high, low, close, vwap, option_type):
+    """
+    Check single candle entry conditions for every candle.
+
+    Args:
+    Open (ndarray): Opening prices.
+    high (ndarray): Highest prices.
+    low (ndarray): Lowest prices.
+    close (ndarray): Closing prices.
+    vwap (ndarray): Volume Weighted Average Prices.
+    option_type (str): Option type (CE for Call, PE for Put).
+
+    Returns:
+    ndarray: Boolean mask, True where entry conditions are met.
+    """
+    Open, high, low, close, vwap = map(np.asarray, (Open, high, low, close, vwap))
+    if option_type == 'CE':
+        return (is_bullish(Open, close, high, low) | is_hammer(Open, close, high, low)) & (low <= vwap) & (close > vwap)
+    else:
+        return (is_bearish(Open, close, high, low) | is_shooting_star(Open, close, high, low)) & (high >= vwap) & (close < vwap)
+
+
+def get_vwap(df):
+    """
+    Calculate the intraday Volume Weighted Average Price (VWAP) of every candle.
+
+    Args:
+    df (DataFrame): DataFrame containing date and OHLCV data.
+
+    Returns:
+    ndarray: VWAP anchored to the start of each session.
+    """
+    tp = (df['high'] + df['low'] + df['close']) / 3
+    session = pd.to_datetime(df['date']).dt.date
+    cum_volume = df['volume'].groupby(session).cumsum()
+    cum_tp_volume = (tp * df['volume']).groupby(session).cumsum()
+    return (cum_tp_volume / cum_volume).values
+
+
+def signal_matrix(candles, option_types=('CE', 'PE')):
+    """
+    Scan candles of many instruments for single candle entry signals at once.
+
+    Args:
+    candles (dict): DataFrame of candles per symbol, with a vwap column or volume to compute it from.
+    option_types (tuple, optional): Option types to scan for. Defaults to ('CE', 'PE').
+
+    Returns:
+    DataFrame: Boolean signals indexed by candle date, with a (symbol, option type) column per scan.
+    """
+    signals = dict()
+    for symbol, df in candles.items():
+        vwap = df['vwap'].values if 'vwap' in df.columns else get_vwap(df)
+        index = pd.Index(df['date'])
+        for option_type in option_types:
+            mask = check_entry_conditions_one(df['open'].values, df['high'].values, df['low'].values,
+                                              df['close'].values, vwap, option_type)
+            signals[(symbol, option_type)] = pd.Series(mask, index=index)
+    matrix = pd.DataFrame(signals)
+    return matrix.fillna(False).astype(bool)
+
@@ -0,0 +1,255 @@
+import threading
+import numpy as np
+import pandas as pd
+from store import SL_ORDER_COLUMNS
+from trailing import apply_ticks, trail_stops, intents
+
+# Per position numeric state, one row per open position
+POSITION_DTYPE = np.dtype([
+    ('position_id', 'i8'),
+    ('token', 'i8'),
+    ('ltp', 'f8'),
+    ('high', 'f8'),
+    ('prev_high', 'f8'),
+    ('tsl', 'f8'),
+    ('tsl_increment', 'f8'),
+    ('target', 'f8'),
+])
+STATE_FIELDS = ['ltp', 'high', 'prev_high', 'tsl', 'tsl_increment', 'target']
+
+
+class Position:
+    """
+    An open position, with the buy order and GTT id of each account.
+
+    Prices and trailing stop loss state are read from the row of the position in
+    its PositionBook, where they are updated for all positions at once.
+    """
+    __slots__ = ('book', 'position_id', 'instrument', 'option', 'symbol', 'token', 'buy_time', 'buy_price',
+                 'quantity', 'entries', 'gtt_ids')
+
+    def __init__(self, book, position_id, instrument, option, symbol, token, buy_time, buy_price, quantity):
+        self.book = book
+        self.position_id = position_id
+        self.instrument = instrument
+        self.option = option
+        self.symbol = symbol
+        self.token = token
+        self.buy_time = buy_time
+        self.buy_price = buy_price
+        self.quantity = quantity
+        self.entries = dict()
+        self.gtt_ids = dict()
+
+    def _get(self, field):
+        return float(self.book.state[self.book.index[self.position_id]][field])
+
+    ltp = property(lambda self: self._get('ltp'))
+    high = property(lambda self: self._get('high'))
+    prev_high = property(lambda self: self._get('prev_high'))
+    tsl = property(lambda self: self._get('tsl'))
+    tsl_increment = property(lambda self: self._get('tsl_increment'))
+    target = property(lambda self: self._get('target'))
+
+
+class PositionBook:
+    """
+    Open positions keyed by Position_id, with their numeric state in a NumPy structured array.
+
+    Any number of positions can be open per instrument and option type. Adding,
+    finding and removing a position are O(1), and tick batches and trailing stop
+    loss updates are applied to all positions with array operations (trailing.py).
+    """
+
+    def __init__(self, capacity=16):
+        """
+        Args:
+        capacity (int, optional): Number of positions to allocate initially. Defaults to 16.
+        """
+        self.positions = dict()
+        self.index = dict()
+        self.state = np.zeros(capacity, dtype=POSITION_DTYPE)
+        self.size = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return self.size
+
+    def __iter__(self):
+        return iter(list(self.positions.values()))
+
+    def __contains__(self, position_id):
+        return position_id in self.positions
+
+    def get(self, position_id):
+        return self.positions.get(position_id)
+
+    def open(self, position_id, instrument, option, symbol, token, buy_time, buy_price, quantity, tsl, tsl_increment,
+             target, prev_high=None, high=None, ltp=None):
+        """
+        Add a position.
+
+        Args:
+        position_id (int): ID of the position.
+        instrument (str): Instrument the option is on.
+        option (str): Option type (CE or PE).
+        symbol (str): Trading symbol of the option.
+        token (int): Instrument token of the option.
+        buy_time (str): Time of the buy order.
+        buy_price (float): Average buy price.
+        quantity (int): Quantity bought per account.
+        tsl (float): Trailing stop loss.
+        tsl_increment (float): Amount the stop loss trails by.
+        target (float): Target price.
+        prev_high (float, optional): High the stop loss last trailed at. Defaults to buy_price.
+        high (float, optional): Highest price since the buy. Defaults to buy_price.
+        ltp (float, optional): Last traded price. Defaults to buy_price.
+
+        Returns:
+        Position: The position.
+        """
+        position = Position(self, position_id, instrument, option, symbol, token, buy_time, buy_price, quantity)
+        with self._lock:
+            if self.size == len(self.state):
+                self.state = np.concatenate([self.state, np.zeros(len(self.state), dtype=POSITION_DTYPE)])
+            row = self.size
+            self.state[row] = (position_id, token, buy_price if ltp is None else ltp,
+                               buy_price if high is None else high, buy_price if prev_high is None else prev_high,
+                               tsl, tsl_increment, target)
+            self.index[position_id] = row
+            self.positions[position_id] = position
+            self.size += 1
+        return position
+
+    def remove(self, position_id):
+        """
+        Remove a position, moving the last row into its place.
+
+        Args:
+        position_id (int): ID of the position.
+
+        Returns:
+        Position: The removed position.
+        """
+        with self._lock:
+            row = self.index.pop(position_id)
+            last = self.size - 1
+            if row != last:
+                self.state[row] = self.state[last]
+                self.index[int(self.state[row]['position_id'])] = row
+            self.size = last
+            return self.positions.pop(position_id)
+
+    def count(self, instrument, option=None):
+        """
+        Count the open positions on an instrument, optionally of one option type.
+        """
+        return sum(1 for position in self.positions.values()
+                   if position.instrument == instrument and (option is None or position.option == option))
+
+    def holds(self, tokens):
+        """
+        Check whether any open position is on one of the given instrument tokens, e.g. of a tick batch.
+        """
+        with self._lock:
+            return bool(np.isin(self.state['token'][:self.size], tokens).any())
+
+    def mark(self, position_id, ltp=None, high=None):
+        """
+        Set the last price of a position and raise its high.
+
+        Args:
+        position_id (int): ID of the position.
+        ltp (float, optional): Last traded price. Defaults to None.
+        high (float, optional): Highest traded price from another source, e.g. TradeHighTracker. Defaults to None.
+        """
+        with self._lock:
+            row = self.index[position_id]
+            if ltp is not None:
+                self.state['ltp'][row] = ltp
+                self.state['high'][row] = max(self.state['high'][row], ltp)
+            if high is not None:
+                self.state['high'][row] = max(self.state['high'][row], high)
+
+    def on_ticks(self, ticks):
+        """
+        Update the last price and high of every position from a batch of ticks.
+
+        Args:
+        ticks (list): Ticks from KiteTicker.
+        """
+        tokens = [tick['instrument_token'] for tick in ticks]
+        prices = [tick['last_price'] for tick in ticks]
+        with self._lock:
+            apply_ticks(self.state[:self.size], tokens, prices)
+
+    def trail(self):
+        """
+        Move up the stop loss of every position by as many increments as its high has risen since the last move.
+
+        Returns:
+        list: GttIntent per position whose stop loss moved.
+        """
+        with self._lock:
+            state = self.state[:self.size]
+            return intents(state, trail_stops(state))
+
+    def sl_orders_frame(self, buy_orders=False):
+        """
+        Get the GTT order of every account and position, in the sl_orders schema.
+
+        Args:
+        buy_orders (bool, optional): Add the Buy_order_id of the account's entry, for detect_exits. Defaults to False.
+
+        Returns:
+        DataFrame: Position_id, User_id, Order_id and Symbol per GTT.
+        """
+        rows = [[position.position_id, user, gtt_id, position.symbol, position.entries.get(user)]
+                for position in self.positions.values() for user, gtt_id in position.gtt_ids.items()]
+        df = pd.DataFrame(rows, columns=SL_ORDER_COLUMNS + ['Buy_order_id'])
+        return df if buy_orders else df[SL_ORDER_COLUMNS]
+
+    def levels(self):
+        """
+        Get the trailing stop loss state of every position, keyed by Position_id, for persistence.
+
+        Returns:
+        dict: Dict of values per Position_id for prev_high, tsl, tsl_increment and target.
+        """
+        with self._lock:
+            state = self.state[:self.size]
+            return {field: dict(zip(state['position_id'].tolist(), state[field].tolist()))
+                    for field in ['prev_high', 'tsl', 'tsl_increment', 'target']}
+
+    @classmethod
+    def from_frames(cls, entries, sl_orders, levels):
+        """
+        Rebuild the book from entry rows, GTT orders and saved trailing stop loss state.
+
+        Positions without saved state keep their Trailing_SL and do not trail.
+
+        Args:
+        entries (DataFrame): Entry rows, one per account and position.
+        sl_orders (DataFrame): GTT orders in the sl_orders schema.
+        levels (dict): Dict of values per Position_id for prev_high, tsl, tsl_increment and target.
+
+        Returns:
+        PositionBook: The book.
+        """
+        book = cls(capacity=max(len(entries), 16))
+        for row in entries.to_dict('records'):
+            position_id = int(row['Position_id'])
+            position = book.get(position_id)
+            if position is None:
+                saved = {field: levels.get(field, dict()).get(position_id) for field in levels}
+                position = book.open(position_id, row['Instrument'], row['Option'], row['Symbol'], int(row['Token']),
+                                     row['Buy_time'], row['Buy_price'], row['Quantity'],
+                                     saved.get('tsl') if saved.get('tsl') is not None else row['Trailing_SL'],
+                                     saved.get('tsl_increment') or 0, saved.get('target') or 0,
+                                     prev_high=saved.get('prev_high'), ltp=row['LTP'])
+            position.entries[row['User_id']] = row['Buy_order_id']
+        for row in sl_orders.to_dict('records'):
+            position = book.get(int(row['Position_id']))
+            if position is not None:
+                position.gtt_ids[row['User_id']] = row['Order_id']
+        return book
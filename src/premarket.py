@@ -2,10 +2,14 @@ import datetime
 import pytz
 import logging
 import json
-from kiteconnect import KiteConnect
+from broker import BrokerClient, ENDPOINT_LIMITS
+from rate_limit import RateLimiter
 import pandas as pd
-from collections import defaultdict
 from config import *
+from instruments import InstrumentIndex, write_snapshot
+from store import StateStore
+from journal import compact
+from universe import resolve_underlyings, save_universe
 
 # Configure logging
 logging.basicConfig(level=logging.DEBUG)
@@ -25,47 +29,49 @@ with open('data/access_tokens.json', "r") as f:
 with open('data/login_details.json', "r") as f:
     LOGIN_DETAILS = json.load(f)
 
-# Initialize KiteConnect object
+# Initialize KiteConnect client, rate limited like the strategy's
 uid = USER_ID[0]
 api_key = LOGIN_DETAILS[uid]['api_key']
 acc_token = access_tokens[uid]
-kite = KiteConnect(api_key=api_key)
-kite.set_access_token(acc_token)
+kite = BrokerClient(api_key, acc_token, limiter=RateLimiter(ENDPOINT_LIMITS))
 
 # Fetch and save instrument data
 options_instrument_dump = kite.instruments('NFO')
 options_instrument_df = pd.DataFrame(options_instrument_dump)
-options_instrument_df[options_instrument_df['name'].isin(['NIFTY', 'BANKNIFTY'])].to_csv('data/options_instrument_df.csv', index=False)
+write_snapshot(options_instrument_df, 'data/options_instrument.npy')
+
+# Build the instrument index used by the strategy for symbol and token lookups
+instrument_index = InstrumentIndex.from_snapshot('data/options_instrument.npy')
+instrument_index.save('data/instrument_index.pkl')
+
+# List every underlying with futures and options, traded by the strategy with SCAN_UNIVERSE
+universe = list(resolve_underlyings(instrument_index))
+save_universe(universe)
+INSTRUMENTS = INSTRUMENTS + [inst for inst in universe if inst not in INSTRUMENTS]
 
 equity_instrument_dump = kite.instruments('NSE')
 equity_instrument_df = pd.DataFrame(equity_instrument_dump)
 equity_instrument_df = equity_instrument_df[equity_instrument_df['tradingsymbol'].isin(INSTRUMENTS)]
-equity_instrument_df.to_csv('data/equity_instrument_df.csv', index=False)
+write_snapshot(equity_instrument_df, 'data/equity_instrument.npy')
 print(equity_instrument_df.head())
 
-# Initialize dictionaries for completed orders and condition checks
+# Initialize dictionaries for completed orders
 completed_orders = {'CE': dict(), 'PE': dict()}
 for inst in INSTRUMENTS:
     for option_type in ['CE', 'PE']:
         completed_orders[option_type][inst] = 0
 
-condition_checked = defaultdict(int)
-with open("data/completed_orders.json", "w") as f:
-    json.dump(completed_orders, f)
+# Move the previous session's trades and failed orders to history and reset the counters
+store = StateStore('data/state.db')
+with store.transaction():
+    store.archive_session()
+    store.save_state('completed_orders', completed_orders)
+store.close()
 
-with open("data/condition_checked.json", "w") as f:
-    json.dump(condition_checked, f)
+# Start the session's event journal with a snapshot of the open positions, replay resets completed orders here
+compact('data/journal.log', CURRENT_DATE)
 
-# Create empty DataFrames for trades, failed orders, and runtime errors
-trades_history = pd.read_csv('data/trades_history.csv', nrows=1)
-failed_orders_history = pd.read_csv('data/failed_orders_history.csv', nrows=1)
+# Create empty DataFrame for runtime errors
 runtime_errors_history = pd.read_csv('data/runtime_errors_history.csv', nrows=1)
-
-trades = pd.DataFrame(columns=list(trades_history.columns))
-failed_orders = pd.DataFrame(columns=list(failed_orders_history.columns))
 runtime_errors = pd.DataFrame(columns=list(runtime_errors_history.columns))
-
-# Save empty DataFrames to CSV files
-trades.to_csv('data/trades.csv', index=False)
-failed_orders.to_csv('data/failed_orders.csv', index=False)
 runtime_errors.to_csv('data/runtime_errors.csv', index=False)
@@ -0,0 +1,150 @@
+import sys
+import time
+import logging
+import threading
+
+# Most instruments Kite accepts in one ltp request
+MAX_INSTRUMENTS = 1000
+
+
+class QuoteBatcher:
+    """
+    Last prices of all the instruments a loop pass needs, fetched in one ltp request and cached.
+
+    Instruments are registered with want() at the start of a pass. The first lookup
+    of an instrument without a fresh price fetches every registered instrument that
+    is stale in the same request, so the lookups that follow in the pass are served
+    from the cache.
+    """
+
+    def __init__(self, kite, ttl=1.0):
+        """
+        Args:
+        kite (KiteConnect): KiteConnect instance.
+        ttl (float, optional): Seconds a fetched price stays fresh. Defaults to 1.0.
+        """
+        self.kite = kite
+        self.ttl = ttl
+        self.wanted = set()
+        self.prices = dict()
+        self.fetched = dict()
+        self.requests = 0
+        self._lock = threading.Lock()
+
+    def want(self, *instruments):
+        """
+        Register instruments to fetch with the next request.
+
+        Args:
+        *instruments (str): Instruments as 'EXCHANGE:TRADINGSYMBOL'.
+        """
+        with self._lock:
+            self.wanted.update(instruments)
+
+    def forget(self, *instruments):
+        """
+        Stop fetching instruments, e.g. of a closed position.
+        """
+        with self._lock:
+            self.wanted.difference_update(instruments)
+            for instrument in instruments:
+                self.prices.pop(instrument, None)
+                self.fetched.pop(instrument, None)
+
+    def _stale(self, instruments, now):
+        return [instrument for instrument in instruments if now - self.fetched.get(instrument, -self.ttl) >= self.ttl]
+
+    def refresh(self, *instruments):
+        """
+        Fetch every registered or given instrument without a fresh price, in as few requests as possible.
+
+        Returns:
+        bool: False if a request failed.
+        """
+        with self._lock:
+            stale = self._stale(self.wanted.union(instruments), time.monotonic())
+            for i in range(0, len(stale), MAX_INSTRUMENTS):
+                batch = stale[i:i + MAX_INSTRUMENTS]
+                try:
+                    data = self.kite.ltp(batch)
+                except Exception as e:
+                    logging.info("LTP request failed: {}".format(e))
+                    return False
+                self.requests += 1
+                now = time.monotonic()
+                for instrument in batch:
+                    if instrument in data:
+                        self.prices[instrument] = float(data[instrument]['last_price'])
+                        self.fetched[instrument] = now
+        return True
+
+    def ltp(self, instrument, default=None):
+        """
+        Get the last price of an instrument, fetching all stale registered instruments if it is not fresh.
+
+        Args:
+        instrument (str): Instrument as 'EXCHANGE:TRADINGSYMBOL'.
+        default (optional): Value returned if the price could not be fetched. Defaults to None.
+
+        Returns:
+        float: The last price.
+        """
+        with self._lock:
+            fresh = not self._stale([instrument], time.monotonic())
+        if not fresh:
+            self.refresh(instrument)
+        with self._lock:
+            return self.prices.get(instrument, default)
+
+    def ltps(self, instruments, default=None):
+        """
+        Get the last prices of many instruments, e.g. an option chain, fetching the stale ones together.
+
+        Args:
+        instruments (list): Instruments as 'EXCHANGE:TRADINGSYMBOL'.
+        default (optional): Value returned for prices that could not be fetched. Defaults to None.
+
+        Returns:
+        list: Last price per instrument.
+        """
+        self.refresh(*instruments)
+        with self._lock:
+            return [self.prices.get(instrument, default) for instrument in instruments]
+
+
+def benchmark(n_positions=20, passes=50, interval=0.02):
+    """
+    Count the ltp requests of loop passes looking up every position, spot index and future,
+    one request per lookup against the batcher.
+    """
+    from mock_broker import MockBroker
+
+    symbols = ['SYM{}'.format(i) for i in range(n_positions)]
+    instruments = ['NFO:' + symbol for symbol in symbols] + ['NSE:NIFTY 50', 'NSE:NIFTY BANK',
+                                                             'NFO:NIFTYFUT', 'NFO:BANKNIFTYFUT']
+    # Spot indices are looked up once per option type
+    lookups = instruments + ['NSE:NIFTY 50', 'NSE:NIFTY BANK']
+
+    kite = MockBroker(prices={symbol: 100 for symbol in symbols})
+    for _ in range(passes):
+        for instrument in lookups:
+            kite.ltp(instrument)
+        time.sleep(interval)
+    per_symbol = kite.calls
+
+    kite = MockBroker(prices={symbol: 100 for symbol in symbols})
+    quotes = QuoteBatcher(kite, ttl=interval / 2)
+    for _ in range(passes):
+        quotes.want(*instruments)
+        for instrument in lookups:
+            quotes.ltp(instrument)
+        time.sleep(interval)
+    batched = kite.calls
+
+    print('{} lookups per pass, {} passes'.format(len(lookups), passes))
+    print('Per symbol: {:6} requests ({:.1f} per pass)'.format(per_symbol, per_symbol / passes))
+    print('Batched:    {:6} requests ({:.1f} per pass)'.format(batched, batched / passes))
+
+
+if __name__ == '__main__':
+    benchmark(*[int(arg) for arg in sys.argv[1:]])
@@ -0,0 +1,152 @@
+import time
+import threading
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket limiting calls to a rate per second, with bursts up to its capacity.
+    """
+
+    def __init__(self, rate, capacity=None):
+        """
+        Args:
+        rate (float): Tokens added per second.
+        capacity (float, optional): Most tokens the bucket holds. Defaults to rate.
+        """
+        self.rate = rate
+        self.capacity = capacity or rate
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def try_acquire(self, tokens=1):
+        """
+        Take tokens if available without waiting.
+
+        Returns:
+        float: 0 if the tokens were taken, otherwise seconds until they will be available.
+        """
+        with self._lock:
+            self._refill()
+            if self.tokens >= tokens:
+                self.tokens -= tokens
+                return 0
+            return (tokens - self.tokens) / self.rate
+
+    def ready(self, tokens=1):
+        """
+        Check whether tokens are available, without taking them.
+        """
+        with self._lock:
+            self._refill()
+            return self.tokens >= tokens
+
+    def acquire(self, tokens=1):
+        """
+        Wait until tokens are available and take them.
+
+        Returns:
+        float: Seconds spent waiting.
+        """
+        waited = 0
+        while True:
+            wait = self.try_acquire(tokens)
+            if wait == 0:
+                return waited
+            time.sleep(wait)
+            waited += wait
+
+
+class RateLimiter:
+    """
+    Rate limits per endpoint with prioritized waiting, shared by every client of an API key.
+
+    A call waits until its endpoint's token bucket has a token and a connection slot
+    is free. On an endpoint, waiting calls of a higher priority (lower number) go first.
+    Across endpoints, a higher priority call only goes first when its own bucket has a
+    token, so order calls get the next free connection ahead of data calls, but an order
+    call waiting on its rate limit does not hold up the other endpoints. Queue wait times
+    are recorded per endpoint.
+    """
+
+    def __init__(self, limits, max_in_flight=8):
+        """
+        Args:
+        limits (dict): Calls per second per endpoint.
+        max_in_flight (int, optional): Calls allowed in flight at once, e.g. the connection pool size. Defaults to 8.
+        """
+        self.buckets = {endpoint: TokenBucket(rate) for endpoint, rate in limits.items()}
+        self.max_in_flight = max_in_flight
+        self.in_flight = 0
+        self.waiting = []
+        self.metrics = {endpoint: {'calls': 0, 'wait_total': 0.0, 'wait_max': 0.0} for endpoint in limits}
+        self._seq = 0
+        self._condition = threading.Condition()
+
+    def _eligible(self, entry):
+        priority, seq, endpoint = entry
+        for other in self.waiting:
+            if other[2] == endpoint:
+                if other[0] < priority or (other[0] == priority and other[1] < seq):
+                    return False
+            elif other[0] < priority and self.buckets[other[2]].ready():
+                return False
+        return self.in_flight < self.max_in_flight
+
+    def acquire(self, endpoint, priority=1):
+        """
+        Wait for a call slot on an endpoint.
+
+        Args:
+        endpoint (str): Endpoint name, one of the keys of limits.
+        priority (int, optional): Lower numbers go first. Defaults to 1.
+
+        Returns:
+        float: Seconds spent waiting.
+        """
+        start = time.monotonic()
+        with self._condition:
+            self._seq += 1
+            entry = (priority, self._seq, endpoint)
+            self.waiting.append(entry)
+            while True:
+                if self._eligible(entry):
+                    wait = self.buckets[endpoint].try_acquire()
+                    if wait == 0:
+                        break
+                    self._condition.wait(wait)
+                else:
+                    self._condition.wait()
+            self.waiting.remove(entry)
+            self.in_flight += 1
+
+            waited = time.monotonic() - start
+            metrics = self.metrics[endpoint]
+            metrics['calls'] += 1
+            metrics['wait_total'] += waited
+            metrics['wait_max'] = max(metrics['wait_max'], waited)
+            self._condition.notify_all()
+        return waited
+
+    def release(self):
+        with self._condition:
+            self.in_flight -= 1
+            self._condition.notify_all()
+
+    def summary(self):
+        """
+        Get the queue wait metrics of each endpoint.
+
+        Returns:
+        dict: Calls, mean wait and max wait in seconds per endpoint.
+        """
+        with self._condition:
+            return {endpoint: {'calls': m['calls'],
+                               'wait_mean': m['wait_total'] / m['calls'] if m['calls'] else 0.0,
+                               'wait_max': m['wait_max']}
+                    for endpoint, m in self.metrics.items()}
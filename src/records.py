@@ -0,0 +1,243 @@
+import sys
+import time
+import warnings
+import numpy as np
+import pandas as pd
+
+
+class Row:
+    """
+    View of one row of a RecordBuffer, reads and writes go to the buffer's columns.
+    """
+    __slots__ = ('buffer', 'index')
+
+    def __init__(self, buffer, index):
+        self.buffer = buffer
+        self.index = index
+
+    def __getitem__(self, column):
+        return self.buffer.data[column][self.index]
+
+    def __setitem__(self, column, value):
+        self.buffer.data[column][self.index] = value
+
+    def to_list(self):
+        return [self.buffer.data[column][self.index] for column in self.buffer.columns]
+
+    def to_dict(self):
+        return {column: self.buffer.data[column][self.index] for column in self.buffer.columns}
+
+
+class RecordBuffer:
+    """
+    Growable table stored as one preallocated NumPy array per column.
+
+    Appending a row writes into the arrays in place and doubles their capacity when
+    full, so building a table of n rows costs O(n) instead of the O(n^2) copying of
+    repeated DataFrame.append. Convert to a DataFrame with to_frame only where one is
+    needed, e.g. for merges, persistence and the dashboard.
+    """
+
+    def __init__(self, columns, dtypes=None, capacity=16):
+        """
+        Args:
+        columns (list): Column names.
+        dtypes (dict, optional): NumPy dtype per column, other columns hold objects. Defaults to None.
+        capacity (int, optional): Number of rows to allocate initially. Defaults to 16.
+        """
+        self.columns = list(columns)
+        self.dtypes = {column: np.dtype((dtypes or dict()).get(column, object)) for column in self.columns}
+        self.size = 0
+        self.capacity = max(capacity, 1)
+        self._data = {column: np.empty(self.capacity, dtype=self.dtypes[column]) for column in self.columns}
+
+    @classmethod
+    def from_frame(cls, df, columns=None, dtypes=None):
+        """
+        Create a buffer from a DataFrame.
+
+        Args:
+        df (DataFrame): Rows to load.
+        columns (list, optional): Column names, defaults to the DataFrame's columns.
+        dtypes (dict, optional): NumPy dtype per column. Defaults to None.
+
+        Returns:
+        RecordBuffer: The buffer.
+        """
+        buffer = cls(columns if columns is not None else df.columns, dtypes, capacity=max(len(df), 16))
+        buffer.extend_frame(df)
+        return buffer
+
+    @property
+    def data(self):
+        return self._data
+
+    def __len__(self):
+        return self.size
+
+    def __iter__(self):
+        for i in range(self.size):
+            yield Row(self, i)
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += self.size
+        if not 0 <= index < self.size:
+            raise IndexError(index)
+        return Row(self, index)
+
+    def _reserve(self, size):
+        if size <= self.capacity:
+            return
+        capacity = self.capacity
+        while capacity < size:
+            capacity *= 2
+        for column in self.columns:
+            array = np.empty(capacity, dtype=self.dtypes[column])
+            array[:self.size] = self._data[column][:self.size]
+            self._data[column] = array
+        self.capacity = capacity
+
+    def append(self, row):
+        """
+        Append a row.
+
+        Args:
+        row (list or dict): Values in column order, or a value per column.
+        """
+        self._reserve(self.size + 1)
+        if isinstance(row, dict):
+            for column in self.columns:
+                self._data[column][self.size] = row.get(column)
+        else:
+            for column, value in zip(self.columns, row):
+                self._data[column][self.size] = value
+        self.size += 1
+
+    def extend_frame(self, df):
+        """
+        Append the rows of a DataFrame, columns missing from it are left empty.
+
+        Args:
+        df (DataFrame): Rows to append.
+        """
+        n = len(df)
+        self._reserve(self.size + n)
+        for column in self.columns:
+            values = df[column].values if column in df.columns else None
+            self._data[column][self.size:self.size + n] = values
+        self.size += n
+
+    def column(self, column):
+        """
+        Get a column as an array view of the filled rows.
+
+        Args:
+        column (str): Column name.
+
+        Returns:
+        ndarray: Values of the column.
+        """
+        return self._data[column][:self.size]
+
+    def unique(self, column):
+        return list(dict.fromkeys(self.column(column).tolist()))
+
+    def mask(self, **where):
+        """
+        Get a boolean mask of the rows matching the given column values.
+        """
+        mask = np.ones(self.size, dtype=bool)
+        for column, value in where.items():
+            mask &= self.column(column) == value
+        return mask
+
+    def rows(self, **where):
+        """
+        Iterate over views of the rows matching the given column values.
+        """
+        for i in np.flatnonzero(self.mask(**where)):
+            yield Row(self, i)
+
+    def update(self, values, **where):
+        """
+        Set columns of the rows matching the given column values.
+
+        Args:
+        values (dict): New value per column.
+        **where: Column values identifying the rows.
+        """
+        mask = self.mask(**where)
+        for column, value in values.items():
+            self.column(column)[mask] = value
+
+    def delete(self, rows=None, **where):
+        """
+        Delete rows, given by index or boolean mask, or by matching column values.
+
+        Args:
+        rows (list or ndarray, optional): Row indexes or a boolean mask. Defaults to None.
+        **where: Column values identifying the rows.
+        """
+        rows = self.mask(**where) if rows is None else np.asarray(rows)
+        if rows.dtype == bool:
+            keep = ~rows
+        else:
+            keep = np.ones(self.size, dtype=bool)
+            keep[rows.astype(int)] = False
+        n = int(keep.sum())
+        for column in self.columns:
+            self._data[column][:n] = self.column(column)[keep]
+            self._data[column][n:self.size] = None if self.dtypes[column] == object else 0
+        self.size = n
+
+    def clear(self):
+        self.delete(np.ones(self.size, dtype=bool))
+
+    def to_frame(self):
+        """
+        Convert the filled rows to a DataFrame.
+
+        Returns:
+        DataFrame: The rows, with the buffer's columns.
+        """
+        return pd.DataFrame({column: self.column(column).copy() for column in self.columns}, columns=self.columns)
+
+
+def benchmark(sizes=(10000, 100000)):
+    """
+    Time building a table row by row with RecordBuffer and with DataFrame.append.
+    """
+    columns = ['Position_id', 'User_id', 'Order_id', 'Symbol', 'Transaction_type', 'Timestamp', 'Status',
+               'Status_message']
+    row = [1, 'USER1', '230101000001', 'NIFTY23JAN18000CE', 'BUY', '2023-01-02 10:15:00', 'COMPLETE', 'None']
+
+    for n in sizes:
+        start = time.perf_counter()
+        buffer = RecordBuffer(columns)
+        for i in range(n):
+            buffer.append(row)
+        buffer.to_frame()
+        buffer_time = time.perf_counter() - start
+
+        # DataFrame.append is quadratic, time the first rows and extrapolate past 10k
+        rows = min(n, 10000)
+        start = time.perf_counter()
+        df = pd.DataFrame(columns=columns)
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', FutureWarning)
+            for i in range(rows):
+                df = df.append(pd.DataFrame([row], columns=columns)).reset_index(drop=True)
+        append_time = time.perf_counter() - start
+        if rows < n:
+            append_time *= (n / rows) ** 2
+            label = '{:.1f} s (extrapolated from {} rows)'.format(append_time, rows)
+        else:
+            label = '{:.1f} s'.format(append_time)
+
+        print('{} rows: RecordBuffer {:.3f} s, DataFrame.append {}, {:.0f}x'.format(
+            n, buffer_time, label, append_time / buffer_time))
+
+
+if __name__ == '__main__':
+    benchmark([int(n) for n in sys.argv[1:]] or (10000, 100000))
@@ -0,0 +1,184 @@
+import sys
+import time
+import datetime
+import threading
+import numpy as np
+import pytz
+
+IST = pytz.timezone('Asia/Kolkata')
+SESSION_START = datetime.time(9, 15)
+SESSION_END = datetime.time(15, 30)
+
+# Candle length in seconds of the supported signal intervals
+INTERVAL_SECONDS = {'minute': 60, '3minute': 180, '5minute': 300, '15minute': 900, '60minute': 3600}
+
+
+class CandleScheduler:
+    """
+    Sleep until the next candle closes or an event arrives, instead of polling.
+
+    Candles start at the session open like Kite's, so 60 minute candles close at 10:15,
+    11:15 and so on, and the last one at the session close. The strategy loop waits
+    here between passes: it is woken for signal evaluation shortly after each candle
+    closes and for position management by tick and order update events. How late
+    each candle close wake is, the scheduling jitter, is recorded.
+    """
+
+    def __init__(self, interval='60minute', delay=1.0, last_boundary=None, session=(SESSION_START, SESSION_END),
+                 step=None):
+        """
+        Args:
+        interval (str, optional): Candle interval, a key of INTERVAL_SECONDS. Defaults to '60minute'.
+        delay (float, optional): Seconds after the candle close to wake, for the candle to be served. Defaults to 1.0.
+        last_boundary (float, optional): Epoch time of the last candle close already evaluated. Defaults to None.
+        session (tuple, optional): Session start and end times in IST. Defaults to (SESSION_START, SESSION_END).
+        step (float, optional): Seconds between candle closes, overrides interval. Defaults to None.
+        """
+        self.step = step or INTERVAL_SECONDS[interval]
+        self.delay = delay
+        self.last = last_boundary or 0
+        self.session = session
+        self.jitter = []
+        self.wakes = {'candle': 0, 'event': 0, 'timeout': 0}
+        self._days = dict()
+        self._event = False
+        self._sleeping_for = None
+        self._condition = threading.Condition()
+
+    def _day(self, t):
+        day = datetime.datetime.fromtimestamp(t, IST).date()
+        if day not in self._days:
+            self._days[day] = tuple(IST.localize(datetime.datetime.combine(day, session_time)).timestamp()
+                                    for session_time in self.session)
+        return self._days[day]
+
+    def boundary_before(self, t):
+        """
+        Get the last candle close at or before t, None if no candle of t's session has closed.
+        """
+        start, end = self._day(t)
+        if t >= end:
+            return float(end)
+        k = np.floor((t - start) / self.step)
+        if k < 1:
+            return None
+        return float(start + k * self.step)
+
+    def boundary_after(self, t):
+        """
+        Get the first candle close after t, in the next day's session after the session close.
+        """
+        start, end = self._day(t)
+        if t < start:
+            return start + self.step
+        if t >= end:
+            next_start, _ = self._day(start + 86400)
+            return next_start + self.step
+        return float(min(start + (np.floor((t - start) / self.step) + 1) * self.step, end))
+
+    def notify(self, *args):
+        """
+        Wake the waiting loop for an event, usable as a tick or order update listener.
+        """
+        with self._condition:
+            self._event = True
+            self._condition.notify_all()
+
+    def wait(self, timeout=None):
+        """
+        Wait for the next candle close, an event or the timeout.
+
+        A candle close that passed unevaluated, e.g. while the loop was busy or before a
+        restart, is returned immediately.
+
+        Args:
+        timeout (float, optional): Most seconds to wait. Defaults to None.
+
+        Returns:
+        str: 'candle', 'event' or 'timeout'.
+        float: Epoch time of the candle close for 'candle', otherwise None.
+        """
+        deadline = None if timeout is None else time.time() + timeout
+        with self._condition:
+            while True:
+                now = time.time()
+                boundary = self.boundary_before(now - self.delay)
+                if boundary is not None and boundary > self.last:
+                    if boundary == self._sleeping_for:
+                        self.jitter.append(now - boundary - self.delay)
+                    self.last = boundary
+                    self._sleeping_for = None
+                    self.wakes['candle'] += 1
+                    return 'candle', boundary
+                if self._event:
+                    self._event = False
+                    self.wakes['event'] += 1
+                    return 'event', None
+                if deadline is not None and now >= deadline:
+                    self.wakes['timeout'] += 1
+                    return 'timeout', None
+
+                self._sleeping_for = self.boundary_after(max(now - self.delay, self.last))
+                wake_at = self._sleeping_for + self.delay
+                if deadline is not None:
+                    wake_at = min(wake_at, deadline)
+                self._condition.wait(max(wake_at - now, 0))
+
+    def summary(self):
+        """
+        Get the wake counts and the jitter of candle close wakes.
+
+        Returns:
+        dict: Wakes per kind, and mean and max jitter in milliseconds.
+        """
+        jitter = np.array(self.jitter) * 1e3
+        return {'wakes': dict(self.wakes), 'jitter_mean_ms': float(jitter.mean()) if len(jitter) else None,
+                'jitter_max_ms': float(jitter.max()) if len(jitter) else None}
+
+
+def benchmark(boundaries=20, step=0.25, event_rate=20):
+    """
+    Wait for candle closes every step seconds with events arriving in between, and report
+    the jitter and the CPU time used, against polling for the candle close.
+    """
+    now = datetime.datetime.now(IST)
+    session = ((now - datetime.timedelta(seconds=1)).time(), (now + datetime.timedelta(hours=1)).time())
+    scheduler = CandleScheduler(delay=0, session=session, step=step)
+    scheduler.last = scheduler.boundary_before(time.time()) or 0
+
+    stop = threading.Event()
+
+    def events():
+        while not stop.wait(1 / event_rate):
+            scheduler.notify()
+
+    thread = threading.Thread(target=events, daemon=True)
+    thread.start()
+    wall, cpu = time.perf_counter(), time.process_time()
+    while scheduler.wakes['candle'] < boundaries:
+        scheduler.wait(timeout=5)
+    wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+    stop.set()
+    thread.join()
+    summary = scheduler.summary()
+
+    # Polling loop like the old main loop, checking the clock on every pass
+    last = scheduler.boundary_before(time.time())
+    late = []
+    poll_wall, poll_cpu = time.perf_counter(), time.process_time()
+    while len(late) < boundaries:
+        boundary = scheduler.boundary_before(time.time())
+        if boundary is not None and boundary > last:
+            late.append(time.time() - boundary)
+            last = boundary
+    poll_wall, poll_cpu = time.perf_counter() - poll_wall, time.process_time() - poll_cpu
+
+    print('{} candle closes every {} s, {} events/s'.format(boundaries, step, event_rate))
+    print('Scheduler: jitter mean {:.3f} ms, max {:.3f} ms, CPU {:5.1f}%, wakes {}'.format(
+        summary['jitter_mean_ms'], summary['jitter_max_ms'], 100 * cpu / wall, summary['wakes']))
+    print('Polling:   jitter mean {:.3f} ms, max {:.3f} ms, CPU {:5.1f}%'.format(
+        np.mean(late) * 1e3, np.max(late) * 1e3, 100 * poll_cpu / poll_wall))
+
+
+if __name__ == '__main__':
+    benchmark(*[float(arg) for arg in sys.argv[1:]])
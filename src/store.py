@@ -0,0 +1,298 @@
+import os
+import json
+import logging
+import sqlite3
+import threading
+from contextlib import contextmanager
+import numpy as np
+import pandas as pd
+
+# Table schemas, matching the files initialized by setup.py
+ENTRY_COLUMNS = ['Position_id', 'User_id', 'Buy_order_id', 'Inst_option', 'Instrument', 'Symbol', 'Option', 'Token',
+                 'Buy_time', 'Buy_price', 'LTP', 'Quantity', 'Trailing_SL', 'Signal_candle', 'open', 'high', 'low',
+                 'close']
+EXIT_COLUMNS = ['Position_id', 'User_id', 'Sell_order_id', 'Sell_time', 'Sell_price', 'Exit_type']
+TRADE_COLUMNS = ENTRY_COLUMNS + EXIT_COLUMNS[2:]
+FAILED_ORDER_COLUMNS = ['Position_id', 'User_id', 'Order_id', 'Symbol', 'Transaction_type', 'Timestamp', 'Status',
+                        'Status_message']
+SL_ORDER_COLUMNS = ['Position_id', 'User_id', 'Order_id', 'Symbol']
+
+# Columns and primary key of each table, tables without a key are append only
+TABLES = {
+    'entry_history': (ENTRY_COLUMNS, ['Position_id', 'User_id']),
+    'positions': (ENTRY_COLUMNS, ['Position_id', 'User_id']),
+    'sl_orders': (SL_ORDER_COLUMNS, ['Position_id', 'User_id']),
+    'trades': (TRADE_COLUMNS, ['Position_id', 'User_id']),
+    'trades_history': (TRADE_COLUMNS, None),
+    'failed_orders': (FAILED_ORDER_COLUMNS, None),
+    'failed_orders_history': (FAILED_ORDER_COLUMNS, None),
+    'state': (['Name', 'Key', 'Value'], ['Name', 'Key']),
+}
+
+# Files the store replaces, migrated by migrate_from_files
+CSV_FILES = {
+    'entry_history': 'entry_history.csv',
+    'positions': 'positions.csv',
+    'sl_orders': 'sl_orders.csv',
+    'trades': 'trades.csv',
+    'trades_history': 'trades_history.csv',
+    'failed_orders': 'failed_orders.csv',
+    'failed_orders_history': 'failed_orders_history.csv',
+}
+STATE_FILES = ['misc', 'crossover', 'completed_orders']
+# Trailing stop loss state files keyed by option type and instrument, stored keyed by Position_id
+POSITION_STATE_FILES = ['tsl', 'prev_high', 'tsl_increment', 'target']
+
+
+def to_sql_value(value):
+    """
+    Convert a value to a type SQLite can bind.
+    """
+    if isinstance(value, np.generic):
+        value = value.item()
+    if value is None or isinstance(value, (int, float, str, bytes)):
+        return None if isinstance(value, float) and np.isnan(value) else value
+    return str(value)
+
+
+class StateStore:
+    """
+    SQLite store (WAL mode) for the strategy's tables and trailing stop loss state.
+
+    Replaces rewriting whole CSV and JSON files with row level upserts, and groups the
+    writes of one trading event into a single transaction so a crash never leaves the
+    state half written.
+    """
+
+    def __init__(self, path='data/state.db'):
+        """
+        Args:
+        path (str, optional): Path to the database file. Defaults to 'data/state.db'.
+        """
+        self.path = path
+        self.conn = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self._lock = threading.RLock()
+        self._depth = 0
+        for table, (columns, key) in TABLES.items():
+            definition = ', '.join('"{}"'.format(column) for column in columns)
+            if key:
+                definition += ', PRIMARY KEY ({})'.format(', '.join('"{}"'.format(column) for column in key))
+            self.conn.execute('CREATE TABLE IF NOT EXISTS {} ({})'.format(table, definition))
+
+    def close(self):
+        self.conn.close()
+
+    @contextmanager
+    def transaction(self):
+        """
+        Group writes into one atomic transaction. Nested transactions join the outer one.
+        """
+        with self._lock:
+            if self._depth == 0:
+                self.conn.execute('BEGIN')
+            self._depth += 1
+            try:
+                yield self
+            except Exception:
+                self._depth -= 1
+                if self._depth == 0:
+                    self.conn.execute('ROLLBACK')
+                raise
+            else:
+                self._depth -= 1
+                if self._depth == 0:
+                    self.conn.execute('COMMIT')
+
+    def _execute(self, sql, params=()):
+        with self._lock:
+            return self.conn.execute(sql, [to_sql_value(value) for value in params])
+
+    def insert(self, table, row):
+        """
+        Insert a row, replacing the row with the same primary key if the table has one.
+
+        Args:
+        table (str): Name of the table.
+        row (dict or list): Column values, or values in the table's column order.
+        """
+        columns = TABLES[table][0]
+        if not isinstance(row, dict):
+            row = dict(zip(columns, row))
+        names = [column for column in columns if column in row]
+        sql = 'INSERT OR REPLACE INTO {} ({}) VALUES ({})'.format(
+            table, ', '.join('"{}"'.format(name) for name in names), ', '.join('?' * len(names)))
+        self._execute(sql, [row[name] for name in names])
+
+    upsert = insert
+
+    def insert_frame(self, table, df):
+        """
+        Insert every row of a DataFrame.
+
+        Args:
+        table (str): Name of the table.
+        df (DataFrame): Rows to insert, columns missing from the table are ignored.
+        """
+        with self.transaction():
+            for row in df.reindex(columns=[c for c in TABLES[table][0] if c in df.columns]).to_dict('records'):
+                self.insert(table, row)
+
+    def update(self, table, values, **where):
+        """
+        Update columns of the rows matching the given column values.
+
+        Args:
+        table (str): Name of the table.
+        values (dict): New value per column.
+        **where: Column values identifying the rows.
+        """
+        sql = 'UPDATE {} SET {} WHERE {}'.format(
+            table, ', '.join('"{}" = ?'.format(column) for column in values),
+            ' AND '.join('"{}" = ?'.format(column) for column in where))
+        self._execute(sql, list(values.values()) + list(where.values()))
+
+    def delete(self, table, **where):
+        """
+        Delete the rows matching the given column values, or every row if none are given.
+
+        Args:
+        table (str): Name of the table.
+        **where: Column values identifying the rows.
+        """
+        sql = 'DELETE FROM {}'.format(table)
+        if where:
+            sql += ' WHERE ' + ' AND '.join('"{}" = ?'.format(column) for column in where)
+        self._execute(sql, list(where.values()))
+
+    def frame(self, table):
+        """
+        Read a table into a DataFrame with the table's columns.
+
+        Args:
+        table (str): Name of the table.
+
+        Returns:
+        DataFrame: Rows of the table.
+        """
+        with self._lock:
+            df = pd.read_sql_query('SELECT * FROM {} ORDER BY rowid'.format(table), self.conn)
+        return df.reindex(columns=TABLES[table][0])
+
+    def set_state(self, name, value, *keys):
+        """
+        Set one value of a state dict, e.g. set_state('tsl', 95.5, 12) for position 12.
+
+        Args:
+        name (str): Name of the state dict.
+        value: JSON serializable value.
+        *keys: Path of the value inside the dict.
+        """
+        self.insert('state', [name, json.dumps(list(keys)), json.dumps(to_sql_value(value))])
+
+    def save_state(self, name, state):
+        """
+        Replace a whole state dict.
+
+        Args:
+        name (str): Name of the state dict.
+        state (dict): Nested dict of values.
+        """
+        def flatten(obj, keys):
+            if isinstance(obj, dict):
+                for key, value in obj.items():
+                    yield from flatten(value, keys + [key])
+            else:
+                yield keys, obj
+
+        with self.transaction():
+            self.delete('state', Name=name)
+            for keys, value in flatten(state, []):
+                self.set_state(name, value, *keys)
+
+    def delete_state(self, name, *keys):
+        """
+        Delete one value of a state dict.
+
+        Args:
+        name (str): Name of the state dict.
+        *keys: Path of the value inside the dict.
+        """
+        self.delete('state', Name=name, Key=json.dumps(list(keys)))
+
+    def load_state(self, name):
+        """
+        Load a state dict, rebuilt in the nested form of the JSON files it replaces.
+
+        Args:
+        name (str): Name of the state dict.
+
+        Returns:
+        dict: Nested dict of values.
+        """
+        state = dict()
+        for keys, value in self._execute('SELECT "Key", "Value" FROM state WHERE "Name" = ? ORDER BY rowid', [name]):
+            keys = json.loads(keys)
+            node = state
+            for key in keys[:-1]:
+                node = node.setdefault(key, dict())
+            node[keys[-1]] = json.loads(value)
+        return state
+
+    def archive_session(self):
+        """
+        Move the session's trades and failed orders to the history tables.
+        """
+        with self.transaction():
+            for table in ['trades', 'failed_orders']:
+                columns = ', '.join('"{}"'.format(column) for column in TABLES[table][0])
+                self._execute('INSERT INTO {0}_history ({1}) SELECT {1} FROM {0} ORDER BY rowid'.format(table, columns))
+                self.delete(table)
+
+    def migrate_from_files(self, data_dir='data'):
+        """
+        Import the CSV and JSON files the store replaces.
+
+        The trailing stop loss files are keyed by option type and instrument, while the
+        store keys them by Position_id. Each open position in positions.csv takes the
+        values of its option type and instrument. Values of open positions that are
+        missing from the files are not migrated, and the missing keys are logged.
+
+        Args:
+        data_dir (str, optional): Directory containing the files. Defaults to 'data'.
+        """
+        with self.transaction():
+            for table, file in CSV_FILES.items():
+                path = os.path.join(data_dir, file)
+                if os.path.exists(path):
+                    self.delete(table)
+                    self.insert_frame(table, pd.read_csv(path))
+            for name in STATE_FILES:
+                path = os.path.join(data_dir, name + '.json')
+                if os.path.exists(path):
+                    with open(path, 'r') as f:
+                        self.save_state(name, json.load(f))
+
+            positions = self.frame('positions')
+            for name in POSITION_STATE_FILES:
+                path = os.path.join(data_dir, name + '.json')
+                if not os.path.exists(path):
+                    continue
+                with open(path, 'r') as f:
+                    values = json.load(f)
+                state = dict()
+                for position in positions.drop_duplicates('Position_id').itertuples():
+                    value = values.get(position.Option, {}).get(position.Instrument)
+                    if value is None:
+                        logging.info("Not migrating {} of position {}: no value for {} {} in {}".format(
+                            name, position.Position_id, position.Option, position.Instrument, path))
+                        continue
+                    state[int(position.Position_id)] = value
+                self.save_state(name, state)
+
+
+if __name__ == '__main__':
+    store = StateStore('data/state.db')
+    store.migrate_from_files('data')
+    store.close()
@@ -6,13 +6,34 @@ import json
 import time
 import traceback
 import sys
-from kiteconnect import KiteConnect
+import threading
+from collections import namedtuple
+from kiteconnect import KiteConnect, KiteTicker
 import pandas as pd
 import numpy as np
 from math import ceil,floor
 import os
 from config import *
 from utils import *
+from ticker import TickStream, ReplayTicker
+from trade_high import TradeHighTracker
+from candle_store import CandleStore
+from indicators import IndicatorEngine
+from instruments import InstrumentIndex, load_snapshot
+from dispatcher import OrderDispatcher
+from order_tracker import OrderTracker
+from exits import fetch_account_books, detect_exits
+from store import StateStore, ENTRY_COLUMNS, FAILED_ORDER_COLUMNS, SL_ORDER_COLUMNS
+from journal import EventJournal, replay
+from records import RecordBuffer
+from position_book import PositionBook
+from gtt_queue import GttModifyQueue
+from broker import connect_accounts, create_session
+from quotes import QuoteBatcher
+from scheduler import CandleScheduler
+from workers import Worker, QueueWorker
+from option_chain import OptionChainCache
+from universe import UniverseScanner, resolve_underlyings, load_universe, entry_signals
 
 
 # Configure logging
@@ -39,16 +60,35 @@ TRAILING_STOP_LOSS = {'NIFTY 50': 0.18, 'NIFTY BANK': 0.18}
 MAIN_STOP_LOSS = {'NIFTY 50': 0.27, 'NIFTY BANK': 0.27}
 TARGET = {'NIFTY 50': 5, 'NIFTY BANK': 5}
 
+STRIKE_SELECTION = 'offset'  # offset: DESIRED_STRIKE strikes from the money, delta: the strike closest to TARGET_DELTA
+TARGET_DELTA = 0.3  # Absolute delta of the options bought with delta selection
+IV_RANGE = (0.05, 1.0)  # Implied volatilities allowed with delta selection
+STRIKE_WINDOW = 20  # Strikes on each side of the spot priced for delta selection
+RISK_FREE_RATE = 0.07  # Annual rate for implied volatility and Greeks
+
+SCAN_UNIVERSE = False  # Trade every F&O underlying listed by premarket.py instead of INSTRUMENTS
+SCAN_WORKERS = 8  # Concurrent historical requests of the hourly scan
+if SCAN_UNIVERSE:
+    INSTRUMENTS = load_universe()
+
 NO_OF_CYCLES = 3
+SIGNAL_INTERVAL = '60minute'  # Candle interval the entry conditions are checked on: minute, 3minute, 5minute, 15minute or 60minute
+SIGNAL_DELAY = 2  # Seconds after the candle close to check, for Kite to serve the candle
+POSITION_POLL_INTERVAL = 5  # Most seconds between position checks without ticks or order updates
+MAX_POSITIONS_PER_INSTRUMENT = 1  # Open positions allowed per instrument at a time
 SQUARE_OFF_TIME = datetime.datetime.combine(datetime.datetime.now(IST), datetime.time(15, 25))
 LOTS = 1
 
-# Order config
-EXCHANGE = 'NFO'
-VARIETY = 'regular'  # amo, co, iceberg, auction
-ORDER_TYPE = 'MARKET'  # LIMIT, SL, SL-M
-PRODUCT = 'NRML'  # CNC, MIS, NORMAL
-VALIDITY = 'DAY'  # IOC, TTL
+# Order config (EXCHANGE, VARIETY, ORDER_TYPE, PRODUCT, VALIDITY) is in utils, where the order functions read it
+
+# Market data config
+TICK_REPLAY_PATH = None  # Path to recorded ticks, replays them instead of connecting to Kite
+TICK_RECORD_PATH = None  # Path to record live ticks to
+ORDER_UPDATE_TIMEOUT = 10  # Seconds to wait for an order update before polling the order book
+GTT_MODIFY_RATE = 10  # GTT modify calls per second across all accounts
+JOURNAL_PATH = 'data/journal.log'  # Append-only log of trading events, replayed on startup
+HTTP_POOL_SIZE = 16  # Kite API connections kept open, shared by all accounts
+QUOTE_TTL = 1  # Seconds a batched LTP stays fresh
 
 # Login details
 with open('data/access_tokens.json', "r") as f:
@@ -58,308 +98,451 @@ with open('data/login_details.json', "r") as f:
 
 
 
-# Create dictionary to store KiteConnect instances for each user
-accounts = dict()
-
-# Initialize KiteConnect instances for each user and store them in the dictionary
-for user in USER_ID:
-    api_key = LOGIN_DETAILS[user]['api_key']
-    kc = KiteConnect(api_key=api_key)
-    kc.set_access_token(access_tokens[user])
-    accounts[user] = kc
+# KiteConnect client per user, all sharing one keep-alive connection pool, with a rate limiter per API key
+accounts = connect_accounts(USER_ID, LOGIN_DETAILS, access_tokens, session=create_session(HTTP_POOL_SIZE),
+                            max_in_flight=HTTP_POOL_SIZE)
 
 # Set kite variable to the KiteConnect instance for the account with historical API subscription
 kite = accounts[HIST_USER_ID]
 
+# Place orders for all accounts in parallel
+dispatcher = OrderDispatcher(accounts)
 
-# Loading data from CSV and JSON files
-entry_history = pd.read_csv('data/entry_history.csv')
-positions = pd.read_csv('data/positions.csv')
-trades_history = pd.read_csv('data/trades_history.csv')
-trades = pd.read_csv('data/trades.csv')
-failed_orders = pd.read_csv('data/failed_orders.csv')
-failed_orders_history = pd.read_csv('data/failed_orders.csv')
-runtime_errors = pd.read_csv('data/runtime_errors.csv')
-runtime_errors_history = pd.read_csv('data/runtime_errors_history.csv')
-sl_orders = pd.read_csv('data/sl_orders.csv')
+# Modify GTT orders off the main thread, coalesced per trigger and rate limited
+gtt_queue = GttModifyQueue(accounts, rate=GTT_MODIFY_RATE)
+
+
+# Loading state from the state store, each trading event below is written in one transaction
+store = StateStore('data/state.db')
+entry_history = RecordBuffer.from_frame(store.frame('entry_history'))
+trades = RecordBuffer.from_frame(store.frame('trades'))
+failed_orders = RecordBuffer.from_frame(store.frame('failed_orders'))
+sl_orders = store.frame('sl_orders')
+with runtime_errors_lock:
+    runtime_errors.extend_frame(pd.read_csv('data/runtime_errors.csv'))
+    # Errors of the session before a restart were added to the history when that run stopped
+    errors_at_startup = len(runtime_errors)
 
 # Define column names
-entry_cols = list(positions.columns)
+entry_cols = ENTRY_COLUMNS
 exit_cols = ['Position_id', 'User_id', 'Sell_order_id', 'Sell_time', 'Sell_price', 'Exit_type']
 
-# Load instrument data from CSV files
-options_instrument_df = pd.read_csv('data/options_instrument_df.csv')
-equity_instrument_df = pd.read_csv('data/equity_instrument_df.csv')
-
-# Load miscellaneous data from JSON files
-with open("data/misc.json", "r") as f:
-    misc = json.load(f)
-with open("data/crossover.json", "r") as f:
-    crossover = json.load(f)
-with open("data/tsl.json", "r") as f:
-    tsl = json.load(f)
-with open("data/tsl_increment.json", "r") as f:
-    tsl_increment = json.load(f)
-with open("data/target.json", "r") as f:
-    target = json.load(f)
-with open("data/prev_high.json", "r") as f:
-    prev_high = json.load(f)
-with open("data/completed_orders.json", "r") as f:
-    completed_orders = json.load(f)
+# Memory-map the equity instruments and load the instrument index built by premarket.py
+equity_instruments, _ = load_snapshot('data/equity_instrument.npy')
+instrument_index = InstrumentIndex.load('data/instrument_index.pkl')
+
+# Resolve the future and strike interval of every instrument, instruments without their own
+# settings use the ones of NIFTY 50
+underlyings = resolve_underlyings(instrument_index,INSTRUMENTS)
+INSTRUMENTS = list(underlyings)
+for inst, underlying in underlyings.items():
+    OPTION_NAME.setdefault(inst,underlying.name)
+    STRIKE_INTERVAL.setdefault(inst,underlying.strike_interval)
+    for params in [DESIRED_STRIKE,TRAILING_STOP_LOSS,MAIN_STOP_LOSS,TARGET]:
+        params.setdefault(inst,params['NIFTY 50'])
+    OFFSET['CE'][inst] = STRIKE_INTERVAL[inst] * -DESIRED_STRIKE[inst]
+    OFFSET['PE'][inst] = STRIKE_INTERVAL[inst] * DESIRED_STRIKE[inst]
 
+# Load miscellaneous state and the trailing stop loss state of each position
+misc = store.load_state('misc')
+crossover = store.load_state('crossover')
+completed_orders = store.load_state('completed_orders')
+levels = {field: store.load_state(field) for field in ['prev_high', 'tsl', 'tsl_increment', 'target']}
+
+# Rebuild positions and trailing stop loss state from the event journal, which is
+# written before the store, and bring the store back in line with it
+journal_state = replay(JOURNAL_PATH, INSTRUMENTS)
+if journal_state.events > 0:
+    entry_history = RecordBuffer.from_frame(journal_state.positions_frame())
+    sl_orders = journal_state.sl_orders_frame()
+    levels = journal_state.levels
+    completed_orders = journal_state.completed_orders
+    misc['position_id'] = max(misc.get('position_id', 0), journal_state.position_id)
+    with store.transaction():
+        for table, df in [('positions', entry_history.to_frame()), ('entry_history', entry_history.to_frame()),
+                          ('sl_orders', sl_orders)]:
+            store.delete(table)
+            store.insert_frame(table, df)
+        for name, state in list(levels.items()) + [('completed_orders', completed_orders), ('misc', misc)]:
+            store.save_state(name, state)
+for option_type in ['CE','PE']:
+    for inst in INSTRUMENTS:
+        completed_orders[option_type].setdefault(inst,0)
+journal = EventJournal(JOURNAL_PATH)
+
+# Open positions keyed by Position_id, with their trailing stop loss state and GTT ids per account
+book = PositionBook.from_frames(entry_history.to_frame(), sl_orders, levels)
+saved_ltp = dict()
+
+# Cache completed candles on disk so each check only fetches the new ones, fetched for all instruments concurrently
+# and the indicators of each instrument are advanced by the new candles only
+candle_store = CandleStore(kite)
+indicators = IndicatorEngine()
+scanner = UniverseScanner(candle_store,workers=SCAN_WORKERS,interval=SIGNAL_INTERVAL,indicators=indicators)
 
 position_id = misc['position_id']
-fut_symbols = get_indices_future_symbol(options_instrument_df)
-fut_symbols
-
-
-#main strategy loop
+fut_symbols = {inst: underlying.future for inst, underlying in underlyings.items()}
+
+# Option chains of every instrument's nearest expiry, sorted by strike
+chains = OptionChainCache(instrument_index)
+chains.warm([OPTION_NAME[inst] for inst in INSTRUMENTS])
+
+# Spot prices of the instruments are streamed with the futures
+spot_tokens = {symbol.decode('utf-8'): token for symbol, token in
+               zip(equity_instruments['tradingsymbol'].tolist(),equity_instruments['instrument_token'].tolist())
+               if symbol.decode('utf-8') in INSTRUMENTS}
+
+# LTPs not covered by the stream are fetched for all these instruments in one request
+quotes = QuoteBatcher(kite, ttl=QUOTE_TTL)
+quotes.want(*['NSE:'+inst for inst in INSTRUMENTS])
+quotes.want(*['NFO:'+symbol for symbol in fut_symbols.values()])
+quotes.want(*['NFO:'+position.symbol for position in book])
+
+# Stream last prices for index futures and open positions
+if TICK_REPLAY_PATH:
+    ticker = ReplayTicker(TICK_REPLAY_PATH)
+else:
+    ticker = KiteTicker(LOGIN_DETAILS[HIST_USER_ID]['api_key'], access_tokens[HIST_USER_ID])
+stream = TickStream(ticker, record_path=TICK_RECORD_PATH)
+
+# Track order status from the order updates pushed on each account's ticker connection
+order_tracker = OrderTracker(accounts)
+order_tracker.attach(ticker)
+order_tickers = []
+if not TICK_REPLAY_PATH:
+    for user in USER_ID:
+        if user != HIST_USER_ID:
+            order_ticker = KiteTicker(LOGIN_DETAILS[user]['api_key'], access_tokens[user])
+            order_tracker.attach(order_ticker)
+            order_ticker.connect(threaded=True)
+            order_tickers.append(order_ticker)
+stream.subscribe([get_instrument_token(symbol, instrument_index) for symbol in fut_symbols.values()])
+stream.subscribe([position.token for position in book])
+stream.subscribe(list(spot_tokens.values()))
+
+# Track running trade highs from ticks instead of refetching minute candles
+trade_highs = TradeHighTracker(kite)
+stream.add_listener(trade_highs.on_ticks)
+stream.add_listener(book.on_ticks)
+stream.start()
+
+
+# Signals found at each candle close are executed in order, one at a time
+Signal = namedtuple('Signal',['inst','option_type','candle','spot'])
+
+# Guards the record buffers shared by the execution and risk workers
+records_lock = threading.Lock()
+
+# Instruments with a signal waiting for or in execution, not scanned again until it is done
+pending_signals = set()
+
+# Candle closes wake the signal worker, ticks of open positions and order updates wake the risk worker
+scheduler = CandleScheduler(SIGNAL_INTERVAL,delay=SIGNAL_DELAY,last_boundary=misc.get('last_scan'))
+position_events = threading.Event()
+# Order updates, e.g. the sell order of a triggered GTT, also make the risk worker resolve exits
+order_events = threading.Event()
+last_reconcile = 0
+
+def on_position_ticks(ticks):
+    if book.holds([tick['instrument_token'] for tick in ticks]):
+        position_events.set()
+
+def on_order_update(order):
+    if len(book) > 0:
+        order_events.set()
+        position_events.set()
+
+stream.add_listener(on_position_ticks)
+order_tracker.add_listener(on_order_update)
+
+
+def signal_step():
+    """
+    Scan all instruments with room for a position when a signal candle closes and queue their entry signals.
+    """
+    wake, boundary = scheduler.wait(1)
+    if wake != 'candle':
+        return
+    misc['last_scan'] = boundary
+    store.set_state('misc',boundary,'last_scan')
+
+    # Scanning the futures of all instruments with room for a position at once
+    current_time = datetime.datetime.now(IST).strftime("%H:%M:%S")
+    to_date = CURRENT_DATE + ' ' + current_time
+    from_date = PREVIOUS_DATE + ' 09:15:00'
+    scan = scanner.scan([underlyings[inst] for inst in INSTRUMENTS
+                         if book.count(inst) < MAX_POSITIONS_PER_INSTRUMENT and inst not in pending_signals],
+                        from_date,to_date)
+    logging.info("Scanned {} instruments in {:.2f} s".format(len(scan),scanner.last_duration))
+    signals = {option_type: set(scan.index[entry_signals(scan,option_type)]) for option_type in ['CE','PE']}
+
+    for inst in scan.index:
+        current = scan.loc[inst]
+        candle = [current['date'],current['open'],current['high'],current['low'],current['close']]
+        spot = None
+        for option_type in ['CE','PE']:
+            if completed_orders[option_type][inst] < NO_OF_CYCLES and inst in signals[option_type]:
+                # One spot lookup per instrument and candle, streamed or from the batched quotes
+                if spot is None:
+                    spot = stream.ltp(spot_tokens[inst]) if inst in spot_tokens else None
+                    spot = spot if spot is not None else quotes.ltp('NSE:'+inst)
+                pending_signals.add(inst)
+                execution.put(Signal(inst,option_type,candle,spot))
+
+
+def execute_signal(signal):
+    try:
+        if datetime.datetime.now(IST) <= SQUARE_OFF_TIME:
+            enter_position(signal)
+    finally:
+        pending_signals.discard(signal.inst)
+
+
+def enter_position(signal):
+    """
+    Buy the option of a signal for all accounts, place its GTT orders and add the position to the book.
+    """
+    global position_id
+    inst, option_type = signal.inst, signal.option_type
+    sc_time = signal.candle[0]
+    if STRIKE_SELECTION == 'delta':
+        symbol = get_trading_symbol_by_delta(OPTION_NAME[inst],option_type,chains,quotes,signal.spot,TARGET_DELTA,
+                                             RISK_FREE_RATE,IV_RANGE,STRIKE_WINDOW)
+    else:
+        symbol = get_trading_symbol(inst,option_type,chains,OPTION_NAME[inst],STRIKE_INTERVAL[inst],
+                                    OFFSET[option_type][inst],quotes,signal.spot)
+    if symbol is None:
+        return
+    journal.append('signal',inst=inst,option=option_type,symbol=symbol,signal_candle=sc_time)
+    token = get_instrument_token(symbol,instrument_index)
+    stream.subscribe([token])
+    quotes.want('NFO:'+symbol)
+    lot_size = instrument_index.lot_size(symbol)
+
+    position_id += 1
+    placed_orders = {}
+
+    for user, order_id in dispatcher.dispatch(place_order,USER_ID,symbol,'BUY',LOTS * lot_size):
+        if order_id:
+            placed_orders[user] = order_id
+            journal.append('order_placed',position_id=position_id,user=user,order_id=order_id,symbol=symbol)
+    journal.flush()
+
+    # Waiting for the fills before the transaction, so the risk worker's writes are not held up
+    details = {user: get_order_details(user,order_id,accounts[user],order_tracker,ORDER_UPDATE_TIMEOUT) for user, order_id in placed_orders.items()}
+
+    successful_orders = []
+    buy_orders = {}
+    with store.transaction(), records_lock:
+        for user, order_id in placed_orders.items():
+            order,status,status_message,timestamp = details[user]
+            if status == 'COMPLETE':
+                successful_orders.append(user)
+                buy_orders[user] = order_id
+                buy_price = order['average_price'].values[0]
+                entry_data = [position_id,user,order_id,inst+option_type,inst,symbol,option_type,token,timestamp,buy_price,buy_price,LOTS * lot_size,0] + signal.candle
+                entry_history.append(entry_data)
+                journal.append('fill',**dict(zip(entry_cols,entry_data)))
+                store.insert('entry_history',entry_data)
+                store.insert('positions',entry_data)
+            else:
+                failed_data = [position_id,user,order_id,symbol,'BUY',timestamp,status,status_message]
+                journal.append('order_failed',**dict(zip(FAILED_ORDER_COLUMNS,failed_data)))
+                failed_orders.append(failed_data)
+                store.insert('failed_orders',failed_data)
+
+        if len(successful_orders) == 0:
+            journal.flush()
+            position_id -= 1
+            return
+
+        levels = {'prev_high': buy_price,
+                  'tsl': buy_price - MAIN_STOP_LOSS[inst] * buy_price,
+                  'tsl_increment': TRAILING_STOP_LOSS[inst] * buy_price,
+                  'target': buy_price + TARGET[inst] * buy_price}
+        misc['position_id'] = position_id
+        journal.append('position_opened',position_id=position_id,option=option_type,inst=inst,**levels)
+        journal.flush()
+        for field, value in levels.items():
+            store.set_state(field,value,position_id)
+        store.set_state('misc',position_id,'position_id')
+
+
+    # Placing OCO gtt orders (tsl and target) for all the successful buy orders
+    quantity = LOTS * lot_size
+    limit_prices = [levels['tsl'],levels['target']]
+
+
+    last_price = stream.ltp(token)
+    if last_price is None:
+        last_price = quotes.ltp('NFO:'+symbol,buy_price)
+
+
+    # Each account's GTT status is read back right after its placement, on the dispatcher's threads
+    placed_sl_orders = {}
+    gtt_details = {}
+    for user, (order_id,status,timestamp) in dispatcher.dispatch(place_confirmed_gtt_order,successful_orders,'two-leg',limit_prices,limit_prices,last_price,symbol,'SELL',quantity):
+        if order_id:
+            placed_sl_orders[user] = order_id
+            gtt_details[user] = (status,timestamp)
+
+    # The position joins the book with its GTT orders, so the risk worker never sees it without them
+    position = book.open(position_id,inst,option_type,symbol,token,timestamp,buy_price,quantity,
+                         tsl=levels['tsl'],tsl_increment=levels['tsl_increment'],target=levels['target'])
+    position.entries.update(buy_orders)
+    with store.transaction(), records_lock:
+        for user, order_id in placed_sl_orders.items():
+            status,timestamp = gtt_details[user]
+            status_message = 'None'
+            if status in ['triggered','active']:
+                position.gtt_ids[user] = order_id
+                journal.append('gtt_placed',position_id=position_id,user=user,order_id=order_id,symbol=symbol)
+                store.insert('sl_orders',[position_id,user,order_id,symbol])
+            else:
+                failed_data = [position_id,user,order_id,symbol,'SELL',timestamp,status,status_message]
+                journal.append('order_failed',**dict(zip(FAILED_ORDER_COLUMNS,failed_data)))
+                failed_orders.append(failed_data)
+                store.insert('failed_orders',failed_data)
+
+        journal.flush()
+        store.update('positions',{'Trailing_SL': position.tsl},Position_id=position_id)
+
+
+def risk_step():
+    """
+    Update the prices of the open positions, trail their stop losses and resolve their exits.
+    """
+    global last_reconcile
+    position_events.wait(POSITION_POLL_INTERVAL)
+    position_events.clear()
+    if len(book) == 0:
+        return
+
+    # Saving LTPs that changed since the last pass, the book is updated from ticks or batched quotes
+    with store.transaction():
+        for position in book:
+            last_price = stream.ltp(position.token)
+            if last_price is None:
+                last_price = quotes.ltp('NFO:'+position.symbol)
+            if last_price is not None:
+                book.mark(position.position_id,ltp=last_price)
+            if position.ltp != saved_ltp.get(position.position_id):
+                saved_ltp[position.position_id] = position.ltp
+                store.update('positions',{'LTP': position.ltp},Position_id=position.position_id)
+
+    for position in book:
+        trade_high = trade_highs.get(position.position_id,position.token,position.buy_time)
+        if trade_high is not None:
+            book.mark(position.position_id,high=trade_high)
+
+    # Trailing the stop loss of all positions at once and modifying the GTT orders of the ones that moved
+    for intent in book.trail():
+        position = book.get(intent.position_id)
+        pos = position.position_id
+        journal.append('tsl_moved',position_id=pos,option=position.option,inst=position.instrument,prev_high=position.prev_high,tsl=intent.tsl)
+        with store.transaction():
+            store.update('positions',{'Trailing_SL': intent.tsl},Position_id=pos)
+            store.set_state('prev_high',position.prev_high,pos)
+            store.set_state('tsl',intent.tsl,pos)
+
+        gtt_queue.submit(dict(position.gtt_ids),[intent.tsl,intent.target],intent.ltp,position.symbol,position.quantity,key=pos)
+    journal.flush()
+
+    # Recording the GTT modifications completed by the queue since the last pass
+    for result in gtt_queue.drain():
+        position = book.get(result.key)
+        if result.order_id is None or position is None or position.gtt_ids.get(result.user) != result.trigger_id:
+            continue
+        position.gtt_ids[result.user] = result.order_id
+        journal.append('gtt_modified',position_id=result.key,user=result.user,order_id=result.order_id,symbol=position.symbol)
+        store.update('sl_orders',{'Order_id': result.order_id},Position_id=result.key,User_id=result.user)
+    journal.flush()
+
+    # Exits are resolved after an order update or every POSITION_POLL_INTERVAL, ticks alone do not poll the order books
+    if not order_events.is_set() and time.monotonic() - last_reconcile < POSITION_POLL_INTERVAL:
+        return
+    order_events.clear()
+    last_reconcile = time.monotonic()
+
+    # Fetching every account's order book and GTTs once and resolving all exits in one join
+    sl_orders = book.sl_orders_frame(buy_orders=True)
+    orders, gtts = fetch_account_books(dispatcher,sl_orders['User_id'].unique())
+    exit_data, _ = detect_exits(sl_orders,orders,gtts)
+    if len(exit_data) > 0:
+        with records_lock:
+            temp_df = entry_history.to_frame().merge(exit_data,how='inner',on=['Position_id','User_id'])
+            trades.extend_frame(temp_df)
+        for exit_row in exit_data.to_dict('records'):
+            journal.append('exit',**exit_row)
+        journal.flush()
+        with store.transaction():
+            store.insert_frame('trades',temp_df)
+            for exit_row in exit_data.to_dict('records'):
+                store.delete('sl_orders',Position_id=exit_row['Position_id'],User_id=exit_row['User_id'])
+        for exit_row in exit_data.to_dict('records'):
+            gtt_queue.cancel(exit_row['User_id'],exit_row['Sell_order_id'])
+            book.get(exit_row['Position_id']).gtt_ids.pop(exit_row['User_id'],None)
+
+    #removing positions without open GTT orders from the book and entry history
+    for position in book:
+        if len(position.gtt_ids) == 0:
+            pos = position.position_id
+            inst = position.instrument
+            option = position.option
+            stream.unsubscribe([position.token])
+            quotes.forget('NFO:'+position.symbol)
+            trade_highs.remove(pos)
+            book.remove(pos)
+            saved_ltp.pop(pos,None)
+            with records_lock:
+                entry_history.delete(Position_id=pos)
+            completed_orders[option][inst] += 1
+            journal.append('position_closed',sync=True,position_id=pos,option=option,inst=inst)
+
+            with store.transaction():
+                store.delete('positions',Position_id=pos)
+                store.delete('entry_history',Position_id=pos)
+                for field in ['prev_high','tsl','tsl_increment','target']:
+                    store.delete_state(field,pos)
+                store.set_state('completed_orders',completed_orders[option][inst],option,inst)
+
+
+# Market data arrives on the ticker threads, signals, order execution and position monitoring
+# each run on their own worker so a slow step of one never delays the others
+execution = QueueWorker('execution',execute_signal,on_error=extract_error_info)
+workers = [Worker('signal',signal_step,on_error=extract_error_info).start(),
+           execution.start(),
+           Worker('risk',risk_step,on_error=extract_error_info).start()]
+
+
+#main thread waits until the strategy cycle has completed for all instruments or it is time to square off
 while(True):
-    #check conditions for each instrument
-    
-    with open("data/condition_checked.json", "r") as f:
-            condition_checked = json.load(f)
-    
-    hour_no = datetime.datetime.now(IST).hour
-    if not condition_checked[hour_no]:
-        condition_checked[hour_no] = 1
-        with open("data/condition_checked.json", "w") as f:
-            json.dump(condition_checked, f)
-        
-        for inst in INSTRUMENTS:
-            if inst in positions['Instrument'].unique():
-                continue       
-            
-            token_inst = fut_symbols[inst]
-            instrument_df = options_instrument_df.copy()
-            
-            token = get_instrument_token(token_inst,instrument_df)
-            current_time = datetime.datetime.now(IST).strftime("%H:%M:%S")
-            to_date = CURRENT_DATE + ' ' + current_time
-            from_date = PREVIOUS_DATE + ' 09:15:00'
-            interval = '60minute'
-            df = get_historical_data(token,from_date,to_date,interval)
-            if df is None:
-                continue
-
-            ema3 = get_ema(df,3)
-            ema13 = get_ema(df,13)
-            ema20 = get_ema(df,20)
-            current = df.iloc[-1]
-            low = current['low']
-            high = current['high']
-            close = current['close']
-            Open = current['open']
-            sc_time = current['date']
-
-            for option_type in ['CE','PE']:
-                if completed_orders[option_type][inst] < NO_OF_CYCLES and check_entry_conditions(low,close,ema3,ema13,ema20,mbb,option_type):
-                    symbol = get_trading_symbol(inst,option_type,options_instrument_df)
-                    if symbol is None:
-                        continue
-                    token = get_instrument_token(symbol,options_instrument_df)
-                    lot_size = options_instrument_df[options_instrument_df['tradingsymbol'] == symbol]['lot_size'].values[0]
-
-                    position_id += 1
-                    misc['position_id'] = position_id
-                    placed_orders = {}
-
-                    for user in USER_ID:
-                        acc = accounts[user]
-                        order_id = place_order(symbol,'BUY',LOTS * lot_size,acc)
-                        if order_id:
-                            placed_orders[user] = order_id
-
-                    time.sleep(5)
-                    successful_orders = []
-                    for user, order_id in placed_orders.items():
-                        order,status,status_message,timestamp = get_order_details(user,order_id)
-                        if status == 'COMPLETE':
-                            successful_orders.append(user)
-                            buy_price = order['average_price'].values[0]
-                            entry_data = [position_id,user,order_id,inst+option_type,inst,symbol,option_type,token,timestamp,buy_price,buy_price,LOTS * lot_size,0] + current.to_list()[:-1]
-                            entry_data = pd.DataFrame([entry_data],columns = entry_cols)   
-                            entry_history = entry_history.append(entry_data).reset_index(drop=True)
-                        else:
-                            failed_data = [position_id,user,order_id,symbol,'BUY',timestamp,status,status_message]
-                            failed_data = pd.DataFrame([failed_data],columns = list(failed_orders.columns))
-                            failed_orders = failed_orders.append(failed_data).reset_index(drop=True)
-                            failed_orders.to_csv('data/failed_orders.csv',index=False)
-
-                    if len(successful_orders) == 0:
-                        position_id -= 1
-                        misc['position_id'] = position_id
-                        continue
-
-                    positions = positions.append(entry_data).reset_index(drop=True)
-                    entry_history.to_csv('data/entry_history.csv',index=False)
-
-                    prev_high[option_type][inst] = buy_price
-                    tsl_increment[option_type][inst] = TRAILING_STOP_LOSS[inst] * buy_price
-                    tsl[option_type][inst] = buy_price - MAIN_STOP_LOSS[inst] * buy_price
-                    target[option_type][inst] = buy_price + TARGET[inst] * buy_price
-                    
-                    
-                    # Placing OCO gtt orders (tsl and target) for all the successful buy orders
-                    quantity = LOTS * lot_size
-                    limit_prices = [tsl[option_type][inst],target[option_type][inst]]
-                    
-
-                    try:
-                        last_price = float(kite.ltp('NFO:'+symbol)['NFO:'+symbol]['last_price'])
-                    except Exception as e:
-                        last_price = buy_price
-                        extract_error_info()
-                    
-
-                    placed_sl_orders = {}
-                    for user in successful_orders:
-                        acc = accounts[user]
-                        order_id = place_gtt_order('two-leg',limit_prices,limit_prices,last_price,symbol,'SELL',quantity,acc)
-                        if order_id:
-                            placed_sl_orders[user] = order_id
-                    time.sleep(2)
-                    for user, order_id in placed_sl_orders.items():
-                        status,timestamp = get_gtt_order_details(user,order_id)
-                        status_message = 'None'
-                        if status in ['triggered','active']:
-                            entry_data = pd.DataFrame([[position_id,user,order_id,symbol]],columns = list(sl_orders.columns)) 
-                            sl_orders = sl_orders.append(entry_data).reset_index(drop=True)
-                        else:
-                            failed_data = [position_id,user,order_id,symbol,'SELL',timestamp,status,status_message]
-                            failed_data = pd.DataFrame([failed_data],columns = list(failed_orders.columns))
-                            failed_orders = failed_orders.append(failed_data).reset_index(drop=True)
-                            failed_orders.to_csv('data/failed_orders.csv',index=False)
-
-                    sl_orders.to_csv('data/sl_orders.csv',index=False)
-                    positions.loc[len(positions)-1,'Trailing_SL'] = tsl[option_type][inst]
-                    positions.to_csv('data/positions.csv',index=False)
-
-                    with open("data/prev_high.json", "w") as f:
-                        json.dump(prev_high, f)
-
-                    with open("data/tsl.json", "w") as f:
-                        json.dump(tsl, f)
-
-                    with open("data/tsl_increment.json", "w") as f:
-                        json.dump(tsl_increment, f)
-
-                    with open("data/target.json", "w") as f:
-                        json.dump(target, f)
-
-                    with open("data/misc.json", "w") as f:
-                        json.dump(misc, f)            
-        
-    #track open positions
-    if len(positions) > 0:
-        
-
-        #updating the ltp for every position and if tsl has changed, modifying the slm order
-        for i,row in positions.iterrows():
-            symbol = row['Symbol']
-            option = row['Option']
-            inst = row['Instrument']
-            position = row['Position_id']
-            token = row['Token']
-            buy_time = row['Buy_time']
-            quantity = row['Quantity']
-            last_price = row['LTP']
-                
-            try:
-                last_price = float(kite.ltp('NFO:'+symbol)['NFO:'+symbol]['last_price'])
-                positions.loc[i,'LTP'] = last_price
-                positions.to_csv('data/positions.csv',index=False)     
-            except Exception as e:
-                extract_error_info()
-                        
-            trade_high = get_trade_high(token,buy_time)
-            if trade_high is None:
-                continue
-            
-            if trade_high - prev_high[option][inst] >= tsl_increment[option][inst]:
-                prev_high[option][inst] += tsl_increment[option][inst]
-                tsl[option][inst] += tsl_increment[option][inst]
-                positions.loc[i,'Trailing_SL'] = tsl[option][inst]
-                positions.to_csv('data/positions.csv',index=False)
-                
-                with open("data/prev_high.json", "w") as f:
-                    json.dump(prev_high, f)
-
-                with open("data/tsl.json", "w") as f:
-                    json.dump(tsl, f)
-                    
-                limit_prices = [tsl[option_type][inst],target[option_type][inst]]
-
-                for i,row in sl_orders[sl_orders['Position_id'] == position].iterrows():
-                    old_order_id = row['Order_id']
-                    user = row['User_id']
-                    acc = accounts[user]
-                    order_id = modify_gtt_order(old_order_id,'two-leg',limit_prices,limit_prices,last_price,symbol,'SELL',quantity,acc)
-                    if order_id:
-                        sl_orders.loc[i,'Order_id'] = order_id
-            
-        remove_orders = []
-        for i,row in sl_orders.iterrows():
-            user = row['User_id']
-            order_id = row['Order_id']
-            position = row['Position_id']
-            symbol = row['Symbol']
-            acc = accounts[user]
-            try:
-                orders = pd.DataFrame(acc.orders())
-            except Exception as e:
-                extract_error_info()
-                continue
-
-            order = orders[(orders['tradingsymbol'] == symbol) & (orders['transaction_type'] == 'SELL')].iloc[-1]
-            if order['status'] == 'COMPLETE':
-                sell_price = order['average_price']
-                timestamp = order['exchange_update_timestamp']
-                exit_data = [position,user,order_id,timestamp,sell_price,'Trailing_SL']
-                exit_data = pd.DataFrame([exit_data],columns = exit_cols)
-                temp_df = entry_history.merge(exit_data,how='inner',on=['Position_id','User_id'])
-                trades = trades.append(temp_df).reset_index(drop=True)
-                remove_orders.append(i)
-        sl_orders = sl_orders.drop(remove_orders).reset_index(drop=True)
-        sl_orders.to_csv('data/sl_orders.csv',index=False)
-        trades.to_csv('data/trades.csv',index=False)
-
-        #removing positions from entry history and positions table
-        for pos in positions['Position_id'].unique():
-            if pos not in sl_orders['Position_id'].values:
-                inst = positions[positions['Position_id'] == pos]['Instrument'].values[0]
-                option = positions[positions['Position_id'] == pos]['Option'].values[0]
-                positions = positions[positions['Position_id'] != pos].reset_index(drop=True)
-                entry_history = entry_history[entry_history['Position_id'] != pos].reset_index(drop=True)
-                positions.to_csv('data/positions.csv',index=False)
-                entry_history.to_csv('data/entry_history.csv',index=False)
-                tsl[option][inst] = 0
-                prev_high[option][inst] = 0
-                completed_orders[option][inst] += 1
-                
-                with open("data/prev_high.json", "w") as f:
-                    json.dump(prev_high, f)
-
-                with open("data/tsl.json", "w") as f:
-                    json.dump(tsl, f)
-                
-                with open("data/completed_orders.json", "w") as f:
-                    json.dump(completed_orders, f)
-
-
-    #if strategy cycle has completed for all instruments, stop the strategy
-    order_freq = list(completed_orders['CE'].values()) + list(completed_orders['PE'].values())
+    order_freq = [completed_orders[option_type][inst] for option_type in ['CE','PE'] for inst in INSTRUMENTS]
     if all(x == NO_OF_CYCLES for x in order_freq):
         break
     if datetime.datetime.now(IST) > SQUARE_OFF_TIME:
         break
-
-
-
-trades_history = trades_history.append(trades).reset_index(drop=True)
-failed_orders_history = failed_orders_history.append(failed_orders).reset_index(drop=True)
-runtime_errors_history = runtime_errors_history.append(runtime_errors).reset_index(drop=True)
-
-trades_history.to_csv('data/trades_history.csv',index=False)
-failed_orders_history.to_csv('data/failed_orders_history.csv',index=False)
-runtime_errors_history.to_csv('data/runtime_errors_history.csv',index=False)
\ No newline at end of file
+    time.sleep(1)
+
+for worker in workers:
+    worker.stop()
+
+stream.stop()
+for order_ticker in order_tickers:
+    order_ticker.close()
+dispatcher.shutdown()
+gtt_queue.close()
+scanner.close()
+journal.close()
+store.close()
+for user, acc in accounts.items():
+    logging.info("API queue wait per endpoint of {}: {}".format(user,acc.limiter.summary()))
+logging.info("Scheduler wakes and candle close jitter: {}".format(scheduler.summary()))
+logging.info("Signal queue wait: {}".format(execution.summary()))
+
+# Trades and failed orders are moved to their history tables by premarket.py, only the
+# runtime errors of this run are added to their history here
+with runtime_errors_lock:
+    new_errors = runtime_errors.to_frame().iloc[errors_at_startup:]
+if len(new_errors) > 0:
+    new_errors.to_csv('data/runtime_errors_history.csv',mode='a',header=False,index=False)
\ No newline at end of file
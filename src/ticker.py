@@ -0,0 +1,222 @@
+import json
+import time
+import logging
+import threading
+
+
+class TickStream:
+    """
+    Maintain an in-memory last price table fed by a KiteTicker connection.
+
+    The strategy loop reads prices from this table instead of calling kite.ltp,
+    so reading the LTP of an open position costs no network round trip.
+    """
+
+    def __init__(self, ticker, mode='ltp', record_path=None):
+        """
+        Args:
+        ticker (KiteTicker): KiteTicker instance, or a ReplayTicker for offline runs.
+        mode (str, optional): Streaming mode (ltp, quote or full). Defaults to 'ltp'.
+        record_path (str, optional): File to append received ticks to, for later replay. Defaults to None.
+        """
+        self.ticker = ticker
+        self.mode = mode
+        self.tokens = set()
+        self.last_prices = dict()
+        self.last_tick_time = dict()
+        self.listeners = []
+        # Guards the subscribed tokens and the price table, changed by the caller's threads and the ticker thread
+        self._lock = threading.Lock()
+        self._record = open(record_path, 'a') if record_path else None
+
+        ticker.on_ticks = self._on_ticks
+        ticker.on_connect = self._on_connect
+
+    def start(self):
+        """
+        Connect the ticker on a background thread.
+        """
+        self.ticker.connect(threaded=True)
+
+    def stop(self):
+        """
+        Close the ticker connection and the tick recording file.
+        """
+        self.ticker.close()
+        if self._record:
+            self._record.close()
+            self._record = None
+
+    def subscribe(self, tokens):
+        """
+        Subscribe to the given instrument tokens.
+
+        Args:
+        tokens (list): Instrument tokens to stream.
+        """
+        with self._lock:
+            tokens = list(dict.fromkeys(int(token) for token in tokens if int(token) not in self.tokens))
+            self.tokens.update(tokens)
+        if len(tokens) == 0:
+            return
+        if self.ticker.is_connected():
+            self.ticker.subscribe(tokens)
+            self.ticker.set_mode(self.mode, tokens)
+
+    def unsubscribe(self, tokens):
+        """
+        Stop streaming the given instrument tokens and drop their prices.
+
+        Args:
+        tokens (list): Instrument tokens to unsubscribe from.
+        """
+        with self._lock:
+            tokens = list(dict.fromkeys(int(token) for token in tokens if int(token) in self.tokens))
+            self.tokens.difference_update(tokens)
+            for token in tokens:
+                self.last_prices.pop(token, None)
+                self.last_tick_time.pop(token, None)
+        if len(tokens) == 0:
+            return
+        if self.ticker.is_connected():
+            self.ticker.unsubscribe(tokens)
+
+    def add_listener(self, callback):
+        """
+        Register a callback that receives every batch of ticks.
+
+        Args:
+        callback (func): Function called with the list of ticks.
+        """
+        self.listeners.append(callback)
+
+    def ltp(self, token, default=None):
+        """
+        Get the last traded price of a token from the in-memory table.
+
+        Args:
+        token (int): The instrument token.
+        default (float, optional): Value returned when no tick has arrived yet. Defaults to None.
+
+        Returns:
+        float: The last traded price.
+        """
+        return self.last_prices.get(int(token), default)
+
+    def _on_connect(self, ws, response):
+        with self._lock:
+            tokens = list(self.tokens)
+        if len(tokens) > 0:
+            ws.subscribe(tokens)
+            ws.set_mode(self.mode, tokens)
+
+    def _on_ticks(self, ws, ticks):
+        now = time.time()
+        with self._lock:
+            for tick in ticks:
+                token = tick['instrument_token']
+                # Ticks already in flight when a token was unsubscribed do not bring its price back
+                if token not in self.tokens:
+                    continue
+                self.last_prices[token] = tick['last_price']
+                self.last_tick_time[token] = now
+
+        if self._record:
+            self._record.write(json.dumps({'timestamp': now, 'ticks': ticks}, default=str) + '\n')
+
+        for callback in self.listeners:
+            try:
+                callback(ticks)
+            except Exception as e:
+                logging.info("Tick listener failed: {}".format(e))
+
+
+class ReplayTicker:
+    """
+    Local stand-in for KiteTicker that replays ticks recorded by TickStream.
+
+    Each line of the recording is a JSON object with a timestamp and either a list of
+    ticks or an order update. Only ticks for subscribed tokens are delivered, like the
+    live ticker.
+    """
+
+    def __init__(self, path, speed=0):
+        """
+        Args:
+        path (str): Path to the recorded ticks file.
+        speed (float, optional): Replay speed relative to the recording, 0 replays as fast as possible. Defaults to 0.
+        """
+        self.path = path
+        self.speed = speed
+        self.tokens = set()
+        self.on_ticks = None
+        self.on_connect = None
+        self.on_close = None
+        self.on_order_update = None
+        self._connected = False
+        self._thread = None
+
+    def connect(self, threaded=False):
+        """
+        Start replaying the recording.
+
+        Args:
+        threaded (bool, optional): Replay on a background thread. Defaults to False.
+        """
+        self._connected = True
+        if self.on_connect:
+            self.on_connect(self, None)
+        if threaded:
+            self._thread = threading.Thread(target=self._replay, daemon=True)
+            self._thread.start()
+        else:
+            self._replay()
+
+    def join(self, timeout=None):
+        """
+        Wait for a threaded replay to finish.
+
+        Args:
+        timeout (float, optional): Seconds to wait. Defaults to None.
+        """
+        if self._thread:
+            self._thread.join(timeout)
+
+    def is_connected(self):
+        return self._connected
+
+    def subscribe(self, tokens):
+        self.tokens.update(int(token) for token in tokens)
+
+    def unsubscribe(self, tokens):
+        self.tokens.difference_update(int(token) for token in tokens)
+
+    def set_mode(self, mode, tokens):
+        pass
+
+    def close(self, code=None, reason=None):
+        if self._connected:
+            self._connected = False
+            if self.on_close:
+                self.on_close(self, code, reason)
+
+    def _replay(self):
+        prev_timestamp = None
+        with open(self.path, 'r') as f:
+            for line in f:
+                if not self._connected:
+                    break
+                record = json.loads(line)
+                if self.speed and prev_timestamp is not None:
+                    time.sleep(max(record['timestamp'] - prev_timestamp, 0) / self.speed)
+                prev_timestamp = record['timestamp']
+
+                if 'order' in record:
+                    if self.on_order_update:
+                        self.on_order_update(self, record['order'])
+                    continue
+
+                ticks = [tick for tick in record['ticks'] if tick['instrument_token'] in self.tokens]
+                if len(ticks) > 0 and self.on_ticks:
+                    self.on_ticks(self, ticks)
+        self.close()
@@ -0,0 +1,195 @@
+import json
+import time
+import random
+import logging
+import threading
+import datetime
+import pytz
+import pandas as pd
+
+IST = pytz.timezone('Asia/Kolkata')
+
+
+class TradeHighTracker:
+    """
+    Track the running high of every open position since its buy time.
+
+    Each position is seeded once from minute candles and then advanced from ticks
+    or new candles, so reading the trade high is O(1) instead of downloading every
+    candle since the buy time on each loop pass.
+    """
+
+    def __init__(self, kite, interval='minute'):
+        """
+        Args:
+        kite (KiteConnect): KiteConnect instance with historical API access.
+        interval (str, optional): Candle interval used for seeding. Defaults to 'minute'.
+        """
+        self.kite = kite
+        self.interval = interval
+        self.highs = dict()
+        self.position_tokens = dict()
+        self.token_positions = dict()
+        # Ticks arrive on the ticker thread while positions are tracked and removed by the workers
+        self._lock = threading.Lock()
+
+    def track(self, position_id, token, buy_time):
+        """
+        Seed the running high of a position from its candles since buy time.
+
+        Args:
+        position_id (int): The position id.
+        token (int): The instrument token.
+        buy_time (str): The time of the trade.
+
+        Returns:
+        bool: True if the position was seeded, False if the history request failed.
+        """
+        token = int(token)
+        to_date = datetime.datetime.now(IST).strftime('%Y-%m-%d %H:%M:%S')
+        try:
+            data = self.kite.historical_data(token, buy_time, to_date, self.interval)
+        except Exception as e:
+            logging.info("Trade high seeding failed: {}".format(e))
+            return False
+
+        with self._lock:
+            if len(data) > 0:
+                high = max(candle['high'] for candle in data)
+                if self.highs.get(position_id) is None or high > self.highs[position_id]:
+                    self.highs[position_id] = high
+            self.position_tokens[position_id] = token
+            self.token_positions.setdefault(token, set()).add(position_id)
+        return True
+
+    def update(self, token, price):
+        """
+        Advance the running high of every position on a token.
+
+        Args:
+        token (int): The instrument token.
+        price (float): Latest traded price or candle high.
+        """
+        with self._lock:
+            for position_id in self.token_positions.get(token, ()):
+                high = self.highs.get(position_id)
+                if high is None or price > high:
+                    self.highs[position_id] = price
+
+    def on_ticks(self, ticks):
+        """
+        Advance running highs from a batch of ticks, for use as a TickStream listener.
+
+        Args:
+        ticks (list): List of ticks.
+        """
+        for tick in ticks:
+            self.update(tick['instrument_token'], tick['last_price'])
+
+    def on_candle(self, token, candle):
+        """
+        Advance running highs from a new candle.
+
+        Args:
+        token (int): The instrument token.
+        candle (dict): Candle with a high price.
+        """
+        self.update(int(token), candle['high'])
+
+    def get(self, position_id, token, buy_time):
+        """
+        Get the high price of a position since its buy time, seeding it on first use.
+
+        Args:
+        position_id (int): The position id.
+        token (int): The instrument token.
+        buy_time (str): The time of the trade.
+
+        Returns:
+        float: The high price of the trade, None if it is not known yet.
+        """
+        if position_id not in self.position_tokens:
+            self.track(position_id, token, buy_time)
+        return self.highs.get(position_id)
+
+    def remove(self, position_id):
+        """
+        Stop tracking a position.
+
+        Args:
+        position_id (int): The position id.
+        """
+        with self._lock:
+            token = self.position_tokens.pop(position_id, None)
+            self.highs.pop(position_id, None)
+            if token is not None:
+                self.token_positions[token].discard(position_id)
+                if len(self.token_positions[token]) == 0:
+                    del self.token_positions[token]
+
+
+class SessionKite:
+    """
+    Simulated historical API serving minute candles of a full session on a virtual clock.
+    """
+
+    def __init__(self, candles):
+        self.candles = candles
+        self.now = 0
+        self.calls = 0
+        self.bytes = 0
+
+    def historical_data(self, token, from_date, to_date, interval):
+        start = int(from_date)
+        data = self.candles[token][start:self.now + 1]
+        self.calls += 1
+        self.bytes += len(json.dumps(data, default=str))
+        return data
+
+
+def benchmark(n_positions=4, passes_per_minute=2, minutes=375):
+    """
+    Compare bytes fetched, API calls and loop time of get_trade_high against TradeHighTracker over a simulated session.
+
+    Args:
+    n_positions (int, optional): Number of open positions. Defaults to 4.
+    passes_per_minute (int, optional): Strategy loop passes per minute. Defaults to 2.
+    minutes (int, optional): Length of the session in minutes. Defaults to 375.
+
+    Returns:
+    DataFrame: Calls, bytes and seconds spent per approach.
+    """
+    start_time = datetime.datetime(2024, 1, 1, 9, 15, tzinfo=IST)
+    candles = dict()
+    for token in range(n_positions):
+        price = 100.0
+        candles[token] = []
+        for minute in range(minutes):
+            price = max(price + random.gauss(0, 1), 1)
+            candles[token].append({'date': start_time + datetime.timedelta(minutes=minute), 'open': price,
+                                   'high': price + 1, 'low': price - 1, 'close': price, 'volume': 1000})
+
+    results = []
+    for approach in ['get_trade_high', 'TradeHighTracker']:
+        kite = SessionKite(candles)
+        tracker = TradeHighTracker(kite)
+        highs = dict()
+        elapsed = 0
+        for minute in range(minutes):
+            kite.now = minute
+            for _ in range(passes_per_minute):
+                start = time.perf_counter()
+                for token in range(n_positions):
+                    if approach == 'get_trade_high':
+                        highs[token] = pd.DataFrame(kite.historical_data(token, 0, minute, 'minute'))['high'].max()
+                    else:
+                        tracker.update(token, candles[token][minute]['high'])
+                        highs[token] = tracker.get(token, token, 0)
+                elapsed += time.perf_counter() - start
+        results.append([approach, kite.calls, kite.bytes, elapsed])
+
+    return pd.DataFrame(results, columns=['Approach', 'Calls', 'Bytes', 'Seconds'])
+
+
+if __name__ == '__main__':
+    print(benchmark())
@@ -0,0 +1,126 @@
+import sys
+import time
+from collections import namedtuple
+import numpy as np
+
+# Request to move the GTT orders of a position to its new stop loss
+GttIntent = namedtuple('GttIntent', ['position_id', 'tsl', 'target', 'ltp'])
+
+
+def apply_ticks(state, tokens, prices):
+    """
+    Set the last price and raise the high of every position with a tick in the batch.
+
+    Args:
+    state (ndarray): Position rows with token, ltp and high fields.
+    tokens (ndarray): Instrument token of each tick.
+    prices (ndarray): Last price of each tick, the last tick of a token wins.
+
+    Returns:
+    ndarray: Indexes of the rows that received a tick.
+    """
+    tokens = np.asarray(tokens, dtype='i8')
+    prices = np.asarray(prices, dtype='f8')
+    if len(tokens) == 0 or len(state) == 0:
+        return np.empty(0, dtype=int)
+
+    # Keep the last tick per token, then look up each position's token in the sorted ticks
+    order = np.argsort(tokens, kind='stable')
+    tokens, prices = tokens[order], prices[order]
+    last = np.append(tokens[1:] != tokens[:-1], True)
+    tokens, prices = tokens[last], prices[last]
+
+    pos = np.minimum(np.searchsorted(tokens, state['token']), len(tokens) - 1)
+    rows = np.flatnonzero(tokens[pos] == state['token'])
+    ltp = prices[pos[rows]]
+    state['ltp'][rows] = ltp
+    state['high'][rows] = np.maximum(state['high'][rows], ltp)
+    return rows
+
+
+def trail_stops(state):
+    """
+    Ratchet the stop loss of every position by as many increments as its high has risen.
+
+    A high that gapped past several increments since the last move advances the
+    stop loss by all of them at once.
+
+    Args:
+    state (ndarray): Position rows with high, prev_high, tsl and tsl_increment fields.
+
+    Returns:
+    ndarray: Indexes of the rows whose stop loss moved.
+    """
+    increment = state['tsl_increment']
+    valid = increment > 0
+    steps = np.zeros(len(state))
+    steps[valid] = np.floor((state['high'][valid] - state['prev_high'][valid]) / increment[valid] + 1e-9)
+    rows = np.flatnonzero(steps >= 1)
+    moved = steps[rows] * increment[rows]
+    state['prev_high'][rows] += moved
+    state['tsl'][rows] += moved
+    return rows
+
+
+def intents(state, rows):
+    """
+    Build the GTT modification intents of the given rows.
+
+    Args:
+    state (ndarray): Position rows.
+    rows (ndarray): Indexes of the rows whose stop loss moved.
+
+    Returns:
+    list: GttIntent per row.
+    """
+    return [GttIntent(*values) for values in zip(state['position_id'][rows].tolist(), state['tsl'][rows].tolist(),
+                                                 state['target'][rows].tolist(), state['ltp'][rows].tolist())]
+
+
+def benchmark(n_positions=10000, passes=100):
+    """
+    Time applying a tick for every position and trailing all stops, against a per-row Python loop.
+    """
+    from position_book import POSITION_DTYPE
+
+    rng = np.random.default_rng(0)
+    state = np.zeros(n_positions, dtype=POSITION_DTYPE)
+    state['position_id'] = np.arange(n_positions)
+    state['token'] = rng.permutation(n_positions) + 100000
+    state['ltp'] = state['high'] = state['prev_high'] = 100.0
+    state['tsl_increment'] = 18.0
+    state['tsl'] = 73.0
+    state['target'] = 600.0
+    walk = 100.0 + rng.normal(0, 5, (passes, n_positions)).cumsum(axis=0)
+    ticks = [(state['token'].copy(), prices) for prices in walk]
+
+    vectorized = state.copy()
+    start = time.perf_counter()
+    moved = 0
+    for tokens, prices in ticks:
+        apply_ticks(vectorized, tokens, prices)
+        moved += len(intents(vectorized, trail_stops(vectorized)))
+    vectorized_time = (time.perf_counter() - start) / passes
+
+    looped = state.copy()
+    rows = {int(token): i for i, token in enumerate(looped['token'])}
+    start = time.perf_counter()
+    for tokens, prices in ticks[:max(passes // 10, 1)]:
+        for token, price in zip(tokens.tolist(), prices.tolist()):
+            row = looped[rows[token]]
+            row['ltp'] = price
+            row['high'] = max(row['high'], price)
+            if row['high'] - row['prev_high'] >= row['tsl_increment']:
+                row['prev_high'] += row['tsl_increment']
+                row['tsl'] += row['tsl_increment']
+    looped_time = (time.perf_counter() - start) / max(passes // 10, 1)
+
+    print('{} positions, {} tick batches, {} stop moves'.format(n_positions, passes, moved))
+    print('Vectorized: {:8.3f} ms per batch ({:,.0f} positions/ms)'.format(
+        vectorized_time * 1e3, n_positions / (vectorized_time * 1e3)))
+    print('Per row:    {:8.3f} ms per batch ({:,.0f} positions/ms)'.format(
+        looped_time * 1e3, n_positions / (looped_time * 1e3)))
+
+
+if __name__ == '__main__':
+    benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 10000)
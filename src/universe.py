@@ -0,0 +1,279 @@
+import sys
+import json
+import time
+import logging
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import pandas as pd
+
+# Spot symbols of the index underlyings, stock underlyings trade under their own name
+INDEX_NAMES = {'NIFTY 50': 'NIFTY', 'NIFTY BANK': 'BANKNIFTY', 'NIFTY FIN SERVICE': 'FINNIFTY',
+               'NIFTY MID SELECT': 'MIDCPNIFTY'}
+UNIVERSE_PATH = 'data/universe.json'
+
+# F&O underlying, keyed by its spot symbol like INSTRUMENTS
+Underlying = namedtuple('Underlying', ['spot', 'name', 'future', 'token', 'strike_interval', 'lot_size'])
+
+
+def resolve_underlyings(instrument_index, spots=None):
+    """
+    Resolve the nearest future and the strike interval of F&O underlyings from the instrument index.
+
+    Args:
+    instrument_index (InstrumentIndex): Index of the instrument information.
+    spots (list, optional): Spot symbols to resolve. Defaults to every underlying with futures and options.
+
+    Returns:
+    dict: Underlying per spot symbol.
+    """
+    spot_of = {name: spot for spot, name in INDEX_NAMES.items()}
+    names = instrument_index.underlyings()
+    if spots is not None:
+        names = [INDEX_NAMES.get(spot, spot) for spot in spots]
+
+    underlyings = dict()
+    for name in names:
+        try:
+            future = instrument_index.future_symbol(name)
+            strike_interval = instrument_index.strike_interval(name)
+        except KeyError:
+            logging.info("No futures and options for {}".format(name))
+            continue
+        if future is None or strike_interval is None:
+            continue
+        spot = spot_of.get(name, name)
+        underlyings[spot] = Underlying(spot, name, future, instrument_index.token(future), strike_interval,
+                                       instrument_index.lot_size(future))
+    return underlyings
+
+
+def save_universe(spots, path=UNIVERSE_PATH):
+    with open(path, 'w') as f:
+        json.dump(list(spots), f)
+
+
+def load_universe(path=UNIVERSE_PATH):
+    with open(path, 'r') as f:
+        return json.load(f)
+
+
+def stack_columns(frames, length):
+    """
+    Stack the last candles of each frame into arrays, one row per frame.
+
+    Rows of frames with fewer candles are padded with NaN on the left.
+
+    Args:
+    frames (list): Candle DataFrames.
+    length (int): Number of candles to keep per frame.
+
+    Returns:
+    dict: Array of shape (len(frames), length) per candle column.
+    """
+    columns = {column: np.full((len(frames), length), np.nan) for column in ['open', 'high', 'low', 'close']}
+    for row, df in enumerate(frames):
+        n = min(len(df), length)
+        if n == 0:
+            continue
+        for column, values in columns.items():
+            values[row, length - n:] = df[column].values[-n:]
+    return columns
+
+
+def scan_indicators(closes, ema_periods=(3, 13, 20), bb_period=20):
+    """
+    Compute the EMAs and Middle Bollinger Band of the last candle of every row at once.
+
+    EMAs match pandas ewm(span=period, adjust=False) started at each row's first close,
+    the band is NaN for rows with fewer than bb_period closes like pandas rolling.
+
+    Args:
+    closes (ndarray): Closes of shape (underlyings, candles), NaN padded on the left.
+    ema_periods (tuple, optional): EMA periods. Defaults to (3, 13, 20).
+    bb_period (int, optional): Bollinger band period. Defaults to 20.
+
+    Returns:
+    dict: Array with one value per row for each 'ema<period>' and 'mbb'.
+    """
+    alphas = np.array([2 / (period + 1) for period in ema_periods])[:, None]
+    emas = np.full((len(ema_periods), len(closes)), np.nan)
+    for column in closes.T:
+        updated = np.where(np.isnan(emas), column, emas + alphas * (column - emas))
+        emas = np.where(np.isnan(column), emas, updated)
+    indicators = {'ema{}'.format(period): emas[i] for i, period in enumerate(ema_periods)}
+    window = closes[:, -bb_period:]
+    indicators['mbb'] = window.mean(axis=1) if closes.shape[1] >= bb_period else np.full(len(closes), np.nan)
+    return indicators
+
+
+def entry_signals(scan, option_type):
+    """
+    Check the entry conditions of check_entry_conditions for every underlying of a scan.
+
+    Args:
+    scan (DataFrame): Scan from UniverseScanner.scan.
+    option_type (str): Option type (CE for Call, PE for Put).
+
+    Returns:
+    ndarray: True for the underlyings whose entry conditions are met.
+    """
+    low, close, ema3, ema13, ema20, mbb = [scan[column].values for column in
+                                           ['low', 'close', 'ema3', 'ema13', 'ema20', 'mbb']]
+    with np.errstate(invalid='ignore'):
+        if option_type == 'CE':
+            return (ema3 > ema13) & (ema3 > ema20) & (low > ema13) & (close > ema3) & (close > mbb) & (low < ema3)
+        return (ema3 < ema13) & (ema3 < ema20) & (low < ema13) & (close < ema3) & (close < mbb) & (low > ema3)
+
+
+class UniverseScanner:
+    """
+    Hourly scan of the entry indicators of many underlyings.
+
+    Candles of all underlyings are fetched concurrently through the CandleStore, so
+    only the new candles are requested and the requests keep the historical rate
+    limit of the shared RateLimiter busy instead of waiting on each response in
+    turn. With an IndicatorEngine the indicators of each underlying are advanced
+    by its new candles only, otherwise they are computed for all underlyings in
+    one array pass over the last length candles.
+    """
+
+    def __init__(self, candle_store, workers=8, interval='60minute', length=100, indicators=None):
+        """
+        Args:
+        candle_store (CandleStore): Candle cache of the account with historical API access.
+        workers (int, optional): Concurrent historical requests. Defaults to 8.
+        interval (str, optional): Candle interval. Defaults to '60minute'.
+        length (int, optional): Candles per underlying the indicators are computed over. Defaults to 100.
+        indicators (IndicatorEngine, optional): Incremental indicator state per token. Defaults to None.
+        """
+        self.candle_store = candle_store
+        self.indicators = indicators
+        self.interval = interval
+        self.length = length
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='universe-scan')
+        self.last_duration = None
+
+    def _fetch(self, token, from_date, to_date):
+        try:
+            return self.candle_store.get(token, from_date, to_date, self.interval)
+        except Exception as e:
+            logging.info("Historical data request for {} failed: {}".format(token, e))
+            return None
+
+    def fetch(self, tokens, from_date, to_date):
+        """
+        Fetch the completed candles of several tokens concurrently.
+
+        Args:
+        tokens (list): Instrument tokens.
+        from_date (str): The start date.
+        to_date (str): The end date.
+
+        Returns:
+        list: Candle DataFrame per token, None where the request failed.
+        """
+        return list(self.executor.map(lambda token: self._fetch(token, from_date, to_date), tokens))
+
+    def scan(self, underlyings, from_date, to_date):
+        """
+        Get the last completed candle and the indicators of every underlying.
+
+        Args:
+        underlyings (list): Underlying per instrument to scan.
+        from_date (str): The start date.
+        to_date (str): The end date.
+
+        Returns:
+        DataFrame: Indexed by spot symbol, with date, open, high, low, close, ema3, ema13, ema20 and mbb.
+        """
+        start = time.perf_counter()
+        frames = self.fetch([underlying.token for underlying in underlyings], from_date, to_date)
+        valid = [i for i, df in enumerate(frames) if df is not None and len(df) > 0]
+        frames = [frames[i] for i in valid]
+
+        columns = stack_columns(frames, self.length)
+        scan = pd.DataFrame({column: values[:, -1] for column, values in columns.items()},
+                            index=pd.Index([underlyings[i].spot for i in valid], name='Instrument'))
+        scan['date'] = [df['date'].iloc[-1] for df in frames]
+        if self.indicators is not None:
+            states = [self.indicators.update_from_frame(underlyings[i].token, df) for i, df in zip(valid, frames)]
+            self.indicators.save()
+            for period in (3, 13, 20):
+                scan['ema{}'.format(period)] = [state.ema(period) for state in states]
+            scan['mbb'] = [state.mbb() for state in states]
+        else:
+            for name, values in scan_indicators(columns['close']).items():
+                scan[name] = values
+
+        self.last_duration = time.perf_counter() - start
+        return scan
+
+    def close(self):
+        self.executor.shutdown(wait=True)
+
+
+def benchmark(n_underlyings=180, latency=0.4, rate=3, speed=10):
+    """
+    Time an hourly scan of n_underlyings against a simulated historical API, sequential and concurrent.
+
+    The API is sped up by a factor of speed, latency divided and rate multiplied by it,
+    and the reported times are scaled back.
+    """
+    from rate_limit import RateLimiter
+    from indicators import IndicatorEngine
+
+    n_underlyings = int(n_underlyings)
+    rng = np.random.default_rng(0)
+    dates = pd.date_range('2024-01-01 09:15', periods=200, freq='60min', tz='Asia/Kolkata')
+    closes = 100 + rng.normal(0, 1, (n_underlyings, len(dates))).cumsum(axis=1)
+    limiter = RateLimiter({'historical': rate * speed}, max_in_flight=16)
+
+    class Store:
+        def get(self, token, from_date, to_date, interval):
+            limiter.acquire('historical')
+            time.sleep(latency / speed)
+            limiter.release()
+            return pd.DataFrame({'date': dates, 'open': closes[token], 'high': closes[token] + 1,
+                                 'low': closes[token] - 1, 'close': closes[token]})
+
+    underlyings = [Underlying('STOCK{}'.format(i), 'STOCK{}'.format(i), 'STOCK{}FUT'.format(i), i, 5, 100)
+                   for i in range(n_underlyings)]
+
+    start = time.perf_counter()
+    engine = IndicatorEngine(path=None)
+    for underlying in underlyings:
+        df = Store().get(underlying.token, None, None, '60minute')
+        engine.update_from_frame(underlying.token, df.iloc[-100:])
+    sequential = (time.perf_counter() - start) * speed
+
+    scanner = UniverseScanner(Store(), workers=8, indicators=IndicatorEngine(path=None))
+    scan = scanner.scan(underlyings, None, None)
+    concurrent = scanner.last_duration * speed
+    scanner.close()
+
+    frames = [pd.DataFrame({'date': dates, 'open': c, 'high': c, 'low': c, 'close': c}) for c in closes]
+    start = time.perf_counter()
+    scan_indicators(stack_columns(frames, 100)['close'])
+    vectorized = time.perf_counter() - start
+
+    # The next candle of every underlying, fed to the engine state of the scan
+    engine = scanner.indicators
+    next_frames = [pd.DataFrame({'date': [dates[-1] + pd.Timedelta(minutes=60)], 'close': [c[-1]]}) for c in closes]
+    start = time.perf_counter()
+    for underlying, df in zip(underlyings, next_frames):
+        engine.update_from_frame(underlying.token, df)
+    incremental = time.perf_counter() - start
+
+    expected = pd.Series(closes[0]).ewm(span=20, adjust=False).mean().iloc[-1]
+    print('{} underlyings, {:.2f} s request latency, {} historical requests/s'.format(n_underlyings, latency, rate))
+    print('Sequential scan: {:6.1f} s'.format(sequential))
+    print('Concurrent scan: {:6.1f} s ({:.1f} s of requests at the full rate)'.format(concurrent, n_underlyings / rate))
+    print('Indicators of the next candle: {:.1f} ms incremental, {:.1f} ms recomputed over 100 candles'.format(
+        incremental * 1e3, vectorized * 1e3))
+    print('EMA20 difference from pandas over the whole history {:.2e}'.format(abs(scan['ema20'].iloc[0] - expected)))
+    print('CE signals: {}, PE signals: {}'.format(entry_signals(scan, 'CE').sum(), entry_signals(scan, 'PE').sum()))
+
+
+if __name__ == '__main__':
+    benchmark(*[float(arg) for arg in sys.argv[1:]])
@@ -2,9 +2,29 @@ import sys
 import traceback
 import datetime
 import pandas as pd
-from math import ceil
 import logging
 import time
+import threading
+import numpy as np
+import pytz
+from records import RecordBuffer
+from greeks import select_by_delta
+from universe import INDEX_NAMES
+
+IST = pytz.timezone('Asia/Kolkata')
+
+# Order config, read by the order functions below and star imported by the strategy
+EXCHANGE = 'NFO'
+VARIETY = 'regular'  # amo, co, iceberg, auction
+ORDER_TYPE = 'MARKET'  # LIMIT, SL, SL-M
+PRODUCT = 'NRML'  # CNC, MIS, NORMAL
+VALIDITY = 'DAY'  # IOC, TTL
+
+# Runtime errors of the session, shared with the strategy through its star import. Every worker
+# thread records its errors, so the buffer and the CSV file are written under runtime_errors_lock
+RUNTIME_ERROR_COLUMNS = ['Timestamp', 'Line_no', 'Code', 'Error_message']
+runtime_errors = RecordBuffer(RUNTIME_ERROR_COLUMNS)
+runtime_errors_lock = threading.Lock()
 
 
 def str_to_date(string, date_format='%Y-%m-%d %H:%M:%S'):
@@ -21,78 +41,113 @@ def str_to_date(string, date_format='%Y-%m-%d %H:%M:%S'):
     return datetime.datetime.strptime(string, date_format)
 
 
-def extract_error_info():
+def extract_error_info(path='data/runtime_errors.csv'):
     """
     Extract error information, log it, and save it.
+
+    Args:
+    path (str, optional): CSV file the error is appended to. Defaults to 'data/runtime_errors.csv'.
     """
-    global runtime_errors
     exc_type, exc_value, exc_traceback = sys.exc_info()
     error_message = str(exc_value)
     stack_trace = traceback.extract_tb(exc_traceback)
     line_no = stack_trace[-1].lineno
     code = stack_trace[-1].line
-    error = pd.DataFrame([[datetime.datetime.now(IST), line_no, code, error_message]],
-                         columns=['Timestamp', 'Line_no', 'Code', 'Error_message'])
-    runtime_errors = runtime_errors.append(error).reset_index(drop=True)
-    runtime_errors.to_csv('data/runtime_errors.csv', index=False)
+    error = [datetime.datetime.now(IST), line_no, code, error_message]
+    with runtime_errors_lock:
+        runtime_errors.append(error)
+        pd.DataFrame([error], columns=RUNTIME_ERROR_COLUMNS).to_csv(path, mode='a', header=False, index=False)
 
 
-def get_trading_symbol(instrument, option_type, instrument_df):
+def get_trading_symbol(instrument, option_type, instrument_index, option_name, strike_interval, offset, quotes=None,
+                       spot_price=None):
     """
     Get the trading symbol for the given instrument and option type.
 
     Args:
     instrument (str): The name of the instrument.
     option_type (str): The type of option.
-    instrument_df (DataFrame): DataFrame containing instrument information.
+    instrument_index (InstrumentIndex or OptionChainCache): Index of the instrument information.
+    option_name (str): Name of the instrument's options, e.g. NIFTY.
+    strike_interval (int): Interval between the instrument's strikes.
+    offset (int): Offset added to the at the money strike.
+    quotes (QuoteBatcher, optional): Batcher to read the spot price from. Defaults to None.
+    spot_price (float, optional): Spot price already looked up, e.g. from the tick stream. Defaults to None.
 
     Returns:
     str: The trading symbol.
     """
-    option_name = OPTION_NAME[instrument]
     try:
-        expiry_date = instrument_df[instrument_df['name'] == option_name]['expiry'].min()
-        spot_price = float(kite.ltp('NSE:'+instrument)['NSE:'+instrument]['last_price'])
-        atm = ceil(spot_price/STRIKE_INTERVAL[instrument]) * STRIKE_INTERVAL[instrument] 
-        strike_price = atm + OFFSET[option_type][instrument]
-        symbol = instrument_df.query("name == @option_name and strike == @strike_price and expiry == @expiry_date and instrument_type == @option_type")['tradingsymbol'].values[0]
-        return symbol
+        if spot_price is None:
+            spot_price = quotes.ltp('NSE:'+instrument)
+        return instrument_index.option_symbol(option_name, option_type, spot_price, strike_interval, offset)
     except Exception as e:
         extract_error_info()
 
 
-def get_indices_future_symbol(instrument_df):
+def get_trading_symbol_by_delta(option_name, option_type, chains, quotes, spot_price, target_delta, rate,
+                                iv_range=None, strike_window=20):
     """
-    Get the trading symbols for indices futures.
+    Get the trading symbol of the nearest expiry option whose delta is closest to a target,
+    instead of the one at a fixed offset from the at the money strike.
+
+    The options within strike_window strikes of the spot price are priced in one LTP request,
+    and those with an implied volatility outside iv_range are skipped.
 
     Args:
-    instrument_df (DataFrame): DataFrame containing instrument information.
+    option_name (str): Name of the underlying in the option symbols, e.g. NIFTY.
+    option_type (str): The type of option.
+    chains (OptionChainCache): Option chains of the underlyings.
+    quotes (QuoteBatcher): Batcher to read the option prices from.
+    spot_price (float): Spot price of the underlying.
+    target_delta (float): Absolute delta to select, e.g. 0.3.
+    rate (float): Risk free rate.
+    iv_range (tuple, optional): Lowest and highest implied volatility allowed. Defaults to None.
+    strike_window (int, optional): Strikes priced on each side of the spot price. Defaults to 20.
 
     Returns:
-    dict: Dictionary containing trading symbols for NIFTY 50 and NIFTY BANK futures.
+    str: The trading symbol, None if no option qualifies.
     """
-    fut_symbols = dict()
-    expiry_date = instrument_df[(instrument_df['name'] == 'BANKNIFTY') & (instrument_df['instrument_type'] == 'FUT')]['expiry'].min()
-    fut_symbols['NIFTY BANK'] = instrument_df.query("name == 'BANKNIFTY' and expiry == @expiry_date and instrument_type == 'FUT'")['tradingsymbol'].values[0]
-    fut_symbols['NIFTY 50'] = instrument_df.query("name == 'NIFTY' and expiry == @expiry_date and instrument_type == 'FUT'")['tradingsymbol'].values[0]
-    return fut_symbols
+    try:
+        chain = chains.chain(option_name, option_type)
+        atm = int(np.searchsorted(chain.strikes, spot_price))
+        window = slice(max(atm - strike_window, 0), atm + strike_window)
+        prices = np.full(len(chain), np.nan)
+        prices[window] = quotes.ltps(['NFO:'+symbol for symbol in chain.symbols[window]], default=np.nan)
+        return select_by_delta(chain, spot_price, prices, target_delta, rate, iv_range)
+    except Exception as e:
+        extract_error_info()
 
 
-def get_instrument_token(symbol, instrument_df):
+def get_indices_future_symbol(instrument_index, instruments=('NIFTY 50', 'NIFTY BANK')):
+    """
+    Get the trading symbols for the nearest futures of instruments.
+
+    Args:
+    instrument_index (InstrumentIndex): Index of the instrument information.
+    instruments (list, optional): Spot symbols of indices or F&O stocks. Defaults to NIFTY 50 and NIFTY BANK.
+
+    Returns:
+    dict: Dictionary containing the future trading symbol per instrument.
+    """
+    return {inst: instrument_index.future_symbol(INDEX_NAMES.get(inst, inst)) for inst in instruments}
+
+
+def get_instrument_token(symbol, instrument_index):
     """
     Get the instrument token for the given symbol.
 
     Args:
     symbol (str): The trading symbol.
-    instrument_df (DataFrame): DataFrame containing instrument information.
+    instrument_index (InstrumentIndex): Index of the instrument information.
 
     Returns:
     int: The instrument token.
     """
-    return instrument_df[instrument_df['tradingsymbol'] == symbol]['instrument_token'].values[0]
+    return instrument_index.token(symbol)
 
 
-def get_historical_data(token, from_date, to_date, interval):
+def get_historical_data(token, from_date, to_date, interval, store=None):
     """
     Get historical data for the given token and time range.
 
@@ -101,24 +156,28 @@ def get_historical_data(token, from_date, to_date, interval):
     from_date (str): The start date.
     to_date (str): The end date.
     interval (str): The interval for the data.
+    store (CandleStore, optional): Candle cache to read from, fetching only missing candles. Defaults to None.
 
     Returns:
-    DataFrame: Historical data.
+    DataFrame: Historical data of the completed candles.
     """
     try:
+        if store is not None:
+            return store.get(token, from_date, to_date, interval)
         data = kite.historical_data(token, from_date, to_date, interval)
         return pd.DataFrame(data).iloc[:-1]
     except:
         extract_error_info()
 
 
-def get_option_signal_candle_low(token, sc_time):
+def get_option_signal_candle_low(token, sc_time, store=None):
     """
     Get the low price of the candle for the given time.
 
     Args:
     token (int): The instrument token.
     sc_time (str): The time for the candle.
+    store (CandleStore, optional): Candle cache to read from. Defaults to None.
 
     Returns:
     float: The low price of the candle.
@@ -127,7 +186,7 @@ def get_option_signal_candle_low(token, sc_time):
     current_time = datetime.datetime.now(IST).strftime("%H:%M:%S")
     to_date = CURRENT_DATE + ' ' + current_time
     interval = '60minute'
-    df = get_historical_data(token, from_date, to_date, interval)
+    df = get_historical_data(token, from_date, to_date, interval, store)
     if df is None:
         return None
     return df[df['date'] == str(sc_time)]['low'].values[0]
@@ -332,22 +391,18 @@ def place_order(symbol, transaction_type, quantity, acc):
         extract_error_info()
 
 
-def place_gtt_order(trigger_type, trigger_values, limit_prices, last_price, symbol, transaction_type, quantity, acc):
+def gtt_orders(symbol, transaction_type, quantity, limit_prices):
     """
-    Place a Good Till Trigger (GTT) order.
+    Build the leg orders of a Good Till Trigger (GTT) order, one limit order per limit price.
 
     Args:
-    trigger_type (str): Type of trigger.
-    trigger_values (list): List of trigger values.
-    limit_prices (list): List of limit prices.
-    last_price (float): Last traded price.
     symbol (str): Trading symbol.
     transaction_type (str): Type of transaction (BUY or SELL).
     quantity (int): Quantity to buy or sell.
-    acc (Account): User's account.
+    limit_prices (list): List of limit prices.
 
     Returns:
-    str: Order ID if successful, None otherwise.
+    list: Order JSON per leg.
     """
     order_json1 = {
         "exchange": "NSE",
@@ -366,13 +421,35 @@ def place_gtt_order(trigger_type, trigger_values, limit_prices, last_price, symb
     order_json2["price"] = limit_prices[1]
     orders.append(order_json2)
 
+    return orders
+
+
+def place_gtt_order(trigger_type, trigger_values, limit_prices, last_price, symbol, transaction_type, quantity, acc):
+    """
+    Place a Good Till Trigger (GTT) order.
+
+    Args:
+    trigger_type (str): Type of trigger.
+    trigger_values (list): List of trigger values.
+    limit_prices (list): List of limit prices.
+    last_price (float): Last traded price.
+    symbol (str): Trading symbol.
+    transaction_type (str): Type of transaction (BUY or SELL).
+    quantity (int): Quantity to buy or sell.
+    acc (Account): User's account.
+
+    Returns:
+    str: Order ID if successful, None otherwise.
+    """
+    orders = gtt_orders(symbol, transaction_type, quantity, limit_prices)
+
     try:
         order_id = acc.place_gtt(trigger_type=trigger_type,
                                   tradingsymbol=symbol,
                                   exchange=EXCHANGE,
                                   trigger_values=trigger_values,
                                   last_price=last_price,
-                                  orders=orders)
+                                  orders=orders)['trigger_id']
 
         logging.info("Order placed. ID is: {}".format(order_id))
         return order_id
@@ -381,7 +458,8 @@ def place_gtt_order(trigger_type, trigger_values, limit_prices, last_price, symb
         extract_error_info()
 
 
-def modify_gtt_order(trigger_id, trigger_type, trigger_values, limit_prices, last_price, symbol, transaction_type, quantity, acc):
+def modify_gtt_order(trigger_id, trigger_type, trigger_values, limit_prices, last_price, symbol, transaction_type, quantity, acc, orders=None,
+                     errors_path='data/runtime_errors.csv'):
     """
     Modify a Good Till Trigger (GTT) order.
 
@@ -395,26 +473,14 @@ def modify_gtt_order(trigger_id, trigger_type, trigger_values, limit_prices, las
     transaction_type (str): Type of transaction (BUY or SELL).
     quantity (int): Quantity to buy or sell.
     acc (Account): User's account.
+    orders (list, optional): Leg orders built by gtt_orders, built from the other arguments if None.
+    errors_path (str, optional): CSV file a failure is saved to. Defaults to 'data/runtime_errors.csv'.
 
     Returns:
     str: Order ID if successful, None otherwise.
     """
-    order_json1 = {
-        "exchange": "NSE",
-        "tradingsymbol": symbol,
-        "transaction_type": transaction_type,
-        "quantity": quantity,
-        "order_type": "LIMIT",
-        "product": "NRML",
-        "transaction_type": transaction_type
-    }
-    order_json2 = order_json1.copy()
-    orders = []
-
-    order_json1["price"] = limit_prices[0]
-    orders.append(order_json1)
-    order_json2["price"] = limit_prices[1]
-    orders.append(order_json2)
+    if orders is None:
+        orders = gtt_orders(symbol, transaction_type, quantity, limit_prices)
 
     try:
         order_id = acc.modify_gtt(trigger_id=trigger_id,
@@ -423,13 +489,13 @@ def modify_gtt_order(trigger_id, trigger_type, trigger_values, limit_prices, las
                                    exchange=EXCHANGE,
                                    trigger_values=trigger_values,
                                    last_price=last_price,
-                                   orders=orders)
+                                   orders=orders)['trigger_id']
 
         logging.info("Order placed. ID is: {}".format(order_id))
         return order_id
     except Exception as e:
         logging.info("Order placement failed: {}".format(e))
-        extract_error_info()
+        extract_error_info(errors_path)
 
 
 def place_sl_order(symbol, transaction_type, quantity, acc, tsl):
@@ -493,21 +559,28 @@ def modify_sl_order(quantity, acc, tsl, old_order_id):
         extract_error_info()
 
 
-def get_order_details(user, order_id):
+def get_order_details(user, order_id, acc, tracker=None, timeout=10):
     """
     Get details of an order.
 
     Args:
     user (str): User identifier.
     order_id (str): ID of the order.
+    acc (Account): User's account, whose order book is read when the tracker has no update.
+    tracker (OrderTracker, optional): Order tracker to wait on for a terminal status instead of polling the order book. Defaults to None.
+    timeout (float, optional): Seconds to wait on the tracker. Defaults to 10.
 
     Returns:
     DataFrame: Details of the order.
-    str: Order status.
+    str: Order status, None if the order is not in the order book.
     str: Status message.
     str: Timestamp of the last update.
     """
-    acc = accounts[user]
+    if tracker is not None:
+        order = tracker.wait(order_id, timeout, user)
+        if order is not None:
+            return pd.DataFrame([order]), order['status'], order['status_message'], order['exchange_update_timestamp']
+
     while True:
         try:
             orders = pd.DataFrame(acc.orders())
@@ -516,26 +589,28 @@ def get_order_details(user, order_id):
             extract_error_info()
             time.sleep(5)
 
-    order = orders[orders['order_id'] == str(order_id)]
+    if len(orders) == 0 or str(order_id) not in orders['order_id'].astype(str).values:
+        logging.info("Order {} of {} is not in the order book".format(order_id, user))
+        return orders, None, 'Order not found', None
+    order = orders[orders['order_id'].astype(str) == str(order_id)]
     status = order['status'].values[0]
     status_message = order['status_message'].values[0]
     timestamp = order['exchange_update_timestamp'].values[0]
     return order, status, status_message, timestamp
 
 
-def get_gtt_order_details(user, order_id):
+def get_gtt_order_details(order_id, acc):
     """
     Get details of a Good Till Trigger (GTT) order.
 
     Args:
-    user (str): User identifier.
     order_id (str): ID of the order.
+    acc (Account): User's account.
 
     Returns:
     str: Order status.
     str: Timestamp of the last update.
     """
-    acc = accounts[user]
     while True:
         try:
             order = acc.get_gtt(order_id)
@@ -544,6 +619,34 @@ def get_gtt_order_details(user, order_id):
             extract_error_info()
             time.sleep(5)
 
-    status = order['data']['status']
-    timestamp = order['data']['updated_at']
+    status = order['status']
+    timestamp = order['updated_at']
     return status, timestamp
+
+
+def place_confirmed_gtt_order(trigger_type, trigger_values, limit_prices, last_price, symbol, transaction_type,
+                              quantity, acc):
+    """
+    Place a Good Till Trigger (GTT) order and read back its status, for dispatching to all accounts at once.
+
+    Args:
+    trigger_type (str): Type of trigger.
+    trigger_values (list): List of trigger values.
+    limit_prices (list): List of limit prices.
+    last_price (float): Last traded price.
+    symbol (str): Trading symbol.
+    transaction_type (str): Type of transaction (BUY or SELL).
+    quantity (int): Quantity to buy or sell.
+    acc (Account): User's account.
+
+    Returns:
+    str: Order ID, None if the placement failed.
+    str: Order status, None if the placement failed.
+    str: Timestamp of the last update, None if the placement failed.
+    """
+    order_id = place_gtt_order(trigger_type, trigger_values, limit_prices, last_price, symbol, transaction_type,
+                               quantity, acc)
+    if order_id is None:
+        return None, None, None
+    status, timestamp = get_gtt_order_details(order_id, acc)
+    return order_id, status, timestamp
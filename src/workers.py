@@ -0,0 +1,172 @@
+import sys
+import time
+import queue
+import logging
+import threading
+import numpy as np
+
+
+class Worker:
+    """
+    Thread calling a function in a loop until stopped.
+
+    The strategy runs its market data, signal, execution and risk work on separate
+    workers, so a slow step of one (a historical data fetch, waiting for a fill)
+    never delays the others.
+    """
+
+    def __init__(self, name, step, on_error=None):
+        """
+        Args:
+        name (str): Thread name.
+        step (func): Function called repeatedly, it should block for at most about a second.
+        on_error (func, optional): Called inside the except block when step raises. Defaults to logging the error.
+        """
+        self.name = name
+        self.step = step
+        self.on_error = on_error
+        self.stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self, timeout=None):
+        self.stopped.set()
+        self._thread.join(timeout)
+
+    def _handle_error(self):
+        if self.on_error is not None:
+            self.on_error()
+        else:
+            logging.info("{} failed: {}".format(self.name, sys.exc_info()[1]))
+
+    def _run(self):
+        while not self.stopped.is_set():
+            try:
+                self.step()
+            except Exception:
+                self._handle_error()
+
+
+class QueueWorker(Worker):
+    """
+    Thread handling the items put on its queue one at a time, in order.
+
+    The time each item waited in the queue is recorded.
+    """
+
+    def __init__(self, name, handler, on_error=None):
+        """
+        Args:
+        name (str): Thread name.
+        handler (func): Function called with each item.
+        on_error (func, optional): Called inside the except block when handler raises. Defaults to logging the error.
+        """
+        super().__init__(name, self._next, on_error)
+        self.handler = handler
+        self.queue = queue.Queue()
+        self.waits = []
+
+    def put(self, item):
+        self.queue.put((time.monotonic(), item))
+
+    def join(self):
+        """
+        Wait until every item put so far has been handled.
+        """
+        self.queue.join()
+
+    def stop(self, timeout=None):
+        """
+        Handle the queued items, then stop.
+        """
+        self.join()
+        super().stop(timeout)
+
+    def _next(self):
+        try:
+            queued, item = self.queue.get(timeout=0.5)
+        except queue.Empty:
+            return
+        try:
+            self.waits.append(time.monotonic() - queued)
+            self.handler(item)
+        finally:
+            self.queue.task_done()
+
+    def summary(self):
+        """
+        Get the number of items handled and their mean and max queue wait in seconds.
+        """
+        waits = np.array(self.waits)
+        return {'items': len(waits), 'wait_mean': float(waits.mean()) if len(waits) else 0.0,
+                'wait_max': float(waits.max()) if len(waits) else 0.0}
+
+
+def benchmark(fetch_delay=5.0, ticks=50, tick_interval=0.1):
+    """
+    Measure how long a stop loss move takes to reach the GTT modification step after its tick,
+    while the signal step stalls on a slow historical data fetch.
+
+    Compares one thread running the signal and position steps in turn with separate workers.
+    """
+    from position_book import PositionBook
+    ticks = int(ticks)
+
+    def run(threaded):
+        book = PositionBook()
+        book.open(1, 'NIFTY 50', 'CE', 'SYM', 101, '', 100.0, 50, tsl=73.0, tsl_increment=1.0, target=600.0)
+        tick_times = dict()
+        latencies = []
+        tick_event = threading.Event()
+        done = threading.Event()
+        fetched = []
+
+        def signal_step():
+            # The first candle's historical data fetch stalls, then the step waits for the next candle
+            done.wait(fetch_delay if not fetched else 0.5)
+            fetched.append(True)
+
+        def risk_step():
+            tick_event.wait(0.5)
+            tick_event.clear()
+            # Every tick whose stop loss level the move reached has been reacted to
+            for intent in book.trail():
+                for level in [level for level in list(tick_times) if level <= intent.tsl]:
+                    latencies.append(time.monotonic() - tick_times.pop(level))
+
+        def ticker():
+            for i in range(1, ticks + 1):
+                tick_times[73.0 + i] = time.monotonic()
+                book.on_ticks([{'instrument_token': 101, 'last_price': 100.0 + i}])
+                tick_event.set()
+                time.sleep(tick_interval)
+            done.set()
+
+        tick_thread = threading.Thread(target=ticker)
+        if threaded:
+            workers = [Worker('signal', signal_step).start(), Worker('risk', risk_step).start()]
+            tick_thread.start()
+            tick_thread.join()
+            time.sleep(0.6)
+            for worker in workers:
+                worker.stop()
+        else:
+            tick_thread.start()
+            while not done.is_set():
+                signal_step()
+                risk_step()
+            risk_step()
+        return np.array(latencies)
+
+    print('{} ticks every {} s, signal fetch stalled for {} s'.format(ticks, tick_interval, fetch_delay))
+    for label, threaded in [('Single thread', False), ('Workers', True)]:
+        latencies = run(threaded) * 1e3
+        print('{:13}: {:3} stop levels, TSL reaction mean {:8.1f} ms, max {:8.1f} ms'.format(
+            label, len(latencies), latencies.mean(), latencies.max()))
+
+
+if __name__ == '__main__':
+    benchmark(*[float(arg) for arg in sys.argv[1:]])
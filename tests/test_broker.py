@@ -0,0 +1,76 @@
+import threading
+import time
+
+from kiteconnect import KiteConnect
+
+from broker import DATA_PRIORITY, ORDER_PRIORITY, connect_accounts, route_endpoint, route_priority
+from rate_limit import RateLimiter
+
+
+def test_order_book_trade_and_gtt_routes_share_the_order_endpoint():
+    routes = [('orders', 'GET'), ('trades', 'GET'), ('order.info', 'GET'), ('order.trades', 'GET'),
+              ('order.place', 'POST'), ('order.modify', 'PUT'), ('order.cancel', 'DELETE'), ('gtt', 'GET'),
+              ('gtt.info', 'GET'), ('gtt.place', 'POST'), ('gtt.modify', 'PUT'), ('gtt.delete', 'DELETE')]
+    for route, method in routes:
+        assert route in KiteConnect._routes
+        assert route_endpoint(route, method) == 'orders'
+        assert route_priority(route, method) == (DATA_PRIORITY if method == 'GET' else ORDER_PRIORITY)
+
+
+def test_market_data_routes():
+    assert route_endpoint('market.historical', 'GET') == 'historical'
+    assert route_endpoint('market.quote.ltp', 'GET') == 'quote'
+    assert route_endpoint('portfolio.positions', 'GET') == 'default'
+    assert route_endpoint('mf.orders', 'GET') == 'default'
+    for route in ['market.historical', 'market.quote.ltp', 'portfolio.positions', 'mf.orders']:
+        assert route_priority(route, 'GET') == DATA_PRIORITY
+
+
+def acquire_in_thread(limiter, endpoint, priority, acquired):
+    def call():
+        limiter.acquire(endpoint, priority)
+        acquired.append((endpoint, time.monotonic()))
+        limiter.release()
+    thread = threading.Thread(target=call)
+    thread.start()
+    return thread
+
+
+def test_rate_limited_order_call_does_not_block_other_endpoints():
+    limiter = RateLimiter({'orders': 2, 'historical': 3})
+    limiter.acquire('orders', ORDER_PRIORITY)
+    limiter.acquire('orders', ORDER_PRIORITY)
+    limiter.release()
+    limiter.release()
+    acquired = []
+    start = time.monotonic()
+    order = acquire_in_thread(limiter, 'orders', ORDER_PRIORITY, acquired)
+    time.sleep(0.05)
+    waited = limiter.acquire('historical', DATA_PRIORITY)
+    limiter.release()
+    order.join()
+    assert waited < 0.1
+    assert acquired[0][1] - start > 0.3
+
+
+def test_order_call_takes_the_next_free_connection():
+    limiter = RateLimiter({'orders': 10, 'historical': 10}, max_in_flight=1)
+    limiter.acquire('historical', DATA_PRIORITY)
+    acquired = []
+    data = acquire_in_thread(limiter, 'historical', DATA_PRIORITY, acquired)
+    time.sleep(0.05)
+    order = acquire_in_thread(limiter, 'orders', ORDER_PRIORITY, acquired)
+    time.sleep(0.05)
+    limiter.release()
+    data.join()
+    order.join()
+    assert [endpoint for endpoint, _ in acquired] == ['orders', 'historical']
+
+
+def test_accounts_have_a_rate_limiter_per_api_key():
+    login_details = {'A': {'api_key': 'key1'}, 'B': {'api_key': 'key2'}, 'C': {'api_key': 'key1'}}
+    access_tokens = {'A': 'token', 'B': 'token', 'C': 'token'}
+    accounts = connect_accounts(['A', 'B', 'C'], login_details, access_tokens)
+    assert accounts['A'].limiter is accounts['C'].limiter
+    assert accounts['A'].limiter is not accounts['B'].limiter
+    assert accounts['A'].reqsession is accounts['B'].reqsession
@@ -0,0 +1,90 @@
+import pandas as pd
+import pytest
+
+from dispatcher import OrderDispatcher
+from exits import detect_exits, fetch_account_books
+from mock_broker import MockBroker
+from store import SL_ORDER_COLUMNS
+
+LEGS = [{'transaction_type': 'SELL', 'quantity': 50, 'price': price, 'order_type': 'LIMIT', 'product': 'NRML'}
+        for price in [80.0, 150.0]]
+
+
+@pytest.fixture
+def acc():
+    return MockBroker('USER1', prices={'SYM': 100.0})
+
+
+def enter(acc, position_id, stop_loss=80.0, target=150.0):
+    buy_order_id = acc.place_order('regular', 'NFO', 'SYM', 'BUY', 50, 'NRML', 'MARKET')
+    legs = [dict(LEGS[0], price=stop_loss), dict(LEGS[1], price=target)]
+    gtt_id = acc.place_gtt('two-leg', 'SYM', 'NFO', [stop_loss, target], acc.prices['SYM'], legs)['trigger_id']
+    return [position_id, 'USER1', gtt_id, 'SYM', buy_order_id]
+
+
+def books(acc):
+    dispatcher = OrderDispatcher({'USER1': acc})
+    try:
+        return fetch_account_books(dispatcher, ['USER1'])
+    finally:
+        dispatcher.shutdown()
+
+
+def frame(*rows):
+    return pd.DataFrame(list(rows), columns=SL_ORDER_COLUMNS + ['Buy_order_id'])
+
+
+def test_reentered_symbol_with_an_active_gtt_does_not_exit(acc):
+    first = enter(acc, 1)
+    acc.move_price('SYM', 79.0)
+    acc.move_price('SYM', 100.0)
+    second = enter(acc, 2)
+
+    exits, rows = detect_exits(frame(first, second), *books(acc))
+
+    assert exits['Position_id'].tolist() == [1]
+    assert rows == [0]
+    assert exits['Sell_price'].tolist() == [80.0]
+    assert exits['Exit_type'].tolist() == ['Trailing_SL']
+
+
+def test_exit_type_is_the_leg_that_filled(acc):
+    position = enter(acc, 1)
+    acc.move_price('SYM', 151.0)
+
+    exits, _ = detect_exits(frame(position), *books(acc))
+
+    assert exits['Exit_type'].tolist() == ['Target']
+    assert exits['Sell_price'].tolist() == [150.0]
+    assert exits['Sell_order_id'].tolist() == [position[2]]
+
+
+def test_triggered_gtt_without_its_order_falls_back_to_sells_after_the_buy(acc):
+    first = enter(acc, 1)
+    acc.move_price('SYM', 79.0)
+    acc.move_price('SYM', 100.0)
+    second = enter(acc, 2, stop_loss=90.0, target=120.0)
+    orders, gtts = books(acc)
+    # The second GTT has triggered but does not name its order, and no SELL followed its BUY yet
+    gtts.loc[gtts['Order_id'] == second[2], ['gtt_status', 'result_order_id', 'result_leg']] = ['triggered', None, None]
+
+    exits, _ = detect_exits(frame(second), orders, gtts)
+    assert exits.empty
+
+    acc.place_order('regular', 'NFO', 'SYM', 'SELL', 50, 'NRML', 'MARKET')
+    acc.prices['SYM'] = 121.0
+    orders, _ = books(acc)
+    orders.loc[orders.index[-1], 'average_price'] = 121.0
+
+    exits, _ = detect_exits(frame(second), orders, gtts)
+    assert exits['Position_id'].tolist() == [2]
+    assert exits['Sell_price'].tolist() == [121.0]
+    assert exits['Exit_type'].tolist() == ['Target']
+
+
+def test_no_exits_without_orders(acc):
+    position = enter(acc, 1)
+    exits, rows = detect_exits(frame(position), *books(acc))
+    assert exits.empty and rows == []
+    exits, rows = detect_exits(frame(), *books(acc))
+    assert exits.empty and rows == []
@@ -0,0 +1,135 @@
+import datetime
+
+import numpy as np
+import pytest
+
+from greeks import IST, bs_price, greeks, implied_volatility, select_by_delta, time_to_expiry
+from option_chain import OptionChain
+from utils import get_trading_symbol_by_delta
+
+SPOT = 19500.0
+RATE = 0.07
+STRIKES = np.arange(17000, 22001, 50).astype('f8')
+NOW = IST.localize(datetime.datetime(2030, 1, 1, 10))
+
+
+def smile(strikes):
+    moneyness = np.log(strikes / SPOT)
+    return 0.13 - 0.3 * moneyness + 3 * moneyness ** 2
+
+
+def make_chain(option_type):
+    symbols = ['NIFTY{:.0f}{}'.format(strike, option_type) for strike in STRIKES]
+    return OptionChain('NIFTY', '2030-01-31', option_type, STRIKES, symbols, range(len(STRIKES)), [50] * len(STRIKES))
+
+
+@pytest.mark.parametrize('days', [2, 7, 30, 90])
+def test_implied_volatility_recovers_the_pricing_volatility(days):
+    t = days / 365
+    strikes = np.repeat(STRIKES, 2)
+    is_call = np.tile([True, False], len(STRIKES))
+    vol = smile(strikes)
+    prices = bs_price(SPOT, strikes, t, vol, RATE, is_call)
+
+    iv = implied_volatility(prices, SPOT, strikes, t, RATE, is_call)
+
+    solved = ~np.isnan(iv)
+    assert solved.sum() > 0
+    np.testing.assert_allclose(iv[solved], vol[solved], atol=1e-8)
+    # Only options with less than a tick of time value are left unsolved
+    discounted = strikes * np.exp(-RATE * t)
+    time_value = prices - np.where(is_call, np.maximum(SPOT - discounted, 0), np.maximum(discounted - SPOT, 0))
+    assert np.array_equal(solved, time_value >= 0.05)
+
+
+def test_implied_volatility_is_nan_for_prices_outside_the_bounds():
+    t = 30 / 365
+    strikes = np.array([19500.0, 19500.0, 19000.0, 19500.0])
+    prices = np.array([np.nan, SPOT + 1, 500.0 + 0.01, 0.0])
+    iv = implied_volatility(prices, SPOT, strikes, t, RATE, True)
+    assert np.isnan(iv).all()
+
+
+def test_put_and_call_greeks_agree_by_parity():
+    t = 30 / 365
+    vol = smile(STRIKES)
+    call = greeks(SPOT, STRIKES, t, vol, RATE, True)
+    put = greeks(SPOT, STRIKES, t, vol, RATE, False)
+    np.testing.assert_allclose(call['delta'] - put['delta'], 1)
+    np.testing.assert_allclose(call['gamma'], put['gamma'])
+    np.testing.assert_allclose(call['vega'], put['vega'])
+    assert ((call['delta'] > 0) & (call['delta'] < 1)).all()
+
+
+def test_time_to_expiry_counts_to_the_market_close():
+    assert time_to_expiry('2030-01-01', NOW) == pytest.approx(5.5 * 3600 / (365 * 86400))
+    assert time_to_expiry('2029-12-31', NOW) > 0
+
+
+@pytest.mark.parametrize('option_type', ['CE', 'PE'])
+def test_select_by_delta_picks_the_closest_delta(option_type):
+    chain = make_chain(option_type)
+    t = time_to_expiry(chain.expiry, NOW)
+    is_call = option_type == 'CE'
+    vol = smile(STRIKES)
+    prices = bs_price(SPOT, STRIKES, t, vol, RATE, is_call)
+    delta = np.abs(greeks(SPOT, STRIKES, t, vol, RATE, is_call)['delta'])
+
+    symbol = select_by_delta(chain, SPOT, prices, 0.3, RATE, now=NOW)
+
+    assert symbol == chain.symbols[np.argmin(np.abs(delta - 0.3))]
+
+
+def test_select_by_delta_skips_options_outside_the_iv_range():
+    chain = make_chain('CE')
+    prices = bs_price(SPOT, STRIKES, time_to_expiry(chain.expiry, NOW), smile(STRIKES), RATE, True)
+    assert select_by_delta(chain, SPOT, prices, 0.3, RATE, iv_range=(0.5, 1.0), now=NOW) is None
+    assert select_by_delta(chain, SPOT, np.full(len(chain), np.nan), 0.3, RATE, now=NOW) is None
+
+
+class FakeQuotes:
+
+    def __init__(self, prices):
+        self.prices = prices
+        self.requests = []
+
+    def ltps(self, instruments, default=None):
+        self.requests.append(instruments)
+        return [self.prices.get(instrument, default) for instrument in instruments]
+
+
+class FakeChains:
+
+    def __init__(self, chain):
+        self._chain = chain
+
+    def chain(self, name, option_type):
+        return self._chain
+
+
+def test_get_trading_symbol_by_delta_prices_the_window_in_one_request():
+    chain = make_chain('CE')
+    t = time_to_expiry(chain.expiry)
+    prices = bs_price(SPOT, STRIKES, t, smile(STRIKES), RATE, True)
+    quotes = FakeQuotes({'NFO:' + symbol: price for symbol, price in zip(chain.symbols, prices)})
+
+    symbol = get_trading_symbol_by_delta('NIFTY', 'CE', FakeChains(chain), quotes, SPOT, 0.3, RATE, (0.05, 1.0),
+                                         strike_window=10)
+
+    assert len(quotes.requests) == 1 and len(quotes.requests[0]) == 20
+    windowed = np.where(np.abs(STRIKES - SPOT) <= 500, prices, np.nan)
+    windowed[STRIKES == SPOT + 500] = np.nan
+    assert symbol == select_by_delta(chain, SPOT, windowed, 0.3, RATE, (0.05, 1.0))
+
+
+def test_get_trading_symbol_by_delta_records_failures(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / 'data').mkdir()
+
+    class FailingQuotes:
+        def ltps(self, instruments, default=None):
+            raise Exception('Too many requests')
+
+    assert get_trading_symbol_by_delta('NIFTY', 'CE', FakeChains(make_chain('CE')), FailingQuotes(), SPOT, 0.3,
+                                       RATE) is None
+    assert (tmp_path / 'data' / 'runtime_errors.csv').exists()
@@ -0,0 +1,142 @@
+import threading
+
+import pytest
+
+from gtt_queue import GttModifyQueue
+from mock_broker import MockBroker
+from utils import modify_gtt_order
+
+
+@pytest.fixture
+def data_dir(tmp_path, monkeypatch):
+    # modify_gtt_order saves the errors it handles to data/runtime_errors.csv
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / 'data').mkdir()
+    return tmp_path
+
+
+def make_account(**kwargs):
+    acc = MockBroker('USER1', prices={'SYM': 100}, **kwargs)
+    trigger_id = acc.place_gtt('two-leg', 'SYM', 'NFO', [73, 600], 100, [{}, {}])['trigger_id']
+    return acc, trigger_id
+
+
+def test_raising_modify_is_retried_then_reported_failed():
+    calls = []
+
+    def modify(*args, **kwargs):
+        calls.append(args[0])
+        raise Exception('Too many requests')
+
+    queue = GttModifyQueue({'USER1': None}, rate=100, max_retries=2, backoff=0.01, modify=modify)
+    queue.submit({'USER1': 7}, [80, 600], 100, 'SYM', 50, key=1)
+
+    assert queue.join(timeout=5)
+    assert not queue.in_flight
+    assert calls == [7, 7, 7]
+    assert queue.stats['retries'] == 2 and queue.stats['failed'] == 1
+    assert queue.drain() == [(1, 'USER1', 7, None)]
+    queue.close()
+
+
+def test_raising_modify_does_not_stop_later_submits():
+    attempts = []
+
+    def modify(trigger_id, *args, **kwargs):
+        attempts.append(trigger_id)
+        if len(attempts) == 1:
+            raise Exception('Too many requests')
+        return trigger_id
+
+    queue = GttModifyQueue({'USER1': None}, rate=100, backoff=0.01, modify=modify)
+    queue.submit({'USER1': 7}, [80, 600], 100, 'SYM', 50, key=1)
+    assert queue.join(timeout=5)
+    queue.submit({'USER1': 8}, [81, 600], 100, 'SYM', 50, key=2)
+    assert queue.join(timeout=5)
+
+    assert sorted(queue.drain()) == [(1, 'USER1', 7, 7), (2, 'USER1', 8, 8)]
+    queue.close()
+
+
+def test_modifications_queued_behind_a_call_are_coalesced():
+    release = threading.Event()
+    sent = []
+
+    def modify(trigger_id, trigger_type, trigger_values, *args, **kwargs):
+        release.wait(5)
+        sent.append(trigger_values[0])
+        return trigger_id
+
+    queue = GttModifyQueue({'USER1': None}, rate=100, modify=modify)
+    queue.submit({'USER1': 7}, [74, 600], 100, 'SYM', 50)
+    while not queue.in_flight:
+        pass
+    for stop_loss in [75, 76, 77]:
+        queue.submit({'USER1': 7}, [stop_loss, 600], 100, 'SYM', 50)
+    release.set()
+    assert queue.join(timeout=5)
+
+    assert sent == [74, 77]
+    assert queue.stats['coalesced'] == 2
+    queue.close()
+
+
+def test_cancelled_trigger_is_not_retried():
+    calls = []
+
+    def modify(trigger_id, *args, **kwargs):
+        calls.append(trigger_id)
+        return None
+
+    queue = GttModifyQueue({'USER1': None}, rate=100, max_retries=3, backoff=0.2, modify=modify)
+    queue.submit({'USER1': 7}, [80, 600], 100, 'SYM', 50, key=1)
+    while not calls:
+        pass
+    queue.cancel('USER1', 7)
+
+    assert queue.join(timeout=5)
+    assert calls == [7]
+    assert queue.drain() == []
+    queue.close()
+
+
+def test_cancelled_trigger_waiting_for_the_rate_limit_is_not_modified():
+    calls = []
+
+    def modify(trigger_id, *args, **kwargs):
+        calls.append(trigger_id)
+        return trigger_id
+
+    queue = GttModifyQueue({'USER1': None}, rate=1, modify=modify)
+    queue.submit({'USER1': 7}, [80, 600], 100, 'SYM', 50, key=1)
+    assert queue.join(timeout=5)
+    # The first call used up this second's token, so the next waits for the bucket
+    queue.submit({'USER1': 8}, [80, 600], 100, 'SYM', 50, key=2)
+    while not queue.in_flight:
+        pass
+    queue.cancel('USER1', 8)
+    queue.submit({'USER1': 8}, [81, 600], 100, 'SYM', 50, key=2)
+
+    assert queue.join(timeout=5)
+    assert calls == [7]
+    assert queue.drain() == [(1, 'USER1', 7, 7)]
+    assert queue.stats['cancelled'] == 1
+    queue.close()
+
+
+def test_real_modify_error_path_is_retried(data_dir):
+    acc, trigger_id = make_account(rate_limit=1)  # Placing the GTT used up this second's call
+    queue = GttModifyQueue({'USER1': acc}, rate=100, max_retries=3, backoff=0.6)
+    queue.submit({'USER1': trigger_id}, [80, 600], 100, 'SYM', 50, key=1)
+
+    assert queue.join(timeout=10)
+    assert acc.rejected >= 1
+    assert queue.drain() == [(1, 'USER1', trigger_id, trigger_id)]
+    assert acc.gtts[trigger_id]['condition']['trigger_values'] == [80, 600]
+    assert (data_dir / 'data' / 'runtime_errors.csv').exists()
+    queue.close()
+
+
+def test_modify_gtt_order_returns_none_on_a_rejected_call(data_dir):
+    acc, trigger_id = make_account(rate_limit=1)
+    assert modify_gtt_order(trigger_id, 'two-leg', [80, 600], [80, 600], 100, 'SYM', 'SELL', 50, acc) is None
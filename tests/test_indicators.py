@@ -0,0 +1,54 @@
+import numpy as np
+import pandas as pd
+
+from indicators import IndicatorEngine, compare_with_pandas
+
+
+def make_candles(n, seed=0):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({'date': pd.date_range('2024-01-01 09:15', periods=n, freq='h').astype(str),
+                         'close': 20000 + rng.normal(0, 25, n).cumsum()})
+
+
+def expected_indicators(df):
+    close = df['close']
+    mbb = close.rolling(20).mean()
+    return {'ema3': close.ewm(span=3, adjust=False).mean(), 'ema13': close.ewm(span=13, adjust=False).mean(),
+            'ema20': close.ewm(span=20, adjust=False).mean(), 'mbb': mbb, 'ubb': mbb + 2 * close.rolling(20).std(),
+            'lbb': mbb - 2 * close.rolling(20).std()}
+
+
+def test_incremental_indicators_match_pandas():
+    differences = compare_with_pandas(make_candles(5000))
+    assert all(np.isclose(difference, 0, atol=1e-6) for difference in differences.values()), differences
+
+
+def test_indicators_match_pandas_across_a_restart(tmp_path):
+    df = make_candles(300, seed=1)
+    expected = {name: values.values[-1] for name, values in expected_indicators(df).items()}
+    path = str(tmp_path / 'indicators.json')
+
+    engine = IndicatorEngine(path)
+    engine.update_from_frame(256265, df.iloc[:150])
+    engine.save()
+
+    restarted = IndicatorEngine(path)
+    # The candles seen before the restart are skipped
+    state = restarted.update_from_frame(256265, df)
+    assert state.last_time == df['date'].values[-1]
+    assert np.isclose(state.ema(3), expected['ema3'])
+    assert np.isclose(state.ema(13), expected['ema13'])
+    assert np.isclose(state.ema(20), expected['ema20'])
+    assert np.isclose(state.mbb(20), expected['mbb'])
+    assert np.isclose(state.ubb(20), expected['ubb'])
+    assert np.isclose(state.lbb(20), expected['lbb'])
+
+
+def test_bands_are_nan_until_the_window_is_full(tmp_path):
+    path = str(tmp_path / 'indicators.json')
+    engine = IndicatorEngine(path)
+    engine.update_from_frame(1, make_candles(10))
+    engine.save()
+    state = IndicatorEngine(path).get(1)
+    assert np.isnan(state.mbb(20))
+    assert np.isclose(state.ema(3), expected_indicators(make_candles(10))['ema3'].values[-1])
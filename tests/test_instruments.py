@@ -0,0 +1,41 @@
+import numpy as np
+import pandas as pd
+
+from instruments import InstrumentIndex, load_snapshot, write_snapshot
+
+
+def make_dump():
+    return pd.DataFrame({
+        'instrument_token': [256265, 260105, 11111],
+        'exchange_token': ['1001', '1016', '43'],
+        'tradingsymbol': ['NIFTY 50', 'NIFTY BANK', 'NIFTY24JANFUT'],
+        'name': ['NIFTY 50', 'NIFTY BANK', 'NIFTY'],
+        'last_price': [0.0, 0.0, 0.0],
+        'expiry': ['', '', '2024-01-25'],
+        'strike': [0.0, 0.0, 0.0],
+        'tick_size': [0.05, 0.05, 0.05],
+        'lot_size': [1, 1, 50],
+        'instrument_type': ['EQ', 'EQ', 'FUT'],
+        'segment': ['INDICES', 'INDICES', 'NFO-FUT'],
+        'exchange': ['NSE', 'NSE', 'NFO'],
+    })
+
+
+def test_snapshot_is_memory_mapped_with_typed_fields(tmp_path):
+    path = str(tmp_path / 'instruments.npy')
+    write_snapshot(make_dump(), path)
+    records, categories = load_snapshot(path)
+    assert isinstance(records, np.memmap)
+    assert records['tradingsymbol'].tolist() == [b'NIFTY 50', b'NIFTY BANK', b'NIFTY24JANFUT']
+    assert records['instrument_token'].tolist() == [256265, 260105, 11111]
+    assert np.isnat(records['expiry'][0]) and str(records['expiry'][2]) == '2024-01-25'
+    assert categories['instrument_type'][records['instrument_type'][2]] == 'FUT'
+
+
+def test_index_from_snapshot(tmp_path):
+    path = str(tmp_path / 'instruments.npy')
+    write_snapshot(make_dump(), path)
+    index = InstrumentIndex.from_snapshot(path)
+    assert index.future_symbol('NIFTY') == 'NIFTY24JANFUT'
+    assert index.token('NIFTY BANK') == 260105
+    assert index.lot_size('NIFTY24JANFUT') == 50
@@ -0,0 +1,94 @@
+from journal import EventJournal, JournalState, compact, encode, read_records, replay, synthetic_events
+from store import ENTRY_COLUMNS
+
+
+def open_position_events(position_id=1, inst='NIFTY 50', option='CE', user='USER1'):
+    row = dict(zip(ENTRY_COLUMNS, [position_id, user, 'B1', inst + option, inst, 'SYM', option, 1,
+                                   '2024-01-02 10:15:00', 100.0, 100.0, 50, 73.0, '2024-01-02 09:15:00',
+                                   99.0, 101.0, 98.0, 100.0]))
+    return [
+        ('order_placed', {'position_id': position_id, 'user': user, 'order_id': 'B1', 'symbol': 'SYM'}),
+        ('fill', row),
+        ('position_opened', {'position_id': position_id, 'option': option, 'inst': inst, 'prev_high': 100.0,
+                             'tsl_increment': 18.0, 'tsl': 73.0, 'target': 600.0}),
+        ('gtt_placed', {'position_id': position_id, 'user': user, 'order_id': 11, 'symbol': 'SYM'}),
+        ('tsl_moved', {'position_id': position_id, 'option': option, 'inst': inst, 'prev_high': 118.0,
+                       'tsl': 91.0}),
+        ('gtt_modified', {'position_id': position_id, 'user': user, 'order_id': 12, 'symbol': 'SYM'}),
+    ]
+
+
+def write(path, events):
+    with open(path, 'wb') as f:
+        for event, data in events:
+            f.write(encode(event, data))
+
+
+def test_apply_tracks_an_open_position():
+    state = JournalState(['NIFTY 50'])
+    for event, data in open_position_events():
+        state.apply(event, data)
+
+    assert state.position_id == 1
+    assert state.sl_orders == {(1, 'USER1'): [1, 'USER1', 12, 'SYM']}
+    assert state.levels['tsl'] == {1: 91.0} and state.levels['prev_high'] == {1: 118.0}
+    assert state.positions[(1, 'USER1')]['Trailing_SL'] == 91.0
+
+
+def test_closing_a_position_counts_a_completed_order():
+    state = JournalState(['NIFTY 50'])
+    for event, data in open_position_events():
+        state.apply(event, data)
+    state.apply('exit', {'Position_id': 1, 'User_id': 'USER1', 'Sell_order_id': 12, 'Sell_time': '',
+                         'Sell_price': 91.0, 'Exit_type': 'Trailing_SL'})
+    state.apply('position_closed', {'position_id': 1, 'option': 'CE', 'inst': 'NIFTY 50'})
+
+    assert not state.positions and not state.sl_orders and not state.levels['tsl']
+    assert len(state.trades) == 1
+    assert state.completed_orders['CE']['NIFTY 50'] == 1
+    state.apply('session_start', {'date': '2024-01-03'})
+    assert state.completed_orders['CE']['NIFTY 50'] == 0
+
+
+def test_closing_a_position_of_an_instrument_no_longer_traded():
+    state = JournalState(['NIFTY 50'])
+    state.apply('position_closed', {'position_id': 1, 'option': 'PE', 'inst': 'RELIANCE'})
+    assert state.completed_orders['PE']['RELIANCE'] == 1
+
+
+def test_replay_stops_at_a_torn_record(tmp_path):
+    path = str(tmp_path / 'journal.log')
+    write(path, open_position_events())
+    with open(path, 'ab') as f:
+        f.write(encode('position_closed', {'position_id': 1, 'option': 'CE', 'inst': 'NIFTY 50'})[:-3])
+
+    assert replay(path, ['NIFTY 50']).events == len(open_position_events())
+    # Opening the journal drops the torn record so new events follow the valid ones
+    journal = EventJournal(path)
+    journal.append('session_start', sync=True, date='2024-01-03')
+    journal.close()
+    records, _ = read_records(path)
+    assert records[-1][0] == 'session_start'
+
+
+def test_compact_keeps_open_positions_and_drops_history(tmp_path):
+    path = str(tmp_path / 'journal.log')
+    write(path, synthetic_events(20) + open_position_events(position_id=21))
+    before = replay(path, ['NIFTY 50', 'NIFTY BANK'])
+
+    compact(path, '2024-01-03')
+    after = replay(path, ['NIFTY 50', 'NIFTY BANK'])
+
+    assert after.events == 2
+    assert after.positions == before.positions
+    assert after.sl_orders == before.sl_orders
+    assert after.levels == before.levels
+    assert after.position_id == 21
+    assert after.completed_orders == {'CE': {'NIFTY 50': 0, 'NIFTY BANK': 0}, 'PE': {'NIFTY 50': 0, 'NIFTY BANK': 0}}
+
+    # Events of the new session follow the snapshot
+    write(path + '.new', [('position_closed', {'position_id': 21, 'option': 'CE', 'inst': 'NIFTY 50'})])
+    with open(path, 'ab') as f, open(path + '.new', 'rb') as new:
+        f.write(new.read())
+    state = replay(path, ['NIFTY 50'])
+    assert not state.positions and state.completed_orders['CE']['NIFTY 50'] == 1
@@ -0,0 +1,36 @@
+import numpy as np
+import pandas as pd
+
+from backtest import run_backtest, summarize, synthetic_candles
+from optimizer import optimize, parameter_grid
+
+
+def premium_candles(futures, option_type, delta=0.05):
+    # Premium moving with the futures, every other minute missing like a thinly traded option
+    sign = 1 if option_type == 'CE' else -1
+    move = {column: sign * delta * (futures[column].values - futures['open'].values[0])
+            for column in ['open', 'high', 'low', 'close']}
+    if option_type == 'PE':
+        move['high'], move['low'] = move['low'], move['high']
+    df = pd.DataFrame({'date': futures['date'], **{column: np.maximum(150 + values, 1)
+                                                          for column, values in move.items()}})
+    return df.iloc[::2].reset_index(drop=True)
+
+
+def test_optimize_takes_option_candles_like_run_backtest():
+    candles = {'NIFTY 50': synthetic_candles(18000, days=60, seed=1),
+               'NIFTY BANK': synthetic_candles(42000, days=60, seed=2)}
+    option_candles = {(inst, option_type): premium_candles(df, option_type)
+                      for inst, df in candles.items() for option_type in ['CE', 'PE']}
+    param_sets = parameter_grid({'TRAILING_STOP_LOSS': [0.1, 0.25], 'TARGET': [0.5, 1]})
+
+    ranked = optimize(candles, param_sets, option_candles=option_candles, workers=2, output=None)
+
+    assert len(ranked) == len(param_sets)
+    for _, row in ranked.iterrows():
+        params = {name: row[name] for name in param_sets[0]}
+        expected = summarize(run_backtest(candles, option_candles, params))
+        assert expected['Trades'] > 0
+        assert expected != summarize(run_backtest(candles, None, params))
+        for name, value in expected.items():
+            assert row[name] == value
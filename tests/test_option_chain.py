@@ -0,0 +1,24 @@
+import numpy as np
+
+from instruments import InstrumentIndex
+from option_chain import OptionChainCache
+
+
+def make_index(n_strikes=40):
+    records = [{'instrument_token': i, 'tradingsymbol': 'NIFTY24JAN{}{}'.format(19000 + 50 * (i // 2), option_type),
+                'name': 'NIFTY', 'expiry': '2024-01-25', 'strike': 19000 + 50 * (i // 2),
+                'instrument_type': option_type, 'lot_size': 50}
+               for i, option_type in zip(range(2 * n_strikes), ['CE', 'PE'] * n_strikes)]
+    return InstrumentIndex(records)
+
+
+def test_option_symbol_matches_the_instrument_index():
+    instrument_index = make_index()
+    chains = OptionChainCache(instrument_index)
+    spots = np.random.default_rng(0).uniform(18800, 21200, 500).tolist()
+    for option_type, offset in [('CE', -200), ('PE', 200)]:
+        expected = [instrument_index.option_symbol('NIFTY', option_type, spot, 50, offset) for spot in spots]
+        assert [chains.option_symbol('NIFTY', option_type, spot, 50, offset) for spot in spots] == expected
+        assert chains.chain('NIFTY', option_type).symbols_for(spots, 50, offset).tolist() == expected
+    assert chains.option_symbol('NIFTY', 'CE', 19501.5, 50) == 'NIFTY24JAN19550CE'
+    assert chains.option_symbol('NIFTY', 'CE', 25000, 50) is None
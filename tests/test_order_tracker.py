@@ -0,0 +1,65 @@
+import json
+import threading
+import time
+
+from mock_broker import MockBroker
+from order_tracker import OrderTracker
+from ticker import ReplayTicker
+from utils import get_order_details, place_order
+
+
+def record_order_updates(path, broker):
+    # Writes the order updates the broker pushes in ReplayTicker's recording format
+    f = open(path, 'w')
+    broker.listeners.append(lambda order: f.write(json.dumps({'timestamp': time.time(), 'order': order}) + '\n'))
+    return f
+
+
+def test_wait_returns_when_the_fill_update_is_replayed(tmp_path):
+    path = str(tmp_path / 'updates.jsonl')
+    broker = MockBroker('USER1', prices={'SYM': 101.5})
+    with record_order_updates(path, broker):
+        order_id = place_order('SYM', 'BUY', 50, broker)
+
+    tracker = OrderTracker({'USER1': broker})
+    ticker = ReplayTicker(path, speed=0)
+    tracker.attach(ticker)
+    updates = []
+    tracker.add_listener(updates.append)
+
+    result = dict()
+    waiter = threading.Thread(target=lambda: result.update(order=tracker.wait(order_id, timeout=5)))
+    waiter.start()
+    time.sleep(0.05)
+    start = time.monotonic()
+    ticker.connect(threaded=True)
+    waiter.join(5)
+
+    assert time.monotonic() - start < 1
+    assert result['order']['status'] == 'COMPLETE' and result['order']['average_price'] == 101.5
+    assert [order['order_id'] for order in updates] == [order_id]
+    # Confirmed from the update alone, the order book was never requested after the placement
+    assert broker.calls == 1
+
+
+def test_wait_polls_the_order_book_without_an_update(tmp_path):
+    path = str(tmp_path / 'updates.jsonl')
+    open(path, 'w').close()
+    broker = MockBroker('USER1', prices={'SYM': 99.0})
+    order_id = place_order('SYM', 'BUY', 50, broker)
+    tracker = OrderTracker({'USER1': broker})
+    ticker = ReplayTicker(path)
+    tracker.attach(ticker)
+    ticker.connect()
+
+    order, status, _, _ = get_order_details('USER1', order_id, broker, tracker, timeout=0.05)
+    assert status == 'COMPLETE' and order['average_price'].values[0] == 99.0
+    assert tracker.get(order_id)['status'] == 'COMPLETE'
+
+
+def test_get_order_details_of_an_unknown_order():
+    broker = MockBroker('USER1')
+    tracker = OrderTracker({'USER1': broker})
+    order, status, status_message, timestamp = get_order_details('USER1', 'MISSING', broker, tracker, timeout=0.01)
+    assert status is None and status_message == 'Order not found' and len(order) == 0
+    assert get_order_details('USER1', 'MISSING', broker)[1] is None
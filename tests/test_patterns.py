@@ -0,0 +1,51 @@
+import numpy as np
+import pandas as pd
+
+import patterns
+import utils
+
+
+def make_candles(n, seed, start='2024-01-01 09:15'):
+    rng = np.random.default_rng(seed)
+    Open = 100 + rng.normal(0, 1, n).cumsum()
+    close = Open + rng.normal(0, 1, n)
+    high = np.maximum(Open, close) + rng.exponential(0.5, n)
+    low = np.minimum(Open, close) - rng.exponential(0.5, n)
+    dates = pd.date_range(start, periods=n, freq='h')
+    return pd.DataFrame({'date': dates, 'open': Open, 'high': high, 'low': low, 'close': close,
+                         'volume': rng.integers(100, 1000, n)})
+
+
+def test_vectorized_patterns_match_the_scalar_functions():
+    df = make_candles(2000, seed=1)
+    vwap = patterns.get_vwap(df)
+    Open, high, low, close = (df[column].values for column in ['open', 'high', 'low', 'close'])
+    for name in ['is_hammer', 'is_bullish', 'is_shooting_star', 'is_bearish']:
+        vectorized = getattr(patterns, name)(Open, close, high, low)
+        scalar = np.array([getattr(utils, name)(*candle) for candle in zip(Open, close, high, low)], dtype=bool)
+        assert scalar.any()
+        assert (vectorized == scalar).all(), name
+    for option_type in ['CE', 'PE']:
+        vectorized = patterns.check_entry_conditions_one(Open, high, low, close, vwap, option_type)
+        scalar = np.array([utils.check_entry_conditions_one(*candle, option_type)
+                           for candle in zip(Open, high, low, close, vwap)], dtype=bool)
+        assert scalar.any()
+        assert (vectorized == scalar).all(), option_type
+
+
+def test_signal_matrix_aligns_symbols_on_different_dates():
+    candles = {'NIFTY': make_candles(30, seed=2), 'BANKNIFTY': make_candles(20, seed=3, start='2024-01-01 19:15'),
+               'FINNIFTY': make_candles(10, seed=4, start='2024-01-03 09:15')}
+    matrix = patterns.signal_matrix(candles)
+    assert list(matrix.columns) == [(symbol, option_type) for symbol in candles for option_type in ['CE', 'PE']]
+    assert len(matrix) == len(pd.Index(np.concatenate([df['date'].values for df in candles.values()])).unique())
+    assert matrix.dtypes.eq(bool).all()
+    for symbol, df in candles.items():
+        vwap = patterns.get_vwap(df)
+        for option_type in ['CE', 'PE']:
+            expected = patterns.check_entry_conditions_one(df['open'].values, df['high'].values, df['low'].values,
+                                                           df['close'].values, vwap, option_type)
+            column = matrix[(symbol, option_type)]
+            assert (column.loc[df['date']].values == expected).all()
+            # Dates without a candle of the symbol never signal
+            assert not column.drop(df['date']).any()
@@ -0,0 +1,78 @@
+import pandas as pd
+
+from position_book import PositionBook
+from store import ENTRY_COLUMNS, SL_ORDER_COLUMNS
+
+
+def make_book():
+    book = PositionBook(capacity=2)
+    book.open(1, 'NIFTY 50', 'CE', 'NIFTYCE', 101, '', 100.0, 50, tsl=73.0, tsl_increment=18.0, target=600.0)
+    book.open(2, 'NIFTY BANK', 'PE', 'BANKPE', 102, '', 200.0, 15, tsl=146.0, tsl_increment=36.0, target=1200.0)
+    book.open(3, 'NIFTY 50', 'CE', 'NIFTYCE2', 103, '', 50.0, 50, tsl=36.5, tsl_increment=0.0, target=300.0)
+    return book
+
+
+def test_trail_moves_only_stops_whose_high_rose_an_increment():
+    book = make_book()
+    book.on_ticks([{'instrument_token': 101, 'last_price': 117.0}, {'instrument_token': 102, 'last_price': 240.0},
+                   {'instrument_token': 103, 'last_price': 90.0}])
+    intents = book.trail()
+
+    assert [intent.position_id for intent in intents] == [2]
+    assert intents[0].tsl == 182.0 and intents[0].target == 1200.0 and intents[0].ltp == 240.0
+    assert book.get(1).tsl == 73.0
+    assert book.get(3).tsl == 36.5
+    assert book.trail() == []
+
+
+def test_trail_moves_a_gapped_stop_by_every_increment():
+    book = make_book()
+    book.on_ticks([{'instrument_token': 101, 'last_price': 160.0}])
+    book.on_ticks([{'instrument_token': 101, 'last_price': 120.0}])
+    intents = book.trail()
+
+    assert [(intent.position_id, intent.tsl, intent.ltp) for intent in intents] == [(1, 127.0, 120.0)]
+    position = book.get(1)
+    assert position.high == 160.0 and position.prev_high == 154.0
+    # The high has to rise another full increment from prev_high before the stop moves again
+    book.mark(1, ltp=171.0)
+    assert book.trail() == []
+    book.mark(1, high=172.0)
+    assert [intent.tsl for intent in book.trail()] == [145.0]
+
+
+def test_remove_keeps_the_rows_of_the_other_positions():
+    book = make_book()
+    book.remove(1)
+    book.on_ticks([{'instrument_token': 102, 'last_price': 236.0}, {'instrument_token': 103, 'last_price': 55.0}])
+
+    assert len(book) == 2 and 1 not in book
+    assert [intent.position_id for intent in book.trail()] == [2]
+    assert book.get(3).ltp == 55.0
+    assert book.count('NIFTY 50') == 1
+
+
+def test_from_frames_restores_levels_and_gtts():
+    book = make_book()
+    book.get(1).gtt_ids['USER1'] = 11
+    book.on_ticks([{'instrument_token': 101, 'last_price': 140.0}])
+    book.trail()
+
+    entries = pd.DataFrame([[1, 'USER1', 'B1', 'NIFTY 50CE', 'NIFTY 50', 'NIFTYCE', 'CE', 101, '', 100.0, 140.0, 50,
+                             73.0, '', 0, 0, 0, 0]], columns=ENTRY_COLUMNS)
+    sl_orders = pd.DataFrame([[1, 'USER1', 11, 'NIFTYCE']], columns=SL_ORDER_COLUMNS)
+    restored = PositionBook.from_frames(entries, sl_orders, book.levels())
+
+    position = restored.get(1)
+    assert position.tsl == 109.0 and position.prev_high == 136.0 and position.tsl_increment == 18.0
+    assert position.entries == {'USER1': 'B1'} and position.gtt_ids == {'USER1': 11}
+    assert restored.sl_orders_frame(buy_orders=True).values.tolist() == [[1, 'USER1', 11, 'NIFTYCE', 'B1']]
+
+
+def test_holds_only_the_tokens_of_open_positions():
+    book = make_book()
+    assert book.holds([101]) and book.holds([999, 103])
+    assert not book.holds([999, 256265])
+    book.remove(1)
+    assert not book.holds([101])
+    assert not PositionBook().holds([101])
@@ -0,0 +1,48 @@
+import datetime
+import threading
+import time
+
+from scheduler import IST, CandleScheduler
+
+
+def at(hour, minute, second=0, day=2):
+    return IST.localize(datetime.datetime(2024, 1, day, hour, minute, second)).timestamp()
+
+
+def test_hourly_boundaries_are_aligned_to_the_session_open():
+    scheduler = CandleScheduler('60minute')
+    assert scheduler.boundary_before(at(9, 15)) is None
+    assert scheduler.boundary_before(at(10, 14, 59)) is None
+    assert scheduler.boundary_before(at(10, 15)) == at(10, 15)
+    assert scheduler.boundary_before(at(12, 40)) == at(12, 15)
+    assert scheduler.boundary_after(at(8, 0)) == at(10, 15)
+    assert scheduler.boundary_after(at(10, 15)) == at(11, 15)
+    assert scheduler.boundary_after(at(12, 40)) == at(13, 15)
+
+
+def test_the_last_candle_closes_at_the_session_close():
+    scheduler = CandleScheduler('60minute')
+    assert scheduler.boundary_after(at(15, 20)) == at(15, 30)
+    assert scheduler.boundary_before(at(15, 30)) == at(15, 30)
+    assert scheduler.boundary_before(at(15, 45)) == at(15, 30)
+    assert scheduler.boundary_before(at(23, 0)) == at(15, 30)
+    assert scheduler.boundary_after(at(15, 30)) == at(10, 15, day=3)
+
+
+def test_minute_intervals():
+    scheduler = CandleScheduler('5minute')
+    assert scheduler.boundary_before(at(9, 24, 59)) == at(9, 20)
+    assert scheduler.boundary_after(at(9, 20)) == at(9, 25)
+    assert scheduler.boundary_before(at(15, 30)) == at(15, 30)
+    assert CandleScheduler('15minute').boundary_after(at(11, 1)) == at(11, 15)
+
+
+def test_wait_returns_a_missed_candle_close_then_events(monkeypatch):
+    monkeypatch.setattr(time, 'time', lambda: at(12, 40))
+    scheduler = CandleScheduler('60minute', delay=1.0, last_boundary=at(10, 15))
+    assert scheduler.wait(0) == ('candle', at(12, 15))
+    assert scheduler.wait(0) == ('timeout', None)
+
+    threading.Timer(0.05, scheduler.notify).start()
+    assert scheduler.wait(5) == ('event', None)
+    assert scheduler.summary()['wakes'] == {'candle': 1, 'event': 1, 'timeout': 1}
@@ -0,0 +1,36 @@
+import json
+
+import pandas as pd
+
+from store import ENTRY_COLUMNS, StateStore
+
+
+def write_files(data_dir, positions, tsl):
+    pd.DataFrame(positions, columns=ENTRY_COLUMNS).to_csv(data_dir / 'positions.csv', index=False)
+    with open(data_dir / 'tsl.json', 'w') as f:
+        json.dump(tsl, f)
+
+
+def position(position_id, user, option, inst):
+    return [position_id, user, 'B{}'.format(position_id), option + inst, inst, 'SYM', option, 101, '', 100.0, 100.0,
+            50, 75.0, '', 0, 0, 0, 0]
+
+
+def test_migrated_stop_losses_are_keyed_by_position_id(tmp_path):
+    write_files(tmp_path, [position(3, 'A', 'CE', 'NIFTY 50'), position(3, 'B', 'CE', 'NIFTY 50'),
+                           position(4, 'A', 'PE', 'NIFTY BANK')],
+                {'CE': {'NIFTY 50': 75.0, 'NIFTY BANK': 0}, 'PE': {'NIFTY 50': 0, 'NIFTY BANK': 210.5}})
+    store = StateStore(str(tmp_path / 'state.db'))
+    store.migrate_from_files(str(tmp_path))
+    assert store.load_state('tsl') == {3: 75.0, 4: 210.5}
+    store.close()
+
+
+def test_stop_losses_of_unknown_positions_are_not_migrated(tmp_path, caplog):
+    write_files(tmp_path, [position(5, 'A', 'CE', 'NIFTY FIN SERVICE')], {'CE': {'NIFTY 50': 75.0}})
+    store = StateStore(str(tmp_path / 'state.db'))
+    with caplog.at_level('INFO'):
+        store.migrate_from_files(str(tmp_path))
+    assert store.load_state('tsl') == {}
+    assert 'position 5' in caplog.text
+    store.close()
@@ -0,0 +1,52 @@
+import json
+import threading
+
+from ticker import ReplayTicker, TickStream
+
+
+def write_recording(path, batches, tokens):
+    with open(path, 'w') as f:
+        for i in range(batches):
+            ticks = [{'instrument_token': token, 'last_price': 100.0 + i + token} for token in tokens]
+            f.write(json.dumps({'timestamp': i * 0.001, 'ticks': ticks}) + '\n')
+
+
+def test_replayed_ticks_fill_the_price_table(tmp_path):
+    path = str(tmp_path / 'ticks.jsonl')
+    write_recording(path, 10, [1, 2, 3])
+    stream = TickStream(ReplayTicker(path))
+    batches = []
+    stream.add_listener(batches.append)
+    stream.subscribe([1, 2])
+    stream.start()
+    stream.ticker.join(5)
+
+    assert stream.ltp(1) == 110.0 and stream.ltp(2) == 111.0
+    assert stream.ltp(3) is None
+    assert len(batches) == 10
+
+
+def test_subscriptions_change_while_ticks_are_replayed(tmp_path):
+    path = str(tmp_path / 'ticks.jsonl')
+    tokens = list(range(1, 21))
+    write_recording(path, 300, tokens)
+    stream = TickStream(ReplayTicker(path, speed=1))
+    stream.subscribe(tokens[:10])
+    stream.start()
+
+    def churn(kept, dropped):
+        for _ in range(200):
+            stream.subscribe(kept + dropped)
+            stream.unsubscribe(dropped)
+
+    threads = [threading.Thread(target=churn, args=(tokens[10 + i:11 + i], tokens[15 + i:16 + i])) for i in range(5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    stream.ticker.join(5)
+
+    assert stream.tokens == set(tokens[:15])
+    assert stream.ticker.tokens == set(tokens[:15])
+    assert all(stream.ltp(token) == 399.0 + token for token in tokens[:10])
+    assert all(stream.ltp(token) is None for token in tokens[15:])
@@ -0,0 +1,47 @@
+import threading
+
+from trade_high import TradeHighTracker
+
+
+class CandleKite:
+    def __init__(self, high):
+        self.high = high
+
+    def historical_data(self, token, from_date, to_date, interval):
+        return [{'high': self.high}]
+
+
+def test_highs_advance_from_ticks_and_candles():
+    tracker = TradeHighTracker(CandleKite(105.0))
+    assert tracker.get(1, 101, '2024-01-01 09:15:00') == 105.0
+    tracker.on_ticks([{'instrument_token': 101, 'last_price': 104.0}])
+    assert tracker.get(1, 101, '') == 105.0
+    tracker.on_candle(101, {'high': 107.5})
+    assert tracker.get(1, 101, '') == 107.5
+    tracker.remove(1)
+    assert tracker.highs == {} and tracker.token_positions == {}
+
+
+def test_positions_are_removed_while_ticks_arrive():
+    tracker = TradeHighTracker(CandleKite(100.0))
+    stop = threading.Event()
+    errors = []
+
+    def ticks():
+        try:
+            while not stop.is_set():
+                tracker.on_ticks([{'instrument_token': 101, 'last_price': 101.0}])
+        except Exception as e:
+            errors.append(e)
+
+    thread = threading.Thread(target=ticks)
+    thread.start()
+    for position_id in range(2000):
+        tracker.track(position_id, 101, '')
+        tracker.track(position_id + 100000, 101, '')
+        tracker.remove(position_id)
+    stop.set()
+    thread.join()
+
+    assert errors == []
+    assert tracker.token_positions[101] == set(range(100000, 102000))
@@ -0,0 +1,65 @@
+import numpy as np
+import pandas as pd
+
+from indicators import IndicatorEngine
+from universe import Underlying, UniverseScanner, scan_indicators, stack_columns
+
+
+class Store:
+    def __init__(self, frames):
+        self.frames = frames
+
+    def get(self, token, from_date, to_date, interval):
+        return self.frames[token]
+
+
+def candles(closes, start='2024-01-01 09:15'):
+    dates = pd.date_range(start, periods=len(closes), freq='60min', tz='Asia/Kolkata')
+    return pd.DataFrame({'date': dates, 'open': closes, 'high': closes + 1, 'low': closes - 1, 'close': closes})
+
+
+def make_scanner(n=3, length=150):
+    rng = np.random.default_rng(1)
+    frames = [candles(100 + rng.normal(0, 1, length).cumsum()) for _ in range(n)]
+    underlyings = [Underlying('STOCK{}'.format(i), 'STOCK{}'.format(i), 'STOCK{}FUT'.format(i), i, 5, 100)
+                   for i in range(n)]
+    return frames, underlyings
+
+
+def test_scan_reads_the_indicator_engine_state():
+    frames, underlyings = make_scanner()
+    scanner = UniverseScanner(Store(frames), workers=2, indicators=IndicatorEngine(path=None))
+    scan = scanner.scan(underlyings, None, None)
+    scanner.close()
+
+    for i, df in enumerate(frames):
+        row = scan.loc['STOCK{}'.format(i)]
+        for period in (3, 13, 20):
+            assert np.isclose(row['ema{}'.format(period)], df['close'].ewm(span=period, adjust=False).mean().iloc[-1])
+        assert np.isclose(row['mbb'], df['close'].rolling(20).mean().iloc[-1])
+        assert scanner.indicators.get(i).last_time == str(df['date'].iloc[-1])
+
+
+def test_scan_feeds_only_new_candles_to_the_engine():
+    frames, underlyings = make_scanner(n=1)
+    engine = IndicatorEngine(path=None)
+    store = Store([frames[0].iloc[:-1]])
+    scanner = UniverseScanner(store, workers=1, indicators=engine)
+    scanner.scan(underlyings, None, None)
+    store.frames = frames
+    scan = scanner.scan(underlyings, None, None)
+    scanner.close()
+
+    assert np.isclose(scan['ema20'].iloc[0], frames[0]['close'].ewm(span=20, adjust=False).mean().iloc[-1])
+    assert len(engine.get(0).bb.values) == 20
+
+
+def test_scan_without_an_engine_computes_the_window():
+    frames, underlyings = make_scanner()
+    scanner = UniverseScanner(Store(frames), workers=2, length=100)
+    scan = scanner.scan(underlyings, None, None)
+    scanner.close()
+
+    expected = scan_indicators(stack_columns(frames, 100)['close'])
+    assert np.allclose(scan['ema13'].values, expected['ema13'])
+    assert np.allclose(scan['mbb'].values, [df['close'].rolling(20).mean().iloc[-1] for df in frames])
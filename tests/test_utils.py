@@ -0,0 +1,98 @@
+import threading
+
+import pandas as pd
+
+import utils
+
+
+def test_extract_error_info_records_and_saves_the_error(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / 'data').mkdir()
+    before = len(utils.runtime_errors)
+    try:
+        raise ValueError('Too many requests')
+    except ValueError:
+        utils.extract_error_info()
+
+    assert len(utils.runtime_errors) == before + 1
+    error = utils.runtime_errors[len(utils.runtime_errors) - 1].to_dict()
+    assert error['Error_message'] == 'Too many requests'
+    assert error['Timestamp'].tzinfo is not None
+    saved = pd.read_csv(tmp_path / 'data' / 'runtime_errors.csv', header=None)
+    assert saved.iloc[-1, 3] == 'Too many requests'
+
+
+def test_errors_of_concurrent_threads_are_all_recorded(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / 'data').mkdir()
+    before = len(utils.runtime_errors)
+
+    def fail(thread):
+        for i in range(50):
+            try:
+                raise ValueError('{} {}'.format(thread, i))
+            except ValueError:
+                utils.extract_error_info()
+
+    threads = [threading.Thread(target=fail, args=(thread,)) for thread in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    messages = utils.runtime_errors.column('Error_message')[before:].tolist()
+    assert sorted(messages) == sorted('{} {}'.format(thread, i) for thread in range(8) for i in range(50))
+    saved = pd.read_csv(tmp_path / 'data' / 'runtime_errors.csv', header=None)
+    assert len(saved) == 400
+
+
+def make_chains():
+    from instruments import InstrumentIndex
+    from option_chain import OptionChainCache
+
+    records = [{'instrument_token': i, 'tradingsymbol': 'NIFTY24JAN{}{}'.format(19000 + 50 * (i // 2), option_type),
+                'name': 'NIFTY', 'expiry': '2024-01-25', 'strike': 19000 + 50 * (i // 2),
+                'instrument_type': option_type, 'lot_size': 50}
+               for i, option_type in zip(range(80), ['CE', 'PE'] * 40)]
+    return OptionChainCache(InstrumentIndex(records))
+
+
+class FakeQuotes:
+    def __init__(self, prices):
+        self.prices = prices
+
+    def ltp(self, instrument, default=None):
+        return self.prices.get(instrument, default)
+
+
+def test_get_trading_symbol_offsets_from_the_money():
+    chains = make_chains()
+    assert utils.get_trading_symbol('NIFTY 50', 'CE', chains, 'NIFTY', 50, -200, spot_price=19510) == 'NIFTY24JAN19350CE'
+    assert utils.get_trading_symbol('NIFTY 50', 'PE', chains, 'NIFTY', 50, 200, spot_price=19510) == 'NIFTY24JAN19750PE'
+    quotes = FakeQuotes({'NSE:NIFTY 50': 19500.0})
+    assert utils.get_trading_symbol('NIFTY 50', 'CE', chains, 'NIFTY', 50, -200, quotes) == 'NIFTY24JAN19300CE'
+
+
+def test_get_trading_symbol_records_a_missing_spot_price(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / 'data').mkdir()
+    assert utils.get_trading_symbol('NIFTY 50', 'CE', make_chains(), 'NIFTY', 50, -200, FakeQuotes({})) is None
+    assert (tmp_path / 'data' / 'runtime_errors.csv').exists()
+
+
+def test_place_confirmed_gtt_order_reads_back_each_account(tmp_path, monkeypatch):
+    from dispatcher import OrderDispatcher
+    from mock_broker import MockBroker
+
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / 'data').mkdir()
+    accounts = {'USER1': MockBroker('USER1'), 'USER2': MockBroker('USER2', rate_limit=1)}
+    accounts['USER2'].place_gtt('two-leg', 'SYM', 'NFO', [70, 600], 100, [])
+    dispatcher = OrderDispatcher(accounts)
+    results = dispatcher.dispatch_all(utils.place_confirmed_gtt_order, list(accounts), 'two-leg', [73, 600],
+                                      [73, 600], 100, 'SYM', 'SELL', 50)
+    dispatcher.shutdown()
+
+    order_id, status, timestamp = results['USER1']
+    assert status == 'active' and accounts['USER1'].gtts[order_id]['condition']['trigger_values'] == [73, 600]
+    assert results['USER2'] == (None, None, None)
@@ -0,0 +1,54 @@
+import threading
+import time
+
+from position_book import PositionBook
+from workers import QueueWorker, Worker
+
+
+def test_trailing_stop_reacts_while_signal_and_execution_stall():
+    book = PositionBook()
+    book.open(1, 'NIFTY 50', 'CE', 'SYM', 101, '', 100.0, 50, tsl=73.0, tsl_increment=1.0, target=600.0)
+    tick_times = dict()
+    latencies = []
+    tick_event = threading.Event()
+    release = threading.Event()
+    stalled = []
+
+    def execute_signal(signal):
+        # Waiting for the fill of the entry order
+        release.wait(5)
+
+    execution = QueueWorker('execution', execute_signal)
+
+    def signal_step():
+        # The historical data fetch of the candle stalls until the ticks are over
+        execution.put('signal')
+        stalled.append(time.monotonic())
+        release.wait(5)
+
+    def risk_step():
+        tick_event.wait(0.5)
+        tick_event.clear()
+        for intent in book.trail():
+            for level in [level for level in list(tick_times) if level <= intent.tsl]:
+                latencies.append(time.monotonic() - tick_times.pop(level))
+
+    workers = [Worker('signal', signal_step).start(), execution.start(), Worker('risk', risk_step).start()]
+    try:
+        time.sleep(0.1)
+        for i in range(1, 21):
+            tick_times[73.0 + i] = time.monotonic()
+            book.on_ticks([{'instrument_token': 101, 'last_price': 100.0 + i}])
+            tick_event.set()
+            time.sleep(0.05)
+        time.sleep(0.2)
+        assert len(stalled) == 1
+        assert execution.queue.unfinished_tasks == 1
+    finally:
+        release.set()
+        for worker in workers:
+            worker.stop(5)
+
+    assert len(latencies) == 20
+    assert not tick_times
+    assert max(latencies) < 0.25